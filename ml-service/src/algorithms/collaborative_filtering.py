@@ -4,19 +4,87 @@ Collaborative Filtering Algorithms for Product Recommendations
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from typing import List, Dict, Tuple, Optional
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.decomposition import TruncatedSVD
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error
 import logging
 from surprise import Dataset, Reader, SVD, NMF, KNNBasic, accuracy
-from surprise.model_selection import cross_validate, GridSearchCV
+from surprise.model_selection import cross_validate, GridSearchCV, KFold
 import joblib
 import os
+import weakref
+
+from .knn_kernels import predict_item_based, predict_user_based
+
+try:
+    import optuna
+except ImportError:
+    optuna = None
+
+try:
+    import torch
+except ImportError:
+    torch = None
 
 logger = logging.getLogger(__name__)
 
+# Similarities in [-1, 1] are stored as int8 scaled by this factor
+SIMILARITY_SCALE = 127
+
+# Upper bound on Optuna trials per hyperparameter search
+TUNING_TRIALS = 40
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return indices of the k highest scores, best first, without a full sort"""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def _top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row-wise indices of the k highest scores, best first"""
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def _to_csr(user_item_matrix: pd.DataFrame) -> sparse.csr_matrix:
+    """Convert a dense or sparse-backed user-item frame to CSR"""
+    if len(user_item_matrix.columns) and all(
+        isinstance(dtype, pd.SparseDtype) for dtype in user_item_matrix.dtypes
+    ):
+        return user_item_matrix.sparse.to_coo().tocsr()
+    return sparse.csr_matrix(user_item_matrix.to_numpy(dtype=np.float64))
+
+
+def _pack_rated_bits(ratings: sparse.csr_matrix) -> np.ndarray:
+    """Bit-pack the positive cells of a CSR matrix row-wise, as np.packbits would"""
+    n_rows, n_cols = ratings.shape
+    bits = np.zeros((n_rows, (n_cols + 7) // 8), dtype=np.uint8)
+    
+    # Set bits straight from the stored entries instead of densifying the matrix
+    positive = ratings.data > 0
+    rows = np.repeat(np.arange(n_rows), np.diff(ratings.indptr))[positive]
+    cols = ratings.indices[positive]
+    np.bitwise_or.at(bits, (rows, cols >> 3), (0x80 >> (cols & 7)).astype(np.uint8))
+    return bits
+
+
+def _quantize_similarity(similarity: np.ndarray) -> np.ndarray:
+    """Quantize a [-1, 1] similarity matrix to int8"""
+    return np.rint(np.clip(similarity, -1.0, 1.0) * SIMILARITY_SCALE).astype(np.int8)
+
+
 class CollaborativeFilteringEngine:
     """Collaborative filtering recommendation engine"""
     
@@ -26,10 +94,35 @@ class CollaborativeFilteringEngine:
         self.item_based_model = None
         self.matrix_factorization_model = None
         self.user_item_matrix = None
-        self.user_similarity_matrix = None
-        self.item_similarity_matrix = None
+        self._rated_bits = None
+        
+        # Surprise data built from the last user-item matrix seen
+        self._cached_matrix_ref = None
+        self._cached_dataset = None
+        self._cached_trainset = None
+        
+        # int8 copies of the similarities for similar-user and similar-item
+        # lookups, which scan one byte per entry. The float64 matrices stay on
+        # the fitted models for predictions, so these add memory, not save it
+        self.user_similarity_matrix_i8 = None
+        self.item_similarity_matrix_i8 = None
         self.user_ids = None
         self.item_ids = None
+        self._user_pos = {}
+        self._item_pos = {}
+        
+        # KNN neighbour indexes for batched predictions
+        self._user_knn = None
+        self._item_knn = None
+        
+        # Matrix factorization factors aligned to the user-item matrix columns
+        self._mf_pu = None
+        self._mf_qi = None
+        self._mf_bu = None
+        self._mf_bi = None
+        self._mf_mean = 0.0
+        self._mf_rating_scale = (0, 5)
+        self._mf_user_inner = {}
         
         # Ensure model directory exists
         os.makedirs(model_path, exist_ok=True)
@@ -39,18 +132,7 @@ class CollaborativeFilteringEngine:
         try:
             logger.info("Training user-based collaborative filtering model...")
             
-            self.user_item_matrix = user_item_matrix
-            self.user_ids = user_item_matrix.index.tolist()
-            self.item_ids = user_item_matrix.columns.tolist()
-            
-            # Calculate user similarity matrix
-            user_matrix = user_item_matrix.values
-            self.user_similarity_matrix = cosine_similarity(user_matrix)
-            
-            # Create user-based KNN model using Surprise
-            reader = Reader(rating_scale=(0, 5))
-            data = self._prepare_surprise_data(user_item_matrix)
-            dataset = Dataset.load_from_df(data, reader)
+            self._set_user_item_matrix(user_item_matrix)
             
             # Configure KNN parameters
             sim_options = {
@@ -61,8 +143,12 @@ class CollaborativeFilteringEngine:
             self.user_based_model = KNNBasic(k=k, sim_options=sim_options)
             
             # Train the model
-            trainset = dataset.build_full_trainset()
+            trainset = self._get_trainset(user_item_matrix)
             self.user_based_model.fit(trainset)
+            self._user_knn = self._build_knn_index(self.user_based_model)
+            
+            # Reuse the cosine similarities computed by fit, indexed by inner user id
+            self.user_similarity_matrix_i8 = _quantize_similarity(self.user_based_model.sim)
             
             # Save model
             self._save_model(self.user_based_model, "user_based_cf.pkl")
@@ -78,18 +164,7 @@ class CollaborativeFilteringEngine:
         try:
             logger.info("Training item-based collaborative filtering model...")
             
-            self.user_item_matrix = user_item_matrix
-            self.user_ids = user_item_matrix.index.tolist()
-            self.item_ids = user_item_matrix.columns.tolist()
-            
-            # Calculate item similarity matrix
-            item_matrix = user_item_matrix.T.values
-            self.item_similarity_matrix = cosine_similarity(item_matrix)
-            
-            # Create item-based KNN model using Surprise
-            reader = Reader(rating_scale=(0, 5))
-            data = self._prepare_surprise_data(user_item_matrix)
-            dataset = Dataset.load_from_df(data, reader)
+            self._set_user_item_matrix(user_item_matrix)
             
             # Configure KNN parameters
             sim_options = {
@@ -100,8 +175,12 @@ class CollaborativeFilteringEngine:
             self.item_based_model = KNNBasic(k=k, sim_options=sim_options)
             
             # Train the model
-            trainset = dataset.build_full_trainset()
+            trainset = self._get_trainset(user_item_matrix)
             self.item_based_model.fit(trainset)
+            self._item_knn = self._build_knn_index(self.item_based_model)
+            
+            # Reuse the cosine similarities computed by fit, indexed by inner item id
+            self.item_similarity_matrix_i8 = _quantize_similarity(self.item_based_model.sim)
             
             # Save model
             self._save_model(self.item_based_model, "item_based_cf.pkl")
@@ -118,10 +197,7 @@ class CollaborativeFilteringEngine:
         try:
             logger.info(f"Training matrix factorization model ({algorithm})...")
             
-            # Prepare data for Surprise
-            reader = Reader(rating_scale=(0, 5))
-            data = self._prepare_surprise_data(user_item_matrix)
-            dataset = Dataset.load_from_df(data, reader)
+            self._set_user_item_matrix(user_item_matrix)
             
             # Choose algorithm
             if algorithm == 'SVD':
@@ -140,8 +216,9 @@ class CollaborativeFilteringEngine:
                 raise ValueError(f"Unsupported algorithm: {algorithm}")
             
             # Train the model
-            trainset = dataset.build_full_trainset()
+            trainset = self._get_trainset(user_item_matrix)
             self.matrix_factorization_model.fit(trainset)
+            self._cache_mf_factors(trainset)
             
             # Save model
             self._save_model(self.matrix_factorization_model, f"matrix_factorization_{algorithm.lower()}.pkl")
@@ -152,6 +229,40 @@ class CollaborativeFilteringEngine:
             logger.error(f"Error training matrix factorization model: {str(e)}")
             raise
     
+    def train_matrix_factorization_fast(self, user_item_matrix: pd.DataFrame,
+                                        n_factors: int = 100) -> None:
+        """Train matrix factorization with a randomized truncated SVD of the sparse ratings"""
+        try:
+            logger.info("Training matrix factorization model (truncated SVD)...")
+            
+            self._set_user_item_matrix(user_item_matrix)
+            
+            # Randomized SVD runs directly on the CSR ratings and needs fewer
+            # components than the smaller matrix dimension
+            n_components = max(1, min(n_factors, min(self.user_item_matrix.shape) - 1))
+            self.matrix_factorization_model = TruncatedSVD(
+                n_components=n_components,
+                algorithm='randomized',
+                n_iter=4,
+                power_iteration_normalizer='QR',
+                random_state=0
+            )
+            
+            # Scores are plain low-rank reconstructions, so biases and the mean stay zero
+            self._mf_pu = self.matrix_factorization_model.fit_transform(self.user_item_matrix)
+            self._mf_qi = self.matrix_factorization_model.components_.T
+            self._mf_bu = np.zeros(len(self.user_ids))
+            self._mf_bi = np.zeros(len(self.item_ids))
+            self._mf_mean = 0.0
+            self._mf_rating_scale = (0, 5)
+            self._mf_user_inner = self._user_pos
+            
+            logger.info("Matrix factorization model (truncated SVD) trained successfully")
+            
+        except Exception as e:
+            logger.error(f"Error training matrix factorization model: {str(e)}")
+            raise
+    
     def get_user_recommendations(self, user_id: str, n_recommendations: int = 10,
                                method: str = 'hybrid') -> List[Dict]:
         """Get recommendations for a user"""
@@ -186,184 +297,199 @@ class CollaborativeFilteringEngine:
     
     def _get_user_based_recommendations(self, user_id: str, n_recommendations: int) -> List[Dict]:
         """Get user-based collaborative filtering recommendations"""
-        try:
-            if user_id not in self.user_ids:
-                return []
-            
-            user_idx = self.user_ids.index(user_id)
-            user_similarities = self.user_similarity_matrix[user_idx]
-            
-            # Get user's rated items
-            user_ratings = self.user_item_matrix.loc[user_id]
-            unrated_items = user_ratings[user_ratings == 0].index.tolist()
-            
-            # Calculate predicted ratings for unrated items
-            predictions = []
-            for item_id in unrated_items:
-                pred_rating = self.user_based_model.predict(user_id, item_id).est
-                predictions.append({
-                    'product_id': item_id,
-                    'predicted_rating': pred_rating,
-                    'confidence': min(pred_rating / 5.0, 1.0)
-                })
-            
-            # Sort by predicted rating and return top N
-            predictions.sort(key=lambda x: x['predicted_rating'], reverse=True)
-            return predictions[:n_recommendations]
-            
-        except Exception as e:
-            logger.error(f"Error in user-based recommendations: {str(e)}")
+        if user_id not in self._user_pos:
             return []
+        
+        if self._user_knn is None:
+            self._user_knn = self._build_knn_index(self.user_based_model)
+        
+        unrated_idx = self._unrated_items(self._user_pos[user_id])
+        predicted = self._score_knn(self._user_knn, user_id, unrated_idx)
+        return self._format_recommendations(unrated_idx, predicted, n_recommendations)
     
     def _get_item_based_recommendations(self, user_id: str, n_recommendations: int) -> List[Dict]:
         """Get item-based collaborative filtering recommendations"""
-        try:
-            if user_id not in self.user_ids:
-                return []
-            
-            # Get user's rated items
-            user_ratings = self.user_item_matrix.loc[user_id]
-            rated_items = user_ratings[user_ratings > 0].index.tolist()
-            unrated_items = user_ratings[user_ratings == 0].index.tolist()
-            
-            # Calculate predicted ratings for unrated items
-            predictions = []
-            for item_id in unrated_items:
-                pred_rating = self.item_based_model.predict(user_id, item_id).est
-                predictions.append({
-                    'product_id': item_id,
-                    'predicted_rating': pred_rating,
-                    'confidence': min(pred_rating / 5.0, 1.0)
-                })
-            
-            # Sort by predicted rating and return top N
-            predictions.sort(key=lambda x: x['predicted_rating'], reverse=True)
-            return predictions[:n_recommendations]
-            
-        except Exception as e:
-            logger.error(f"Error in item-based recommendations: {str(e)}")
+        if user_id not in self._user_pos:
             return []
+        
+        if self._item_knn is None:
+            self._item_knn = self._build_knn_index(self.item_based_model)
+        
+        unrated_idx = self._unrated_items(self._user_pos[user_id])
+        predicted = self._score_knn(self._item_knn, user_id, unrated_idx)
+        return self._format_recommendations(unrated_idx, predicted, n_recommendations)
     
     def _get_matrix_factorization_recommendations(self, user_id: str, n_recommendations: int) -> List[Dict]:
         """Get matrix factorization recommendations"""
+        if user_id not in self._user_pos:
+            return []
+        
+        if not self._ensure_mf_factors():
+            return []
+        
+        unrated_idx = self._unrated_items(self._user_pos[user_id])
+        predicted = self._score_matrix_factorization(user_id, unrated_idx)
+        return self._format_recommendations(unrated_idx, predicted, n_recommendations)
+    
+    def _score_matrix_factorization(self, user_id: str, item_positions: np.ndarray) -> np.ndarray:
+        """Predict a user's ratings for the given user-item matrix columns from the cached factors"""
+        # Score with one GEMV instead of a predict() call per item
+        inner_uid = self._mf_user_inner.get(user_id)
+        if inner_uid is not None:
+            scores = (self._mf_mean + self._mf_bu[inner_uid] + self._mf_bi[item_positions]
+                      + self._mf_qi[item_positions] @ self._mf_pu[inner_uid])
+        else:
+            scores = self._mf_mean + self._mf_bi[item_positions]
+        return np.clip(scores, *self._mf_rating_scale)
+    
+    def _format_recommendations(self, item_positions: np.ndarray, scores: np.ndarray,
+                                n_recommendations: int) -> List[Dict]:
+        """Build recommendation dicts for the top N scored items"""
+        # Return the top N predicted ratings without sorting every item
+        top = _top_k_indices(scores, n_recommendations)
+        return [
+            {
+                'product_id': self.item_ids[item_positions[i]],
+                'predicted_rating': float(scores[i]),
+                'confidence': min(float(scores[i]) / 5.0, 1.0)
+            }
+            for i in top
+        ]
+    
+    def batch_recommend(self, user_ids: List[str], n_recommendations: int = 10) -> Dict[str, List[Dict]]:
+        """Get matrix factorization recommendations for many users in one batched product"""
         try:
-            if user_id not in self.user_ids:
-                return []
-            
-            # Get user's rated items
-            user_ratings = self.user_item_matrix.loc[user_id]
-            unrated_items = user_ratings[user_ratings == 0].index.tolist()
-            
-            # Calculate predicted ratings for unrated items
-            predictions = []
-            for item_id in unrated_items:
-                pred_rating = self.matrix_factorization_model.predict(user_id, item_id).est
-                predictions.append({
-                    'product_id': item_id,
-                    'predicted_rating': pred_rating,
-                    'confidence': min(pred_rating / 5.0, 1.0)
-                })
+            recommendations = {user_id: [] for user_id in user_ids}
+            known = [user_id for user_id in user_ids if user_id in self._user_pos]
+            if not self.matrix_factorization_model or not known:
+                return recommendations
+            
+            if not self._ensure_mf_factors():
+                return recommendations
+            
+            # Users missing from the trainset keep zero factors and bias, scoring mean + bi
+            inner = np.array([self._mf_user_inner.get(user_id, -1) for user_id in known])
+            has_factors = inner >= 0
+            pu = np.zeros((len(known), self._mf_qi.shape[1]))
+            pu[has_factors] = self._mf_pu[inner[has_factors]]
+            bu = np.zeros(len(known))
+            bu[has_factors] = self._mf_bu[inner[has_factors]]
+            
+            positions = np.array([self._user_pos[user_id] for user_id in known])
+            rated = np.unpackbits(self._rated_bits[positions], axis=1, count=len(self.item_ids)).astype(bool)
+            k = min(n_recommendations, len(self.item_ids))
+            
+            if torch is not None and torch.cuda.is_available():
+                top_scores, top_idx = self._batch_top_k_gpu(pu, bu, rated, k)
+            else:
+                scores = self._mf_mean + bu[:, None] + self._mf_bi[None, :] + pu @ self._mf_qi.T
+                scores = np.clip(scores, *self._mf_rating_scale)
+                scores[rated] = -np.inf
+                top_idx = _top_k_rows(scores, k)
+                top_scores = np.take_along_axis(scores, top_idx, axis=1)
+            
+            for row, user_id in enumerate(known):
+                # Users with fewer than k unrated items get -inf fillers
+                recommendations[user_id] = [
+                    {
+                        'product_id': self.item_ids[item],
+                        'predicted_rating': float(score),
+                        'confidence': min(float(score) / 5.0, 1.0)
+                    }
+                    for item, score in zip(top_idx[row], top_scores[row])
+                    if np.isfinite(score)
+                ]
             
-            # Sort by predicted rating and return top N
-            predictions.sort(key=lambda x: x['predicted_rating'], reverse=True)
-            return predictions[:n_recommendations]
+            return recommendations
             
         except Exception as e:
-            logger.error(f"Error in matrix factorization recommendations: {str(e)}")
-            return []
+            logger.error(f"Error in batch recommendations: {str(e)}")
+            return {user_id: [] for user_id in user_ids}
+    
+    def _batch_top_k_gpu(self, pu: np.ndarray, bu: np.ndarray, rated: np.ndarray,
+                         k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Score a batch of users with a bfloat16 GEMM on the GPU and keep the top k"""
+        device = torch.device('cuda')
+        qi = torch.from_numpy(self._mf_qi).to(device, torch.bfloat16)
+        users = torch.from_numpy(pu).to(device, torch.bfloat16)
+        
+        # bfloat16 only for the GEMM; biases are added in float32
+        scores = (users @ qi.T).float()
+        scores += torch.from_numpy(bu).to(device, torch.float32)[:, None]
+        scores += torch.from_numpy(self._mf_bi).to(device, torch.float32)[None, :]
+        scores += self._mf_mean
+        scores.clamp_(*self._mf_rating_scale)
+        scores.masked_fill_(torch.from_numpy(rated).to(device), float('-inf'))
+        
+        top_scores, top_idx = torch.topk(scores, k, dim=1)
+        return top_scores.cpu().numpy(), top_idx.cpu().numpy()
     
     def _get_hybrid_recommendations(self, user_id: str, n_recommendations: int) -> List[Dict]:
         """Get hybrid recommendations combining multiple methods"""
-        try:
-            all_recommendations = {}
-            
-            # Get recommendations from different methods
-            if self.user_based_model:
-                user_based_recs = self._get_user_based_recommendations(
-                    user_id, n_recommendations * 2
-                )
-                for rec in user_based_recs:
-                    prod_id = rec['product_id']
-                    if prod_id not in all_recommendations:
-                        all_recommendations[prod_id] = {
-                            'product_id': prod_id,
-                            'scores': [],
-                            'methods': []
-                        }
-                    all_recommendations[prod_id]['scores'].append(rec['predicted_rating'])
-                    all_recommendations[prod_id]['methods'].append('user_based')
-            
-            if self.item_based_model:
-                item_based_recs = self._get_item_based_recommendations(
-                    user_id, n_recommendations * 2
-                )
-                for rec in item_based_recs:
-                    prod_id = rec['product_id']
-                    if prod_id not in all_recommendations:
-                        all_recommendations[prod_id] = {
-                            'product_id': prod_id,
-                            'scores': [],
-                            'methods': []
-                        }
-                    all_recommendations[prod_id]['scores'].append(rec['predicted_rating'])
-                    all_recommendations[prod_id]['methods'].append('item_based')
-            
-            if self.matrix_factorization_model:
-                mf_recs = self._get_matrix_factorization_recommendations(
-                    user_id, n_recommendations * 2
-                )
-                for rec in mf_recs:
-                    prod_id = rec['product_id']
-                    if prod_id not in all_recommendations:
-                        all_recommendations[prod_id] = {
-                            'product_id': prod_id,
-                            'scores': [],
-                            'methods': []
-                        }
-                    all_recommendations[prod_id]['scores'].append(rec['predicted_rating'])
-                    all_recommendations[prod_id]['methods'].append('matrix_factorization')
-            
-            # Calculate hybrid scores
-            hybrid_recommendations = []
-            for prod_id, data in all_recommendations.items():
-                # Average the scores from different methods
-                avg_score = np.mean(data['scores'])
-                # Boost score if recommended by multiple methods
-                method_boost = len(data['methods']) * 0.1
-                final_score = avg_score + method_boost
-                
-                hybrid_recommendations.append({
-                    'product_id': prod_id,
-                    'predicted_rating': final_score,
-                    'confidence': min(final_score / 5.0, 1.0),
-                    'methods_used': data['methods']
-                })
-            
-            # Sort by final score and return top N
-            hybrid_recommendations.sort(key=lambda x: x['predicted_rating'], reverse=True)
-            return hybrid_recommendations[:n_recommendations]
-            
-        except Exception as e:
-            logger.error(f"Error in hybrid recommendations: {str(e)}")
-            return []
+        methods = [
+            ('user_based', self.user_based_model, self._get_user_based_recommendations),
+            ('item_based', self.item_based_model, self._get_item_based_recommendations),
+            ('matrix_factorization', self.matrix_factorization_model,
+             self._get_matrix_factorization_recommendations)
+        ]
+        
+        # One row of predicted ratings per method, NaN where it made no recommendation
+        scores = np.full((len(methods), len(self.item_ids)), np.nan)
+        for row, (method, model, get_recommendations) in enumerate(methods):
+            if model:
+                # A failing method is skipped so the others still contribute
+                try:
+                    method_recs = get_recommendations(user_id, n_recommendations * 2)
+                except Exception as e:
+                    logger.error(f"Error in {method} recommendations: {str(e)}")
+                    continue
+                for rec in method_recs:
+                    scores[row, self._item_pos[rec['product_id']]] = rec['predicted_rating']
+        
+        recommended = ~np.isnan(scores)
+        method_counts = recommended.sum(axis=0)
+        candidates = np.flatnonzero(method_counts)
+        
+        # Average the scores from different methods and boost
+        # items recommended by multiple methods
+        final_scores = np.nanmean(scores[:, candidates], axis=0) + method_counts[candidates] * 0.1
+        
+        # Return top N by final score
+        top = _top_k_indices(final_scores, n_recommendations)
+        return [
+            {
+                'product_id': self.item_ids[candidates[i]],
+                'predicted_rating': float(final_scores[i]),
+                'confidence': min(float(final_scores[i]) / 5.0, 1.0),
+                'methods_used': [methods[row][0] for row in np.flatnonzero(recommended[:, candidates[i]])]
+            }
+            for i in top
+        ]
     
     def get_similar_users(self, user_id: str, n_similar: int = 10) -> List[Dict]:
         """Get similar users for a given user"""
         try:
-            if user_id not in self.user_ids or self.user_similarity_matrix is None:
+            if self.user_similarity_matrix_i8 is None:
                 return []
             
-            user_idx = self.user_ids.index(user_id)
-            similarities = self.user_similarity_matrix[user_idx]
+            if self._user_knn is None:
+                self._user_knn = self._build_knn_index(self.user_based_model)
+            if user_id not in self._user_knn['user_inner']:
+                return []
+            
+            trainset = self.user_based_model.trainset
+            inner_uid = self._user_knn['user_inner'][user_id]
+            similarities = self.user_similarity_matrix_i8[inner_uid]
             
             # Get indices of most similar users (excluding the user itself)
-            similar_indices = np.argsort(similarities)[::-1][1:n_similar + 1]
+            similar_indices = _top_k_indices(similarities, n_similar + 1)
+            similar_indices = similar_indices[similar_indices != inner_uid][:n_similar]
             
             similar_users = []
             for idx in similar_indices:
                 similar_users.append({
-                    'user_id': self.user_ids[idx],
-                    'similarity_score': similarities[idx]
+                    'user_id': trainset.to_raw_uid(int(idx)),
+                    'similarity_score': float(similarities[idx]) / SIMILARITY_SCALE
                 })
             
             return similar_users
@@ -375,20 +501,29 @@ class CollaborativeFilteringEngine:
     def get_similar_items(self, item_id: str, n_similar: int = 10) -> List[Dict]:
         """Get similar items for a given item"""
         try:
-            if item_id not in self.item_ids or self.item_similarity_matrix is None:
+            if item_id not in self._item_pos or self.item_similarity_matrix_i8 is None:
+                return []
+            
+            if self._item_knn is None:
+                self._item_knn = self._build_knn_index(self.item_based_model)
+            
+            # Items without ratings are not in the trainset
+            inner_iid = self._item_knn['item_inner'][self._item_pos[item_id]]
+            if inner_iid < 0:
                 return []
             
-            item_idx = self.item_ids.index(item_id)
-            similarities = self.item_similarity_matrix[item_idx]
+            trainset = self.item_based_model.trainset
+            similarities = self.item_similarity_matrix_i8[inner_iid]
             
             # Get indices of most similar items (excluding the item itself)
-            similar_indices = np.argsort(similarities)[::-1][1:n_similar + 1]
+            similar_indices = _top_k_indices(similarities, n_similar + 1)
+            similar_indices = similar_indices[similar_indices != inner_iid][:n_similar]
             
             similar_items = []
             for idx in similar_indices:
                 similar_items.append({
-                    'product_id': self.item_ids[idx],
-                    'similarity_score': similarities[idx]
+                    'product_id': trainset.to_raw_iid(int(idx)),
+                    'similarity_score': float(similarities[idx]) / SIMILARITY_SCALE
                 })
             
             return similar_items
@@ -401,29 +536,28 @@ class CollaborativeFilteringEngine:
         """Evaluate the collaborative filtering models"""
         try:
             # Prepare data for evaluation
-            reader = Reader(rating_scale=(0, 5))
-            data = self._prepare_surprise_data(user_item_matrix)
-            dataset = Dataset.load_from_df(data, reader)
+            dataset = self._get_dataset(user_item_matrix)
             
             results = {}
             
             # Evaluate each model if available
             if self.user_based_model:
-                cv_results = cross_validate(self.user_based_model, dataset, measures=['RMSE', 'MAE'], cv=5)
+                cv_results = cross_validate(self.user_based_model, dataset, measures=['RMSE', 'MAE'], cv=5, n_jobs=-1)
                 results['user_based'] = {
                     'rmse': np.mean(cv_results['test_rmse']),
                     'mae': np.mean(cv_results['test_mae'])
                 }
             
             if self.item_based_model:
-                cv_results = cross_validate(self.item_based_model, dataset, measures=['RMSE', 'MAE'], cv=5)
+                cv_results = cross_validate(self.item_based_model, dataset, measures=['RMSE', 'MAE'], cv=5, n_jobs=-1)
                 results['item_based'] = {
                     'rmse': np.mean(cv_results['test_rmse']),
                     'mae': np.mean(cv_results['test_mae'])
                 }
             
-            if self.matrix_factorization_model:
-                cv_results = cross_validate(self.matrix_factorization_model, dataset, measures=['RMSE', 'MAE'], cv=5)
+            # Truncated SVD factors are not a Surprise algorithm and cannot be cross-validated
+            if isinstance(self.matrix_factorization_model, (SVD, NMF)):
+                cv_results = cross_validate(self.matrix_factorization_model, dataset, measures=['RMSE', 'MAE'], cv=5, n_jobs=-1)
                 results['matrix_factorization'] = {
                     'rmse': np.mean(cv_results['test_rmse']),
                     'mae': np.mean(cv_results['test_mae'])
@@ -441,9 +575,7 @@ class CollaborativeFilteringEngine:
             logger.info(f"Tuning hyperparameters for {algorithm}...")
             
             # Prepare data
-            reader = Reader(rating_scale=(0, 5))
-            data = self._prepare_surprise_data(user_item_matrix)
-            dataset = Dataset.load_from_df(data, reader)
+            dataset = self._get_dataset(user_item_matrix)
             
             if algorithm == 'SVD':
                 param_grid = {
@@ -452,22 +584,25 @@ class CollaborativeFilteringEngine:
                     'lr_all': [0.002, 0.005, 0.01],
                     'reg_all': [0.02, 0.05, 0.1]
                 }
-                gs = GridSearchCV(SVD, param_grid, measures=['rmse'], cv=3)
+                algo_class = SVD
                 
             elif algorithm == 'NMF':
                 param_grid = {
                     'n_factors': [25, 50, 75],
                     'n_epochs': [30, 50, 70]
                 }
-                gs = GridSearchCV(NMF, param_grid, measures=['rmse'], cv=3)
+                algo_class = NMF
                 
             else:
                 raise ValueError(f"Hyperparameter tuning not supported for {algorithm}")
             
-            gs.fit(dataset)
-            
-            best_params = gs.best_params['rmse']
-            best_score = gs.best_score['rmse']
+            if optuna is not None:
+                best_params, best_score = self._optuna_search(algo_class, param_grid, dataset)
+            else:
+                gs = GridSearchCV(algo_class, param_grid, measures=['rmse'], cv=3)
+                gs.fit(dataset)
+                best_params = gs.best_params['rmse']
+                best_score = gs.best_score['rmse']
             
             logger.info(f"Best parameters for {algorithm}: {best_params}")
             logger.info(f"Best RMSE score: {best_score}")
@@ -482,22 +617,200 @@ class CollaborativeFilteringEngine:
             logger.error(f"Error tuning hyperparameters: {str(e)}")
             return {}
     
+    def _optuna_search(self, algo_class, param_grid: Dict, dataset: Dataset,
+                       n_splits: int = 3) -> Tuple[Dict, float]:
+        """Search the parameter grid with TPE sampling and median pruning"""
+        # Every trial is scored on the same folds so pruning compares like with like
+        folds = list(KFold(n_splits=n_splits, random_state=0).split(dataset))
+        
+        def objective(trial):
+            params = {name: trial.suggest_categorical(name, values) for name, values in param_grid.items()}
+            fold_rmse = []
+            # Surprise cannot stop a fit mid-epoch, so trials are pruned between folds
+            for step, (trainset, testset) in enumerate(folds):
+                algo = algo_class(**params)
+                algo.fit(trainset)
+                fold_rmse.append(accuracy.rmse(algo.test(testset), verbose=False))
+                trial.report(float(np.mean(fold_rmse)), step)
+                if trial.should_prune():
+                    raise optuna.TrialPruned()
+            return float(np.mean(fold_rmse))
+        
+        grid_size = int(np.prod([len(values) for values in param_grid.values()]))
+        study = optuna.create_study(
+            direction='minimize',
+            sampler=optuna.samplers.TPESampler(seed=0),
+            pruner=optuna.pruners.MedianPruner(n_startup_trials=5)
+        )
+        study.optimize(objective, n_trials=min(TUNING_TRIALS, grid_size))
+        
+        return study.best_params, study.best_value
+    
+    def _set_user_item_matrix(self, user_item_matrix: pd.DataFrame) -> None:
+        """Store the training matrix sparsely and build O(1) id-to-position lookups"""
+        # KNN indexes and MF factors are aligned to the old rows and columns;
+        # drop them so they are rebuilt against the new ones
+        if not (self.user_ids is not None
+                and self.user_ids.equals(user_item_matrix.index)
+                and self.item_ids.equals(user_item_matrix.columns)):
+            self._user_knn = None
+            self._item_knn = None
+            self._mf_pu = None
+            self._mf_qi = None
+            self._mf_bu = None
+            self._mf_bi = None
+            self._mf_user_inner = {}
+        
+        self.user_item_matrix = _to_csr(user_item_matrix)
+        # Per-user rated flags, bit-packed to one bit per item, so serving never rescans the ratings
+        self._rated_bits = _pack_rated_bits(self.user_item_matrix)
+        self.user_ids = user_item_matrix.index
+        self.item_ids = user_item_matrix.columns
+        self._user_pos = {user_id: pos for pos, user_id in enumerate(self.user_ids)}
+        self._item_pos = {item_id: pos for pos, item_id in enumerate(self.item_ids)}
+    
+    def _unrated_items(self, user_idx: int) -> np.ndarray:
+        """Positions of the items a user has not rated"""
+        # Inverting the packed row flips eight items per byte; count drops the padding bits
+        return np.flatnonzero(np.unpackbits(~self._rated_bits[user_idx], count=len(self.item_ids)))
+    
+    def _get_dataset(self, user_item_matrix: pd.DataFrame) -> Dataset:
+        """Build the Surprise dataset once per user-item matrix"""
+        # A weak reference avoids both pinning the frame and matching a recycled id()
+        if self._cached_matrix_ref is None or self._cached_matrix_ref() is not user_item_matrix:
+            reader = Reader(rating_scale=(0, 5))
+            data = self._prepare_surprise_data(user_item_matrix)
+            self._cached_dataset = Dataset.load_from_df(data, reader)
+            self._cached_trainset = None
+            self._cached_matrix_ref = weakref.ref(user_item_matrix)
+        
+        return self._cached_dataset
+    
+    def _get_trainset(self, user_item_matrix: pd.DataFrame):
+        """Build the full Surprise trainset once per user-item matrix"""
+        dataset = self._get_dataset(user_item_matrix)
+        if self._cached_trainset is None:
+            self._cached_trainset = dataset.build_full_trainset()
+        
+        return self._cached_trainset
+    
     def _prepare_surprise_data(self, user_item_matrix: pd.DataFrame) -> pd.DataFrame:
         """Prepare data for Surprise library"""
-        data = []
-        for user_id in user_item_matrix.index:
-            for item_id in user_item_matrix.columns:
-                rating = user_item_matrix.loc[user_id, item_id]
-                if rating > 0:  # Only include non-zero ratings
-                    data.append([user_id, item_id, rating])
+        ratings = _to_csr(user_item_matrix)
+        rows = np.repeat(np.arange(ratings.shape[0]), np.diff(ratings.indptr))
+        
+        # Only include non-zero ratings
+        positive = ratings.data > 0
+        return pd.DataFrame({
+            'user_id': user_item_matrix.index.to_numpy()[rows[positive]],
+            'item_id': user_item_matrix.columns.to_numpy()[ratings.indices[positive]],
+            'rating': ratings.data[positive]
+        })
+    
+    def _inner_id_maps(self, trainset) -> Tuple[Dict, np.ndarray]:
+        """Map raw user ids and user-item matrix columns to Surprise inner ids"""
+        user_inner = {trainset.to_raw_uid(uid): uid for uid in trainset.all_users()}
+        item_inner = {trainset.to_raw_iid(iid): iid for iid in trainset.all_items()}
+        
+        # Items unknown to the trainset are marked with -1
+        inner_iids = np.array([item_inner.get(item_id, -1) for item_id in self.item_ids], dtype=np.intp)
+        return user_inner, inner_iids
+    
+    def _build_knn_index(self, model) -> Dict:
+        """Flatten a fitted KNN model's neighbour ratings into CSR arrays"""
+        trainset = model.trainset
+        user_based = model.sim_options['user_based']
+        
+        # User-based models need each item's raters, item-based each user's items
+        neighbour_ratings = trainset.ir if user_based else trainset.ur
+        n_rows = trainset.n_items if user_based else trainset.n_users
+        
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum([len(neighbour_ratings[row]) for row in range(n_rows)], out=indptr[1:])
+        pairs = [pair for row in range(n_rows) for pair in neighbour_ratings[row]]
+        
+        user_inner, inner_iids = self._inner_id_maps(trainset)
+        return {
+            'user_based': user_based,
+            'sim': model.sim,
+            'indptr': indptr,
+            'indices': np.array([pair[0] for pair in pairs], dtype=np.int64),
+            'ratings': np.array([pair[1] for pair in pairs], dtype=np.float64),
+            'user_inner': user_inner,
+            'item_inner': inner_iids,
+            'k': model.k,
+            'min_k': model.min_k,
+            'default': trainset.global_mean
+        }
+    
+    def _score_knn(self, knn_index: Dict, user_id: str, item_positions: np.ndarray) -> np.ndarray:
+        """Predict a user's ratings for the given user-item matrix columns"""
+        predicted = np.empty(len(item_positions))
+        inner_uid = knn_index['user_inner'].get(user_id)
+        if inner_uid is None:
+            predicted.fill(knn_index['default'])
+            return predicted
+        
+        targets = knn_index['item_inner'][item_positions]
+        indptr, indices, ratings = knn_index['indptr'], knn_index['indices'], knn_index['ratings']
+        
+        if knn_index['user_based']:
+            predict_user_based(
+                knn_index['sim'][inner_uid], targets, indptr, indices, ratings,
+                knn_index['k'], knn_index['min_k'], knn_index['default'], predicted
+            )
+        else:
+            start, end = indptr[inner_uid], indptr[inner_uid + 1]
+            predict_item_based(
+                knn_index['sim'], targets, indices[start:end], ratings[start:end],
+                knn_index['k'], knn_index['min_k'], knn_index['default'], predicted
+            )
+        
+        return predicted
+    
+    def _ensure_mf_factors(self) -> bool:
+        """Make sure MF factors aligned to the current matrix are cached"""
+        if self._mf_qi is not None:
+            return True
+        
+        # Truncated SVD factors come from the matrix itself and need a retrain
+        trainset = getattr(self.matrix_factorization_model, 'trainset', None)
+        if trainset is None:
+            logger.warning("Matrix factorization model must be retrained on the current user-item matrix")
+            return False
+        
+        self._cache_mf_factors(trainset)
+        return True
+    
+    def _cache_mf_factors(self, trainset) -> None:
+        """Cache matrix factorization factors and biases for vectorized scoring"""
+        model = self.matrix_factorization_model
+        self._mf_user_inner, inner_iids = self._inner_id_maps(trainset)
+        known = inner_iids >= 0
+        
+        # Items unknown to the trainset keep zero factors and biases, as in predict()
+        self._mf_qi = np.zeros((len(self.item_ids), model.qi.shape[1]))
+        self._mf_qi[known] = model.qi[inner_iids[known]]
+        self._mf_bi = np.zeros(len(self.item_ids))
+        self._mf_pu = model.pu
+        
+        # NMF is unbiased by default and predicts from the factors alone
+        if getattr(model, 'biased', True):
+            self._mf_bi[known] = model.bi[inner_iids[known]]
+            self._mf_bu = model.bu
+            self._mf_mean = trainset.global_mean
+        else:
+            self._mf_bu = np.zeros(model.pu.shape[0])
+            self._mf_mean = 0.0
         
-        return pd.DataFrame(data, columns=['user_id', 'item_id', 'rating'])
+        self._mf_rating_scale = trainset.rating_scale
     
     def _save_model(self, model, filename: str) -> None:
         """Save trained model to disk"""
         try:
             filepath = os.path.join(self.model_path, filename)
-            joblib.dump(model, filepath)
+            # Left uncompressed: compressed pickles cannot be memory-mapped on load
+            joblib.dump(model, filepath, protocol=5)
             logger.info(f"Model saved to {filepath}")
         except Exception as e:
             logger.error(f"Error saving model: {str(e)}")
@@ -507,7 +820,8 @@ class CollaborativeFilteringEngine:
         try:
             filepath = os.path.join(self.model_path, filename)
             if os.path.exists(filepath):
-                model = joblib.load(filepath)
+                # Map the similarity and factor arrays read-only instead of copying them in
+                model = joblib.load(filepath, mmap_mode='r')
                 logger.info(f"Model loaded from {filepath}")
                 return model
             else:
@@ -539,6 +853,6 @@ class CollaborativeFilteringEngine:
             'item_based_model': self.item_based_model is not None,
             'matrix_factorization_model': self.matrix_factorization_model is not None,
             'user_item_matrix_shape': self.user_item_matrix.shape if self.user_item_matrix is not None else None,
-            'num_users': len(self.user_ids) if self.user_ids else 0,
-            'num_items': len(self.item_ids) if self.item_ids else 0
+            'num_users': len(self.user_ids) if self.user_ids is not None else 0,
+            'num_items': len(self.item_ids) if self.item_ids is not None else 0
         }
\ No newline at end of file
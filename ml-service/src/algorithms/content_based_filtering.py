@@ -4,28 +4,82 @@ Content-Based Filtering Algorithm for Product Recommendations
 
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Optional
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity, euclidean_distances
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from sklearn.decomposition import PCA
+from scipy import sparse
+from typing import List, Dict, Optional, Tuple
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.pipeline import make_pipeline
+from sklearn.metrics.pairwise import euclidean_distances
+from sklearn.preprocessing import StandardScaler, MinMaxScaler, normalize
+from sklearn.decomposition import IncrementalPCA
 import logging
+import threading
 import joblib
 import os
 
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
 logger = logging.getLogger(__name__)
 
+# Catalogs at least this large get an approximate IVF-PQ index instead of exact search
+FAISS_IVF_MIN_PRODUCTS = 50000
+
+# Rows densified at a time when fitting and applying PCA to sparse features
+PCA_BATCH_SIZE = 4096
+
+# Most popular products kept per category for serving category recommendations
+CATEGORY_TOP_N = 100
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return indices of the k highest scores, best first, without a full sort"""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def _top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row-wise indices of the k highest scores, best first"""
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def _one_hot(values: pd.Series) -> sparse.csr_matrix:
+    """Sparse one-hot encoding with columns in sorted value order, like pd.get_dummies"""
+    codes, uniques = pd.factorize(values, sort=True)
+    # Missing values get code -1 and an all-zero row
+    rows = np.flatnonzero(codes >= 0)
+    return sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, codes[rows])), shape=(len(values), len(uniques))
+    )
+
+
 class ContentBasedFilteringEngine:
     """Content-based filtering recommendation engine"""
     
     def __init__(self, model_path: str = "models/"):
         self.model_path = model_path
-        self.tfidf_vectorizer = None
+        self.text_pipeline = None
         self.scaler = StandardScaler()
         self.pca = None
         self.product_features = None
+        self.product_features_norm = None
+        self.index = None
+        # Per-thread score buffers reused across exact-search queries
+        self._scratch = threading.local()
         self.product_ids = None
-        self.similarity_matrix = None
+        self.product_id_to_idx: Dict[str, int] = {}
+        self.category_tops: Dict[str, Tuple[List[str], List[float]]] = {}
         self.feature_weights = {
             'text': 0.4,
             'category': 0.3,
@@ -42,20 +96,28 @@ class ContentBasedFilteringEngine:
             logger.info("Training content-based filtering model...")
             
             # Store product IDs
-            self.product_ids = products_df['product_id'].tolist()
+            self.product_ids = np.asarray(products_df['product_id'].to_numpy(), dtype=object)
+            self.product_id_to_idx = {product_id: idx for idx, product_id in enumerate(self.product_ids)}
             
             # Extract and combine features
-            features = self._extract_features(products_df)
+            features = self._extract_features(products_df).astype(np.float32)
             
-            # Apply PCA for dimensionality reduction if needed
-            if features.shape[1] > 500:
-                self.pca = PCA(n_components=500)
-                features = self.pca.fit_transform(features)
+            # Apply PCA for dimensionality reduction if needed; the hashed text
+            # features are always wide, so small catalogs must skip it too
+            if min(features.shape) > 500:
+                features = self._fit_transform_pca(features, n_components=min(500, *features.shape))
+            else:
+                self.pca = None
+            
+            # Single precision is plenty for cosine similarity and halves memory traffic
+            self.product_features = features.astype(np.float32, copy=False)
             
-            self.product_features = features
+            # Unit-length rows turn cosine similarity into a plain dot product,
+            # so each query costs one product instead of an N x N matrix
+            self.product_features_norm = normalize(self.product_features, norm='l2', axis=1)
+            self._build_index()
             
-            # Calculate similarity matrix
-            self.similarity_matrix = cosine_similarity(features)
+            self._build_category_tops(products_df)
             
             # Adjust feature weights based on user interactions if available
             if user_interactions_df is not None:
@@ -70,28 +132,41 @@ class ContentBasedFilteringEngine:
             logger.error(f"Error training content-based filtering model: {str(e)}")
             raise
     
+    def _fit_transform_pca(self, features: sparse.csr_matrix, n_components: int) -> np.ndarray:
+        """Fit incremental PCA on dense row chunks so the full matrix is never densified"""
+        # Split into near-equal chunks of at least PCA_BATCH_SIZE rows
+        n_batches = max(1, features.shape[0] // PCA_BATCH_SIZE)
+        batches = np.array_split(np.arange(features.shape[0]), n_batches)
+        
+        # Every partial fit needs at least n_components rows, so a short
+        # single batch clamps the component count
+        n_components = min(n_components, features.shape[1], min(len(rows) for rows in batches))
+        
+        self.pca = IncrementalPCA(n_components=n_components)
+        for rows in batches:
+            self.pca.partial_fit(features[rows].toarray())
+        
+        reduced = np.empty((features.shape[0], n_components), dtype=np.float32)
+        for rows in batches:
+            reduced[rows] = self.pca.transform(features[rows].toarray())
+        return reduced
+    
     def get_similar_products(self, product_id: str, n_recommendations: int = 10) -> List[Dict]:
         """Get products similar to a given product"""
         try:
-            if product_id not in self.product_ids:
+            if product_id not in self.product_id_to_idx:
                 logger.warning(f"Product {product_id} not found in training data")
                 return []
             
-            product_idx = self.product_ids.index(product_id)
-            similarities = self.similarity_matrix[product_idx]
+            product_idx = self.product_id_to_idx[product_id]
             
             # Get indices of most similar products (excluding the product itself)
-            similar_indices = np.argsort(similarities)[::-1][1:n_recommendations + 1]
-            
-            similar_products = []
-            for idx in similar_indices:
-                similar_products.append({
-                    'product_id': self.product_ids[idx],
-                    'similarity_score': float(similarities[idx]),
-                    'confidence': min(float(similarities[idx]), 1.0)
-                })
+            similar_indices, similarities = self._search(self.product_features_norm[product_idx], n_recommendations + 1)
+            keep = similar_indices != product_idx
+            similar_indices = similar_indices[keep][:n_recommendations]
+            similarities = similarities[keep][:n_recommendations]
             
-            return similar_products
+            return self._format_recommendations(similar_indices, similarities)
             
         except Exception as e:
             logger.error(f"Error getting similar products: {str(e)}")
@@ -110,61 +185,213 @@ class ContentBasedFilteringEngine:
                 logger.warning(f"Could not create user profile vector for user {user_id}")
                 return []
             
-            # Calculate similarity between user profile and all products
-            similarities = cosine_similarity([user_vector], self.product_features)[0]
+            # Product rows are already unit length, so only the query needs normalizing
+            user_norm = np.linalg.norm(user_vector)
+            user_vector_norm = user_vector / user_norm if user_norm > 0 else user_vector
+            similar_indices, similarities = self._search(user_vector_norm, n_recommendations)
             
-            # Get indices of most similar products
-            similar_indices = np.argsort(similarities)[::-1][:n_recommendations]
+            return self._format_recommendations(similar_indices, similarities)
             
-            recommendations = []
-            for idx in similar_indices:
-                recommendations.append({
-                    'product_id': self.product_ids[idx],
-                    'similarity_score': float(similarities[idx]),
-                    'confidence': min(float(similarities[idx]), 1.0)
-                })
+        except Exception as e:
+            logger.error(f"Error getting user recommendations: {str(e)}")
+            return []
+    
+    def get_user_recommendations_batch(self, user_profiles: Dict[str, Dict], products_df: pd.DataFrame,
+                                       n_recommendations: int = 10) -> Dict[str, List[Dict]]:
+        """Get content-based recommendations for many users with one batched similarity product"""
+        try:
+            recommendations = {user_id: [] for user_id in user_profiles}
+            
+            vectors = {}
+            for user_id, user_profile in user_profiles.items():
+                user_vector = self._create_user_profile_vector(user_profile, products_df)
+                if user_vector is not None:
+                    vectors[user_id] = user_vector
+            
+            k = min(n_recommendations, len(self.product_ids))
+            if not vectors or k <= 0:
+                return recommendations
+            
+            # Normalize every profile at once; all-zero profiles stay zero
+            user_matrix = np.vstack(list(vectors.values()))
+            norms = np.linalg.norm(user_matrix, axis=1, keepdims=True)
+            user_matrix = np.divide(user_matrix, norms, out=np.zeros_like(user_matrix), where=norms > 0)
+            
+            top_indices, top_scores = self._search_batch(user_matrix, k)
+            
+            for row, user_id in enumerate(vectors):
+                # FAISS pads with -1 when fewer than k products are available
+                found = top_indices[row] >= 0
+                recommendations[user_id] = self._format_recommendations(
+                    top_indices[row][found], top_scores[row][found]
+                )
             
             return recommendations
             
         except Exception as e:
-            logger.error(f"Error getting user recommendations: {str(e)}")
-            return []
+            logger.error(f"Error getting batch user recommendations: {str(e)}")
+            return {user_id: [] for user_id in user_profiles}
     
     def get_category_recommendations(self, category: str, products_df: pd.DataFrame, 
                                    n_recommendations: int = 10) -> List[Dict]:
         """Get recommendations for a specific category"""
         try:
+            # Serve from the ranking precomputed at train time when it is deep enough
+            if category in self.category_tops and n_recommendations <= CATEGORY_TOP_N:
+                product_ids, scores = self.category_tops[category]
+                return self._format_category_recommendations(
+                    product_ids[:n_recommendations], scores[:n_recommendations]
+                )
+            
             # Filter products by category
             category_products = products_df[products_df['category'] == category]
             
             if category_products.empty:
                 return []
             
-            # Calculate popularity scores
-            category_products = category_products.copy()
-            category_products['popularity_score'] = (
-                category_products['rating'] * 0.7 + 
-                np.log1p(category_products['review_count']) * 0.3
-            )
-            
-            # Sort by popularity and return top N
-            top_products = category_products.nlargest(n_recommendations, 'popularity_score')
-            
-            recommendations = []
-            for _, product in top_products.iterrows():
-                recommendations.append({
-                    'product_id': product['product_id'],
-                    'popularity_score': float(product['popularity_score']),
-                    'confidence': min(float(product['popularity_score']) / 5.0, 1.0)
-                })
+            # Select the top N by popularity without sorting the whole category
+            popularity = self._popularity_scores(category_products)
+            top_indices = _top_k_indices(popularity, n_recommendations)
             
-            return recommendations
+            return self._format_category_recommendations(
+                category_products['product_id'].to_numpy()[top_indices].tolist(),
+                popularity[top_indices].tolist()
+            )
             
         except Exception as e:
             logger.error(f"Error getting category recommendations: {str(e)}")
             return []
     
-    def _extract_features(self, products_df: pd.DataFrame) -> np.ndarray:
+    def _build_category_tops(self, products_df: pd.DataFrame) -> None:
+        """Rank the most popular products of every category once at train time"""
+        self.category_tops = {}
+        if not {'category', 'rating', 'review_count'}.issubset(products_df.columns):
+            return
+        
+        ranked = products_df[['product_id', 'category']].assign(
+            popularity_score=self._popularity_scores(products_df)
+        )
+        # NaN scores would sort first; drop them as nlargest did
+        ranked = ranked.dropna(subset=['popularity_score'])
+        # Stable sort keeps ties in catalog order, like the per-call top-k path
+        ranked = ranked.sort_values('popularity_score', ascending=False, kind='stable')
+        ranked = ranked.groupby('category', sort=False).head(CATEGORY_TOP_N)
+        
+        self.category_tops = {
+            category: (group['product_id'].tolist(), group['popularity_score'].tolist())
+            for category, group in ranked.groupby('category', sort=False)
+        }
+    
+    def _popularity_scores(self, products_df: pd.DataFrame) -> np.ndarray:
+        """Popularity from rating and review volume"""
+        # Missing values are filled as in the numerical features
+        ratings = products_df['rating'].fillna(products_df['rating'].mean())
+        return (
+            ratings.to_numpy(dtype=np.float64) * 0.7 +
+            np.log1p(products_df['review_count'].fillna(0).to_numpy(dtype=np.float64)) * 0.3
+        )
+    
+    def _format_category_recommendations(self, product_ids: List[str], scores: List[float]) -> List[Dict]:
+        """Build popularity results from already converted ids and scores"""
+        return [
+            {
+                'product_id': product_id,
+                'popularity_score': score,
+                'confidence': min(score / 5.0, 1.0)
+            }
+            for product_id, score in zip(product_ids, scores)
+        ]
+    
+    def _format_recommendations(self, indices: np.ndarray, similarities: np.ndarray) -> List[Dict]:
+        """Build similarity results, gathering ids and converting scores in one call each"""
+        return [
+            {
+                'product_id': product_id,
+                'similarity_score': similarity,
+                'confidence': min(similarity, 1.0)
+            }
+            for product_id, similarity in zip(
+                self.product_ids[indices].tolist(),
+                np.asarray(similarities, dtype=np.float64).tolist()
+            )
+        ]
+    
+    def _build_index(self) -> None:
+        """Index the normalized product features for inner-product search with FAISS"""
+        if faiss is None:
+            self.index = None
+            return
+        
+        vectors = self.product_features_norm
+        if sparse.issparse(vectors):
+            vectors = vectors.toarray()
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n_products, dimensions = vectors.shape
+        
+        if n_products >= FAISS_IVF_MIN_PRODUCTS:
+            # Product quantization needs the sub-vector count to divide the dimensions
+            n_subvectors = max(m for m in range(1, 17) if dimensions % m == 0)
+            quantizer = faiss.IndexFlatIP(dimensions)
+            self.index = faiss.IndexIVFPQ(quantizer, dimensions, 100, n_subvectors, 8, faiss.METRIC_INNER_PRODUCT)
+            self.index.train(vectors)
+            self.index.nprobe = 10
+        else:
+            self.index = faiss.IndexFlatIP(dimensions)
+        self.index.add(vectors)
+    
+    def _search(self, query, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and cosine similarities of the k products closest to an L2-normalized query"""
+        if self.index is not None:
+            if sparse.issparse(query):
+                query = query.toarray()
+            scores, indices = self.index.search(np.ascontiguousarray(query, dtype=np.float32).reshape(1, -1), k)
+            # FAISS pads with -1 when fewer than k products are available
+            found = indices[0] >= 0
+            return indices[0][found], scores[0][found].astype(np.float64)
+        
+        similarities = self._similarity_scores(query)
+        top_indices = _top_k_indices(similarities, k)
+        return top_indices, similarities[top_indices]
+    
+    def _search_batch(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Row-wise indices and cosine similarities of the k products closest to each query"""
+        if self.index is not None:
+            scores, indices = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+            return indices, scores.astype(np.float64)
+        
+        # One GEMM scores every user against every product
+        similarities = self._similarity_scores_batch(queries)
+        top_indices = _top_k_rows(similarities, k)
+        return top_indices, np.take_along_axis(similarities, top_indices, axis=1)
+    
+    def _similarity_scores_batch(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every product to each L2-normalized query row, one row per query"""
+        scores = self.product_features_norm @ queries.astype(self.product_features_norm.dtype).T
+        return np.asarray(scores, dtype=np.float64).T
+    
+    def _similarity_scores(self, query) -> np.ndarray:
+        """Cosine similarity of every product to an L2-normalized query vector"""
+        # Match the query to the feature dtype so the product stays in single precision
+        query = query.astype(self.product_features_norm.dtype)
+        if not sparse.issparse(self.product_features_norm) and not sparse.issparse(query):
+            # Dense features write into a reused buffer instead of a fresh N-element array
+            return np.matmul(self.product_features_norm, query.ravel(), out=self._score_buffer())
+        
+        scores = self.product_features_norm @ query.T
+        if sparse.issparse(scores):
+            return scores.toarray().ravel()
+        return np.asarray(scores).ravel()
+    
+    def _score_buffer(self) -> np.ndarray:
+        """Scratch array for one query's scores, allocated once per thread and catalog size"""
+        n_products, dtype = self.product_features_norm.shape[0], self.product_features_norm.dtype
+        buffer = getattr(self._scratch, 'scores', None)
+        if buffer is None or buffer.shape[0] != n_products or buffer.dtype != dtype:
+            buffer = np.empty(n_products, dtype=dtype)
+            self._scratch.scores = buffer
+        return buffer
+    
+    def _extract_features(self, products_df: pd.DataFrame) -> sparse.csr_matrix:
         """Extract and combine features from product data"""
         try:
             all_features = []
@@ -184,9 +411,9 @@ class ContentBasedFilteringEngine:
             if numerical_features is not None:
                 all_features.append(numerical_features)
             
-            # Combine all features
+            # Combine all features, keeping the mostly-zero TF-IDF block sparse
             if all_features:
-                combined_features = np.hstack(all_features)
+                combined_features = sparse.hstack(all_features, format='csr')
                 return combined_features
             else:
                 raise ValueError("No features could be extracted")
@@ -195,79 +422,71 @@ class ContentBasedFilteringEngine:
             logger.error(f"Error extracting features: {str(e)}")
             raise
     
-    def _extract_text_features(self, products_df: pd.DataFrame) -> Optional[np.ndarray]:
+    def _extract_text_features(self, products_df: pd.DataFrame) -> Optional[sparse.csr_matrix]:
         """Extract TF-IDF features from text data"""
         try:
-            # Combine text fields
-            text_data = []
-            for _, product in products_df.iterrows():
-                text_parts = []
-                
-                # Add title
-                if 'title' in product and pd.notna(product['title']):
-                    text_parts.append(str(product['title']))
-                
-                # Add description
-                if 'description' in product and pd.notna(product['description']):
-                    text_parts.append(str(product['description']))
-                
-                # Add tags
-                if 'tags' in product and pd.notna(product['tags']):
-                    if isinstance(product['tags'], list):
-                        text_parts.extend(product['tags'])
-                    else:
-                        text_parts.append(str(product['tags']))
+            # Combine text fields (title, description, tags, brand) column-wise
+            text_columns = []
+            for column in ('title', 'description', 'tags', 'brand'):
+                if column not in products_df.columns:
+                    continue
                 
-                # Add brand
-                if 'brand' in product and pd.notna(product['brand']):
-                    text_parts.append(str(product['brand']))
-                
-                combined_text = ' '.join(text_parts)
-                text_data.append(combined_text)
-            
-            # Create TF-IDF vectorizer
-            if self.tfidf_vectorizer is None:
-                self.tfidf_vectorizer = TfidfVectorizer(
-                    max_features=1000,
-                    stop_words='english',
-                    lowercase=True,
-                    ngram_range=(1, 2),
-                    min_df=2,
-                    max_df=0.8
-                )
-                tfidf_features = self.tfidf_vectorizer.fit_transform(text_data)
+                if column == 'tags':
+                    # Tags may be stored as lists or as plain strings
+                    text_columns.append(products_df['tags'].apply(
+                        lambda tags: ' '.join(map(str, tags)) if isinstance(tags, list)
+                        else ('' if pd.isna(tags) else str(tags))
+                    ))
+                else:
+                    text_columns.append(products_df[column].fillna('').astype(str))
+            
+            if not text_columns:
+                text_data = [''] * len(products_df)
+            elif len(text_columns) == 1:
+                text_data = text_columns[0].tolist()
             else:
-                tfidf_features = self.tfidf_vectorizer.transform(text_data)
+                text_data = text_columns[0].str.cat(text_columns[1:], sep=' ').tolist()
+            
+            # Hash terms into a fixed-width space instead of keeping a vocabulary;
+            # only the IDF weights are learned, so retraining just refits them
+            if self.text_pipeline is None:
+                self.text_pipeline = make_pipeline(
+                    HashingVectorizer(
+                        n_features=1024,
+                        alternate_sign=False,
+                        norm=None,
+                        stop_words='english',
+                        lowercase=True,
+                        ngram_range=(1, 2)
+                    ),
+                    TfidfTransformer()
+                )
+            tfidf_features = self.text_pipeline.fit_transform(text_data)
             
-            return tfidf_features.toarray()
+            return tfidf_features.tocsr()
             
         except Exception as e:
             logger.error(f"Error extracting text features: {str(e)}")
             return None
     
-    def _extract_categorical_features(self, products_df: pd.DataFrame) -> Optional[np.ndarray]:
+    def _extract_categorical_features(self, products_df: pd.DataFrame) -> Optional[sparse.csr_matrix]:
         """Extract categorical features using one-hot encoding"""
         try:
             categorical_features = []
             
             # Category features
             if 'category' in products_df.columns:
-                categories = pd.get_dummies(products_df['category'], prefix='category')
-                categorical_features.append(categories.values)
+                categorical_features.append(_one_hot(products_df['category']))
             
             # Brand features
             if 'brand' in products_df.columns:
                 # Only include top N brands to avoid high dimensionality
                 top_brands = products_df['brand'].value_counts().head(50).index
-                products_df_copy = products_df.copy()
-                products_df_copy['brand'] = products_df_copy['brand'].apply(
-                    lambda x: x if x in top_brands else 'other'
-                )
-                brands = pd.get_dummies(products_df_copy['brand'], prefix='brand')
-                categorical_features.append(brands.values)
+                brands = products_df['brand'].where(products_df['brand'].isin(top_brands), 'other')
+                categorical_features.append(_one_hot(brands))
             
             if categorical_features:
-                return np.hstack(categorical_features)
+                return sparse.hstack(categorical_features, format='csr')
             else:
                 return None
                 
@@ -275,46 +494,60 @@ class ContentBasedFilteringEngine:
             logger.error(f"Error extracting categorical features: {str(e)}")
             return None
     
-    def _extract_numerical_features(self, products_df: pd.DataFrame) -> Optional[np.ndarray]:
+    def _extract_numerical_features(self, products_df: pd.DataFrame) -> Optional[sparse.csr_matrix]:
         """Extract and normalize numerical features"""
         try:
-            numerical_features = []
-            
-            # Price features
-            if 'price' in products_df.columns:
-                prices = products_df['price'].fillna(products_df['price'].median())
-                # Normalize prices
-                prices_normalized = (prices - prices.min()) / (prices.max() - prices.min())
-                numerical_features.append(prices_normalized.values.reshape(-1, 1))
+            has_price = 'price' in products_df.columns
+            has_rating = 'rating' in products_df.columns
+            has_reviews = 'review_count' in products_df.columns
+            has_stock = 'in_stock' in products_df.columns
+            
+            # Price takes a normalized column plus five bucket indicators
+            n_columns = 6 * has_price + has_rating + has_reviews + has_stock
+            if n_columns == 0:
+                return None
+            
+            # Column-major so every feature is written as one contiguous column
+            numerical_features = np.zeros((len(products_df), n_columns), dtype=np.float32, order='F')
+            column = 0
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # Price features
+                if has_price:
+                    prices = products_df['price'].fillna(products_df['price'].median()).to_numpy(dtype=np.float64)
+                    low, high = prices.min(), prices.max()
+                    # Normalize prices
+                    np.divide(prices - low, high - low, out=numerical_features[:, column])
+                    
+                    # Price categories: five equal-width buckets from very low to very high,
+                    # right-inclusive like pd.cut
+                    if low == high:
+                        # A constant price lands in the middle bucket, as with pd.cut
+                        low, high = low - 0.5, high + 0.5
+                    bucket_edges = np.linspace(low, high, 6)[1:-1]
+                    price_buckets = np.digitize(prices, bucket_edges, right=True)
+                    numerical_features[np.arange(len(prices)), column + 1 + price_buckets] = 1.0
+                    column += 6
+                
+                # Rating features
+                if has_rating:
+                    ratings = products_df['rating'].fillna(products_df['rating'].mean()).to_numpy(dtype=np.float64)
+                    np.divide(ratings, 5.0, out=numerical_features[:, column])  # Normalize to 0-1
+                    column += 1
                 
-                # Price categories
-                price_categories = pd.cut(prices, bins=5, labels=['very_low', 'low', 'medium', 'high', 'very_high'])
-                price_cat_encoded = pd.get_dummies(price_categories, prefix='price_cat')
-                numerical_features.append(price_cat_encoded.values)
-            
-            # Rating features
-            if 'rating' in products_df.columns:
-                ratings = products_df['rating'].fillna(products_df['rating'].mean())
-                ratings_normalized = ratings / 5.0  # Normalize to 0-1
-                numerical_features.append(ratings_normalized.values.reshape(-1, 1))
-            
-            # Review count features
-            if 'review_count' in products_df.columns:
-                review_counts = products_df['review_count'].fillna(0)
-                # Log transform and normalize
-                review_counts_log = np.log1p(review_counts)
-                review_counts_normalized = (review_counts_log - review_counts_log.min()) / (review_counts_log.max() - review_counts_log.min())
-                numerical_features.append(review_counts_normalized.values.reshape(-1, 1))
+                # Review count features
+                if has_reviews:
+                    # Log transform and normalize
+                    review_counts_log = np.log1p(products_df['review_count'].fillna(0).to_numpy(dtype=np.float64))
+                    low, high = review_counts_log.min(), review_counts_log.max()
+                    np.divide(review_counts_log - low, high - low, out=numerical_features[:, column])
+                    column += 1
             
             # Availability features
-            if 'in_stock' in products_df.columns:
-                in_stock = products_df['in_stock'].astype(int)
-                numerical_features.append(in_stock.values.reshape(-1, 1))
+            if has_stock:
+                numerical_features[:, column] = products_df['in_stock'].astype(int).to_numpy()
             
-            if numerical_features:
-                return np.hstack(numerical_features)
-            else:
-                return None
+            return sparse.csr_matrix(numerical_features)
                 
         except Exception as e:
             logger.error(f"Error extracting numerical features: {str(e)}")
@@ -330,39 +563,23 @@ class ContentBasedFilteringEngine:
             purchased_products = user_profile.get('purchased_products', [])
             viewed_products = user_profile.get('viewed_products', [])
             
-            # Create user profile based on interacted products
-            user_vectors = []
-            
-            # Add vectors for purchased products (higher weight)
-            for product_id in purchased_products:
-                if product_id in self.product_ids:
-                    idx = self.product_ids.index(product_id)
-                    user_vectors.append(self.product_features[idx] * 2.0)  # Double weight for purchases
-            
-            # Add vectors for viewed products (lower weight)
-            for product_id in viewed_products:
-                if product_id in self.product_ids:
-                    idx = self.product_ids.index(product_id)
-                    user_vectors.append(self.product_features[idx])
+            # Create user profile based on interacted products,
+            # with double weight for purchases
+            purchased_idx = self._product_indices(purchased_products)
+            viewed_idx = self._product_indices(viewed_products)
+            profile_idx = np.concatenate([purchased_idx, viewed_idx])
+            weights = np.concatenate([np.full(len(purchased_idx), 2.0), np.ones(len(viewed_idx))])
             
             # If no interaction history, create profile based on preferences
-            if not user_vectors and preferred_categories:
-                # Create average vector for preferred categories
+            if not len(profile_idx) and preferred_categories:
                 category_products = products_df[products_df['category'].isin(preferred_categories)]
-                if not category_products.empty:
-                    category_vectors = []
-                    for _, product in category_products.iterrows():
-                        if product['product_id'] in self.product_ids:
-                            idx = self.product_ids.index(product['product_id'])
-                            category_vectors.append(self.product_features[idx])
-                    
-                    if category_vectors:
-                        user_vectors = category_vectors
+                profile_idx = self._product_indices(category_products['product_id'])
+                weights = np.ones(len(profile_idx))
             
-            # Calculate average user profile vector
-            if user_vectors:
-                user_profile_vector = np.mean(user_vectors, axis=0)
-                return user_profile_vector
+            # Average the weighted product rows with one gather and one product
+            if len(profile_idx):
+                user_profile_vector = self.product_features[profile_idx].T @ weights / len(profile_idx)
+                return np.asarray(user_profile_vector).ravel()
             else:
                 return None
                 
@@ -370,6 +587,14 @@ class ContentBasedFilteringEngine:
             logger.error(f"Error creating user profile vector: {str(e)}")
             return None
     
+    def _product_indices(self, product_ids) -> np.ndarray:
+        """Feature-row indices of the given products, skipping unknown ones"""
+        return np.fromiter(
+            (self.product_id_to_idx[product_id] for product_id in product_ids
+             if product_id in self.product_id_to_idx),
+            dtype=np.int64
+        )
+    
     def _adjust_feature_weights(self, user_interactions_df: pd.DataFrame, products_df: pd.DataFrame) -> None:
         """Adjust feature weights based on user interaction patterns"""
         try:
@@ -377,18 +602,10 @@ class ContentBasedFilteringEngine:
             # This is a simplified approach - in practice, you'd use more sophisticated methods
             
             # Count interactions by category
-            category_interactions = user_interactions_df.groupby('product_id').size()
-            
-            # Calculate category preferences
-            product_categories = products_df.set_index('product_id')['category']
-            category_preferences = {}
-            
-            for product_id, interaction_count in category_interactions.items():
-                if product_id in product_categories.index:
-                    category = product_categories[product_id]
-                    if category not in category_preferences:
-                        category_preferences[category] = 0
-                    category_preferences[category] += interaction_count
+            interaction_categories = user_interactions_df[['product_id']].merge(
+                products_df[['product_id', 'category']], on='product_id'
+            )
+            category_preferences = interaction_categories.groupby('category').size()
             
             # Adjust weights based on category diversity
             if len(category_preferences) > 5:
@@ -409,17 +626,28 @@ class ContentBasedFilteringEngine:
         """Save model components to disk"""
         try:
             model_data = {
-                'tfidf_vectorizer': self.tfidf_vectorizer,
+                'text_pipeline': self.text_pipeline,
                 'scaler': self.scaler,
                 'pca': self.pca,
-                'product_features': self.product_features,
                 'product_ids': self.product_ids,
-                'similarity_matrix': self.similarity_matrix,
+                'category_tops': self.category_tops,
                 'feature_weights': self.feature_weights
             }
             
             filepath = os.path.join(self.model_path, "content_based_model.pkl")
             joblib.dump(model_data, filepath)
+            
+            # Feature matrices are stored as raw arrays so workers can share them via mmap
+            self._save_matrix("content_based_features", self.product_features)
+            self._save_matrix("content_based_features_norm", self.product_features_norm)
+            
+            # FAISS indexes are native objects with their own serialization
+            index_path = os.path.join(self.model_path, "content_based_index.faiss")
+            if self.index is not None:
+                faiss.write_index(self.index, index_path)
+            elif os.path.exists(index_path):
+                os.remove(index_path)
+            
             logger.info(f"Content-based model saved to {filepath}")
             
         except Exception as e:
@@ -433,13 +661,21 @@ class ContentBasedFilteringEngine:
             if os.path.exists(filepath):
                 model_data = joblib.load(filepath)
                 
-                self.tfidf_vectorizer = model_data['tfidf_vectorizer']
+                self.text_pipeline = model_data['text_pipeline']
                 self.scaler = model_data['scaler']
                 self.pca = model_data['pca']
-                self.product_features = model_data['product_features']
-                self.product_ids = model_data['product_ids']
-                self.similarity_matrix = model_data['similarity_matrix']
+                self.product_features = self._load_matrix("content_based_features")
+                self.product_features_norm = self._load_matrix("content_based_features_norm")
+                self.product_ids = np.asarray(model_data['product_ids'], dtype=object)
+                self.product_id_to_idx = {product_id: idx for idx, product_id in enumerate(self.product_ids)}
                 self.feature_weights = model_data['feature_weights']
+                self.category_tops = model_data.get('category_tops', {})
+                
+                index_path = os.path.join(self.model_path, "content_based_index.faiss")
+                if faiss is not None and os.path.exists(index_path):
+                    self.index = faiss.read_index(index_path)
+                else:
+                    self.index = None
                 
                 logger.info(f"Content-based model loaded from {filepath}")
             else:
@@ -448,12 +684,36 @@ class ContentBasedFilteringEngine:
         except Exception as e:
             logger.error(f"Error loading content-based model: {str(e)}")
     
+    def _save_matrix(self, name: str, matrix) -> None:
+        """Save a feature matrix as .npy when dense or .npz when sparse"""
+        dense_path = os.path.join(self.model_path, f"{name}.npy")
+        sparse_path = os.path.join(self.model_path, f"{name}.npz")
+        
+        if sparse.issparse(matrix):
+            sparse.save_npz(sparse_path, matrix)
+            stale_path = dense_path
+        else:
+            np.save(dense_path, matrix)
+            stale_path = sparse_path
+        
+        # Drop the other format so a retrain cannot load an outdated matrix
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+    
+    def _load_matrix(self, name: str):
+        """Load a saved feature matrix, memory-mapping dense arrays read-only"""
+        dense_path = os.path.join(self.model_path, f"{name}.npy")
+        if os.path.exists(dense_path):
+            # Pages come from the shared OS page cache instead of a per-process copy
+            return np.load(dense_path, mmap_mode='r')
+        return sparse.load_npz(os.path.join(self.model_path, f"{name}.npz"))
+    
     def get_model_info(self) -> Dict:
         """Get information about the loaded model"""
         return {
             'model_trained': self.product_features is not None,
-            'num_products': len(self.product_ids) if self.product_ids else 0,
+            'num_products': len(self.product_ids) if self.product_ids is not None else 0,
             'feature_dimensions': self.product_features.shape[1] if self.product_features is not None else 0,
             'feature_weights': self.feature_weights,
-            'tfidf_vocabulary_size': len(self.tfidf_vectorizer.vocabulary_) if self.tfidf_vectorizer else 0
+            'text_hash_features': self.text_pipeline[0].n_features if self.text_pipeline else 0
         }
\ No newline at end of file
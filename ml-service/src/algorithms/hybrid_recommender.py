@@ -3,7 +3,6 @@ Hybrid recommendation algorithm combining collaborative and content-based filter
 """
 
 from typing import List, Dict, Optional
-import numpy as np
 import logging
 from .collaborative_filtering import CollaborativeFilteringEngine
 from .content_based_filtering import ContentBasedFilteringEngine
@@ -43,49 +42,36 @@ class HybridRecommender:
     def _combine_recommendations(self, cf_recs: List[Dict], cbf_recs: List[Dict], 
                                n_recommendations: int) -> List[Dict]:
         """Combine recommendations from different algorithms"""
+        # Weighted score total and contributing methods per product; for two
+        # short candidate lists a dict pass beats building DataFrames
         combined = {}
+        for recs, score_field, method in (
+            (cf_recs, 'predicted_rating', 'collaborative'),
+            (cbf_recs, 'similarity_score', 'content')
+        ):
+            weight = self.weights[method]
+            for rec in recs:
+                entry = combined.get(rec['product_id'])
+                if entry is None:
+                    entry = combined[rec['product_id']] = [0.0, []]
+                entry[0] += float(rec[score_field]) * weight
+                entry[1].append(method)
         
-        # Add collaborative filtering recommendations
-        for rec in cf_recs:
-            product_id = rec['product_id']
-            if product_id not in combined:
-                combined[product_id] = {
-                    'product_id': product_id,
-                    'scores': [],
-                    'methods': []
-                }
-            combined[product_id]['scores'].append(rec['predicted_rating'] * self.weights['collaborative'])
-            combined[product_id]['methods'].append('collaborative')
-        
-        # Add content-based recommendations
-        for rec in cbf_recs:
-            product_id = rec['product_id']
-            if product_id not in combined:
-                combined[product_id] = {
-                    'product_id': product_id,
-                    'scores': [],
-                    'methods': []
-                }
-            combined[product_id]['scores'].append(rec['similarity_score'] * self.weights['content'])
-            combined[product_id]['methods'].append('content')
-        
-        # Calculate final scores
         final_recommendations = []
-        for product_id, data in combined.items():
-            avg_score = np.mean(data['scores'])
-            method_count = len(data['methods'])
+        for product_id, (total, methods) in combined.items():
+            avg_score = total / len(methods)
             
             # Boost score if recommended by multiple methods
-            if method_count > 1:
+            if len(methods) > 1:
                 avg_score *= 1.2
             
             final_recommendations.append({
                 'product_id': product_id,
                 'score': avg_score,
                 'confidence': min(avg_score, 1.0),
-                'methods': data['methods']
+                'methods': methods
             })
         
-        # Sort and return top N
+        # Stable sort keeps ties in first-seen order
         final_recommendations.sort(key=lambda x: x['score'], reverse=True)
-        return final_recommendations[:n_recommendations]
\ No newline at end of file
+        return final_recommendations[:n_recommendations]
@@ -0,0 +1,74 @@
+"""
+Numba kernels for batched KNN collaborative filtering predictions
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    # Run the kernels as plain Python when numba is not installed
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+    prange = range
+
+
+@njit(fastmath=True, cache=True)
+def _weighted_top_k(sims: np.ndarray, ratings: np.ndarray, k: int,
+                    min_k: int, default: float) -> float:
+    """Similarity-weighted mean rating over the k most similar neighbours"""
+    n_neighbors = min(k, sims.shape[0])
+    # Stable order keeps ties in trainset order, like heapq.nlargest
+    order = np.argsort(-sims, kind='mergesort')
+
+    sum_sim = 0.0
+    sum_ratings = 0.0
+    actual_k = 0
+    for j in range(n_neighbors):
+        sim = sims[order[j]]
+        # Only positively similar neighbours contribute, as in Surprise
+        if sim > 0:
+            sum_sim += sim
+            sum_ratings += sim * ratings[order[j]]
+            actual_k += 1
+
+    if actual_k < min_k or sum_sim == 0:
+        return default
+    return sum_ratings / sum_sim
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def predict_user_based(sim_row: np.ndarray, targets: np.ndarray, indptr: np.ndarray,
+                       indices: np.ndarray, ratings: np.ndarray, k: int, min_k: int,
+                       default: float, out: np.ndarray) -> None:
+    """Predict a user's rating of each target item from similar users who rated it"""
+    for t in prange(targets.shape[0]):
+        item = targets[t]
+        # Items unknown to the trainset fall back to the default prediction
+        if item < 0:
+            out[t] = default
+            continue
+        start = indptr[item]
+        end = indptr[item + 1]
+        out[t] = _weighted_top_k(sim_row[indices[start:end]], ratings[start:end],
+                                 k, min_k, default)
+
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def predict_item_based(sim: np.ndarray, targets: np.ndarray, rated_items: np.ndarray,
+                       user_ratings: np.ndarray, k: int, min_k: int, default: float,
+                       out: np.ndarray) -> None:
+    """Predict a user's rating of each target item from the most similar items they rated"""
+    for t in prange(targets.shape[0]):
+        item = targets[t]
+        # Items unknown to the trainset fall back to the default prediction
+        if item < 0:
+            out[t] = default
+            continue
+        # Neighbours are the user's rated items, chosen per target as in Surprise
+        out[t] = _weighted_top_k(sim[item][rated_items], user_ratings,
+                                 k, min_k, default)
@@ -1,7 +1,745 @@
-from typing import Dict, Any
-from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Final, List, Mapping, NamedTuple, Optional, Tuple, Type
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from enum import IntEnum
+from collections import OrderedDict
+from functools import lru_cache, wraps
+import asyncio
+import copy
+import heapq
+import json
+import os
+import threading
+import time
+import numpy as np
 
-@dataclass
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    from redis.exceptions import RedisError
+except ImportError:
+    class RedisError(Exception):
+        """Stand-in so circuit breaker settings load without the redis client"""
+
+# Frozen records for nested settings; explicit __slots__ because the
+# dataclass slots option needs Python 3.10
+
+class _FrozenSlots:
+    """Pickle and copy support for frozen dataclasses with hand-written __slots__"""
+    __slots__ = ()
+    
+    def __getstate__(self) -> Tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+    
+    def __setstate__(self, state: Tuple) -> None:
+        # Frozen dataclasses reject setattr, which default slot restoring uses
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
+@dataclass(frozen=True)
+class AlertThreshold(_FrozenSlots):
+    """Warning and critical levels for one cache metric"""
+    __slots__ = ('warning', 'critical')
+    warning: float
+    critical: float
+
+@dataclass(frozen=True)
+class PrefetchStrategy(_FrozenSlots):
+    """Prefetch behaviour for one cache type"""
+    __slots__ = ('enabled', 'trigger_threshold', 'prefetch_count', 'background_refresh')
+    enabled: bool
+    trigger_threshold: float
+    prefetch_count: int
+    background_refresh: bool
+
+@dataclass(frozen=True)
+class CircuitBreakerSettings(_FrozenSlots):
+    """Circuit breaker limits for one class of cache operation"""
+    __slots__ = ('failure_threshold', 'recovery_timeout', 'expected_exception')
+    failure_threshold: int
+    recovery_timeout: int
+    expected_exception: Type[Exception]
+
+class CacheError(Exception):
+    """Raised when a cache operation fails"""
+
+# Read-only tables built once at import and shared by every caller; hot paths
+# can import these directly instead of calling the class getters below
+
+# Recommendations and similarities have long-tail popularity, and the warming
+# jobs scan whole key ranges on a schedule; LFU keeps the hot head resident
+# where LRU would let each warming pass flush it
+EVICTION_POLICIES: Final[Mapping[str, str]] = MappingProxyType({
+    'user_recommendations': 'allkeys-lfu',   # Least Frequently Used
+    'product_similarities': 'allkeys-lfu',   # Least Frequently Used
+    'trending_products': 'ttl',              # Time To Live
+    'popular_products': 'lfu',               # Least Frequently Used
+    'search_results': 'fifo',                # First In First Out
+})
+
+COMPRESSION: Final[Mapping[str, bool]] = MappingProxyType({
+    'user_embeddings': True,        # Compress large embeddings
+    'product_embeddings': True,     # Compress large embeddings
+    'model_features': True,         # Compress model data
+    'analytics_data': True,         # Compress analytics
+    'search_results': False,        # Don't compress search results
+    'trending_products': False,     # Don't compress trending data
+})
+
+REPLICATION: Final[Mapping[str, int]] = MappingProxyType({
+    'critical_data': 2,             # Replicate critical data 2 times
+    'user_recommendations': 1,      # Replicate user recommendations 1 time
+    'product_similarities': 1,      # Replicate product similarities 1 time
+    'analytics_data': 0,            # Don't replicate analytics data
+})
+
+METRICS_TO_TRACK: Final[Mapping[str, Tuple[str, ...]]] = MappingProxyType({
+    'user_recommendations': (
+        'hit_rate',
+        'miss_rate',
+        'avg_response_time',
+        'cache_size',
+        'eviction_count'
+    ),
+    'product_similarities': (
+        'hit_rate',
+        'miss_rate',
+        'avg_response_time',
+        'cache_size',
+        'update_frequency'
+    ),
+    'trending_products': (
+        'hit_rate',
+        'refresh_rate',
+        'staleness_time',
+        'popularity_score'
+    ),
+    'search_results': (
+        'hit_rate',
+        'query_patterns',
+        'cache_effectiveness',
+        'storage_efficiency'
+    )
+})
+
+ALERT_THRESHOLDS: Final[Mapping[str, AlertThreshold]] = MappingProxyType({
+    'hit_rate': AlertThreshold(
+        warning=0.7,     # Alert if hit rate drops below 70%
+        critical=0.5     # Critical if hit rate drops below 50%
+    ),
+    'response_time': AlertThreshold(
+        warning=100,     # Alert if response time > 100ms
+        critical=500     # Critical if response time > 500ms
+    ),
+    'cache_size': AlertThreshold(
+        warning=0.8,     # Alert if cache size > 80% of limit
+        critical=0.95    # Critical if cache size > 95% of limit
+    ),
+    'eviction_rate': AlertThreshold(
+        warning=0.1,     # Alert if eviction rate > 10%
+        critical=0.25    # Critical if eviction rate > 25%
+    )
+})
+
+BATCH_SIZES: Final[Mapping[str, int]] = MappingProxyType({
+    'user_recommendations': 50,     # Batch 50 users at once
+    'product_similarities': 100,    # Batch 100 products at once
+    'cache_warming': 200,           # Warm 200 items at once
+    'cache_invalidation': 1000,     # Invalidate 1000 items at once
+})
+
+PREFETCH_STRATEGIES: Final[Mapping[str, PrefetchStrategy]] = MappingProxyType({
+    'user_recommendations': PrefetchStrategy(
+        enabled=True,
+        trigger_threshold=0.2,   # Prefetch when TTL < 20%
+        prefetch_count=5,        # Prefetch next 5 items
+        background_refresh=True
+    ),
+    'product_similarities': PrefetchStrategy(
+        enabled=True,
+        trigger_threshold=0.1,   # Prefetch when TTL < 10%
+        prefetch_count=10,       # Prefetch next 10 items
+        background_refresh=True
+    ),
+    'trending_products': PrefetchStrategy(
+        enabled=True,
+        trigger_threshold=0.5,   # Prefetch when TTL < 50%
+        prefetch_count=20,       # Prefetch next 20 items
+        background_refresh=True
+    )
+})
+
+CIRCUIT_BREAKERS: Final[Mapping[str, CircuitBreakerSettings]] = MappingProxyType({
+    'redis_connection': CircuitBreakerSettings(
+        failure_threshold=5,     # Trip after 5 failures
+        recovery_timeout=60,     # Try to recover after 60 seconds
+        expected_exception=RedisError
+    ),
+    'cache_operations': CircuitBreakerSettings(
+        failure_threshold=10,    # Trip after 10 failures
+        recovery_timeout=30,     # Try to recover after 30 seconds
+        expected_exception=CacheError
+    )
+})
+
+_DEFAULT_CACHE_TTL = MappingProxyType({
+    # User-related caches
+    'user_recommendations': 3600,      # 1 hour
+    'user_data': 3600,                 # 1 hour
+    'user_preferences': 7200,          # 2 hours
+    'user_embeddings': 86400,          # 24 hours
+
+    # Product-related caches
+    'product_similarities': 86400,     # 24 hours
+    'product_data': 7200,              # 2 hours
+    'product_embeddings': 86400,       # 24 hours
+    'product_features': 86400,         # 24 hours
+
+    # Trending and popular
+    'trending_products': 1800,         # 30 minutes
+    'popular_products': 7200,          # 2 hours
+    'trending_categories': 3600,       # 1 hour
+
+    # Category and search
+    'category_data': 14400,            # 4 hours
+    'search_results': 1800,            # 30 minutes
+    'search_suggestions': 3600,        # 1 hour
+
+    # Model and analytics
+    'model_features': 86400,           # 24 hours
+    'model_predictions': 3600,         # 1 hour
+    'analytics_data': 7200,            # 2 hours
+
+    # System caches
+    'system_stats': 300,               # 5 minutes
+    'health_data': 60,                 # 1 minute
+})
+
+# Entries held in the in-process tier in front of Redis, for small sets read far
+# more often than they change; entries expire with the cache TTL
+L1_CACHE_SIZES: Final[Mapping[str, int]] = MappingProxyType({
+    'system_stats': 128,
+    'health_data': 16,
+    'trending_categories': 256,
+    'popular_products': 256,
+    'trending_products': 256,
+})
+
+# Cache types refreshed by the warming jobs
+_WARMABLE_CACHES = ('popular_products', 'trending_products', 'category_data', 'model_features')
+
+# Warming runs at half the TTL, so entries are refreshed before they expire and
+# the schedule can never drift from the TTLs
+WARMING_SCHEDULE: Final[Mapping[str, int]] = MappingProxyType({
+    name: _DEFAULT_CACHE_TTL[name] // 2 for name in _WARMABLE_CACHES
+})
+
+# Remaining-TTL threshold in seconds below which an entry is prefetched,
+# derived from each strategy's trigger fraction
+_PREFETCH_TRIGGER_SECONDS = MappingProxyType({
+    name: _DEFAULT_CACHE_TTL[name] * strategy.trigger_threshold
+    for name, strategy in PREFETCH_STRATEGIES.items()
+    if strategy.enabled
+})
+
+def should_prefetch(cache_type: str, remaining_ttl: float) -> bool:
+    """Check whether an entry with the given remaining TTL is due for a prefetch"""
+    return remaining_ttl < _PREFETCH_TRIGGER_SECONDS.get(cache_type, 0.0)
+
+# Keyed by the same cache-type names as CACHE_TTL. Each prefix wraps its name in a
+# Redis Cluster hash tag, so all keys of one cache type share a slot and batch
+# MGET/UNLINK calls stay a single round trip
+_DEFAULT_KEY_PREFIXES = MappingProxyType({
+    # User caches
+    'user_recommendations': 'ml:user_rec:',
+    'user_data': 'ml:user_data:',
+    'user_preferences': 'ml:user_prefs:',
+    'user_embeddings': 'ml:user_embed:',
+
+    # Product caches
+    'product_similarities': 'ml:product_sim:',
+    'product_data': 'ml:product_data:',
+    'product_embeddings': 'ml:product_embed:',
+    'product_features': 'ml:product_features:',
+
+    # Trending and popular
+    'trending_products': 'ml:trending:',
+    'popular_products': 'ml:popular:',
+
+    # Category and search
+    'category_data': 'ml:category_data:',
+    'search_results': 'ml:search:',
+    'search_suggestions': 'ml:search_suggest:',
+
+    # Model and analytics
+    'model_features': 'ml:model_features:',
+    'model_predictions': 'ml:model_pred:',
+    'analytics_data': 'ml:analytics:',
+
+    # System
+    'system_stats': 'ml:system:',
+    'health_data': 'ml:health:',
+})
+
+# build_key hash-tags each entity id, so keys spread over cluster slots per
+# entity; a tag in the prefix would pin a whole cache type to one slot
+for _prefix in _DEFAULT_KEY_PREFIXES.values():
+    if '{' in _prefix or '}' in _prefix:
+        raise ValueError(f"Cache key prefix {_prefix!r} must not contain a hash tag")
+
+class CacheStrategySpec(NamedTuple):
+    """Base caching strategy of a cache type plus its proactive refresh options"""
+    base: str
+    cdc_refresh: bool = False   # Re-warm when the product-update stream reports a change
+    memory_tier: bool = False   # Serve from an in-process cache in front of Redis
+    memory_ttl: int = 0         # Seconds an entry may live in the in-process tier
+
+_CACHE_ASIDE = CacheStrategySpec('cache_aside')
+
+_DEFAULT_CACHE_STRATEGIES = MappingProxyType({
+    # Cache-aside strategy (default)
+    'user_recommendations': _CACHE_ASIDE,
+    'product_similarities': _CACHE_ASIDE,
+
+    # Write-through strategy
+    'user_data': CacheStrategySpec('write_through'),
+    'product_data': CacheStrategySpec('write_through'),
+
+    # Write-behind strategy; trending is also re-warmed on product changes so
+    # the first read after a write never stalls
+    'analytics_data': CacheStrategySpec('write_behind'),
+    'trending_products': CacheStrategySpec('write_behind', cdc_refresh=True, memory_tier=True, memory_ttl=300),
+
+    # Refresh-ahead strategy
+    'popular_products': CacheStrategySpec('refresh_ahead', cdc_refresh=True, memory_tier=True, memory_ttl=300),
+    'model_features': CacheStrategySpec('refresh_ahead'),
+})
+
+# Short KEY_PREFIXES names used before the tables shared one naming scheme
+_LEGACY_PREFIX_KEYS = MappingProxyType({
+    'user_rec': 'user_recommendations',
+    'user_prefs': 'user_preferences',
+    'user_embed': 'user_embeddings',
+    'product_sim': 'product_similarities',
+    'product_embed': 'product_embeddings',
+    'trending': 'trending_products',
+    'popular': 'popular_products',
+    'search': 'search_results',
+    'search_suggest': 'search_suggestions',
+    'model_pred': 'model_predictions',
+    'analytics': 'analytics_data',
+    'system': 'system_stats',
+    'health': 'health_data',
+})
+
+# Compact binary payloads for bulky or high-churn caches; the rest stay JSON for debuggability
+_CACHE_SERIALIZERS = MappingProxyType({
+    'user_embeddings': 'msgpack',
+    'product_embeddings': 'msgpack',
+    'model_features': 'msgpack',
+    'analytics_data': 'msgpack',
+    'search_results': 'msgpack',
+    'trending_products': 'msgpack',
+})
+
+class CacheSpec(NamedTuple):
+    """All default settings for one cache type"""
+    ttl: Optional[int]
+    prefix: Optional[str]
+    strategy: CacheStrategySpec
+    compress: bool
+    eviction: str
+    serializer: str     # 'json' or 'msgpack'
+    compressor: str     # 'none' or 'zstd'
+
+# One record per cache type, so a cache operation needs a single lookup
+_CACHE_SPEC = MappingProxyType({
+    name: CacheSpec(
+        ttl=ttl,
+        prefix=_DEFAULT_KEY_PREFIXES.get(name),
+        strategy=_DEFAULT_CACHE_STRATEGIES.get(name, _CACHE_ASIDE),
+        compress=COMPRESSION.get(name, False),
+        eviction=EVICTION_POLICIES.get(name, 'lru'),
+        serializer=_CACHE_SERIALIZERS.get(name, 'json'),
+        compressor='zstd' if COMPRESSION.get(name, False) else 'none'
+    )
+    for name, ttl in _DEFAULT_CACHE_TTL.items()
+})
+
+# Legacy short names resolve to the same records without a second lookup
+_CACHE_SPEC = MappingProxyType({
+    **_CACHE_SPEC,
+    **{legacy: _CACHE_SPEC[name] for legacy, name in _LEGACY_PREFIX_KEYS.items()}
+})
+
+def get_cache_spec(cache_type: str) -> CacheSpec:
+    """Get the TTL, key prefix, strategy, compression and eviction policy of a cache type"""
+    return _CACHE_SPEC[cache_type]
+
+# Bound format methods of the full key templates, so building a key is one call;
+# the hash-tag braces in the prefix are escaped for str.format
+# The entity id is wrapped in a hash tag, so all keys of one entity share a
+# cluster slot while different entities spread across slots
+_KEY_BUILDERS = MappingProxyType({
+    name: (spec.prefix + "{{{}}}").format
+    for name, spec in _CACHE_SPEC.items()
+    if spec.prefix is not None
+})
+
+def get_key_builder(cache_type: str) -> Callable[[Any], str]:
+    """Get the Redis key builder of a cache type, for callers that build many keys"""
+    return _KEY_BUILDERS[cache_type]
+
+def build_key(cache_type: str, entity_id: Any, *parts: Any) -> str:
+    """Build the Redis key of an entity in the given cache, with optional trailing parts"""
+    key = _KEY_BUILDERS[cache_type](entity_id)
+    for part in parts:
+        key += f":{part}"
+    return key
+
+# Cache types whose payloads are compressed, including their legacy short names
+_COMPRESSED = frozenset(name for name, spec in _CACHE_SPEC.items() if spec.compress)
+
+# zstd level for compressed payloads; level 3 keeps compression cheap on the request path
+ZSTD_COMPRESSION_LEVEL = 3
+
+def should_compress(cache_type: str) -> bool:
+    """Check whether payloads of a cache type are stored compressed"""
+    return cache_type in _COMPRESSED
+
+class CacheType(IntEnum):
+    """Cache types in CACHE_TTL order, usable as tuple indices"""
+    USER_RECOMMENDATIONS = 0
+    USER_DATA = 1
+    USER_PREFERENCES = 2
+    USER_EMBEDDINGS = 3
+    PRODUCT_SIMILARITIES = 4
+    PRODUCT_DATA = 5
+    PRODUCT_EMBEDDINGS = 6
+    PRODUCT_FEATURES = 7
+    TRENDING_PRODUCTS = 8
+    POPULAR_PRODUCTS = 9
+    TRENDING_CATEGORIES = 10
+    CATEGORY_DATA = 11
+    SEARCH_RESULTS = 12
+    SEARCH_SUGGESTIONS = 13
+    MODEL_FEATURES = 14
+    MODEL_PREDICTIONS = 15
+    ANALYTICS_DATA = 16
+    SYSTEM_STATS = 17
+    HEALTH_DATA = 18
+
+# Settings indexed by CacheType value, so hot paths skip string hashing
+_TTL_TABLE = tuple(_CACHE_SPEC[cache_type.name.lower()].ttl for cache_type in CacheType)
+_PREFIX_TABLE = tuple(_CACHE_SPEC[cache_type.name.lower()].prefix for cache_type in CacheType)
+_STRATEGY_TABLE = tuple(_CACHE_SPEC[cache_type.name.lower()].strategy for cache_type in CacheType)
+
+# Batch size per CacheType for vectorized planners; types without their own
+# entry in BATCH_SIZES use the generic cache-warming batch
+BATCH_SIZE_ARRAY = np.array(
+    [BATCH_SIZES.get(cache_type.name.lower(), BATCH_SIZES['cache_warming']) for cache_type in CacheType],
+    dtype=np.int32
+)
+BATCH_SIZE_ARRAY.flags.writeable = False
+
+def get_cache_type(name: str) -> CacheType:
+    """Resolve a cache-type name, long or legacy short form, to its CacheType"""
+    return CacheType[_LEGACY_PREFIX_KEYS.get(name, name).upper()]
+
+def get_ttl(cache_type: CacheType) -> Optional[int]:
+    """Get the default TTL in seconds of a cache type"""
+    return _TTL_TABLE[cache_type]
+
+def get_prefix(cache_type: CacheType) -> Optional[str]:
+    """Get the Redis key prefix of a cache type"""
+    return _PREFIX_TABLE[cache_type]
+
+def get_strategy(cache_type: CacheType) -> CacheStrategySpec:
+    """Get the caching strategy of a cache type"""
+    return _STRATEGY_TABLE[cache_type]
+
+def batch_size(cache_type: CacheType) -> int:
+    """Get the batch size for bulk operations on a cache type"""
+    return int(BATCH_SIZE_ARRAY[cache_type])
+
+_MISSING = object()
+
+def ttl_lru_cache(maxsize: int, ttl: float, method: bool = False) -> Callable[[Callable], Callable]:
+    """LRU cache whose entries also expire ttl seconds after they were stored"""
+    def decorator(func: Callable) -> Callable:
+        entries: OrderedDict = OrderedDict()
+        
+        def make_key(args: Tuple, kwargs: dict) -> Tuple:
+            # Methods key on their arguments only, so the cache never pins self
+            if method:
+                args = args[1:]
+            return args + tuple(sorted(kwargs.items()))
+        
+        def lookup(key: Tuple) -> Any:
+            entry = entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            # Stale entries are evicted on access rather than by a sweeper
+            if expires_at <= time.monotonic():
+                del entries[key]
+                return _MISSING
+            entries.move_to_end(key)
+            return value
+        
+        def store(key: Tuple, value: Any) -> None:
+            entries[key] = (time.monotonic() + ttl, value)
+            entries.move_to_end(key)
+            if len(entries) > maxsize:
+                entries.popitem(last=False)
+        
+        if asyncio.iscoroutinefunction(func):
+            inflight: dict = {}
+            
+            def finish(key: Tuple, task: asyncio.Task) -> None:
+                del inflight[key]
+                # Failures reach the waiting callers but are never cached
+                if not task.cancelled() and task.exception() is None:
+                    store(key, task.result())
+            
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                value = lookup(key)
+                if value is _MISSING:
+                    # Concurrent misses share one call; shielded so a cancelled
+                    # caller does not cancel it for the others
+                    task = inflight.get(key)
+                    if task is None:
+                        task = asyncio.ensure_future(func(*args, **kwargs))
+                        inflight[key] = task
+                        task.add_done_callback(lambda done: finish(key, done))
+                    value = await asyncio.shield(task)
+                # Every caller gets its own copy, so none can mutate the cached value
+                return copy.deepcopy(value)
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                value = lookup(key)
+                if value is _MISSING:
+                    value = func(*args, **kwargs)
+                    store(key, value)
+                return copy.deepcopy(value)
+        
+        wrapper.cache_clear = entries.clear
+        return wrapper
+    return decorator
+
+def l1_cache(cache_type: CacheType, method: bool = False) -> Callable[[Callable], Callable]:
+    """In-process cache for a get-or-compute function, sized and timed from the cache config"""
+    name = cache_type.name.lower()
+    strategy = get_strategy(cache_type)
+    ttl = strategy.memory_ttl if strategy.memory_tier else get_ttl(cache_type)
+    return ttl_lru_cache(L1_CACHE_SIZES[name], ttl, method)
+
+# Leading byte of a tagged payload: bit 0 marks zstd, bit 1 msgpack and bit 2 the
+# trained dictionary. Plain JSON is written untagged and starts with a printable
+# byte, so entries cached before payloads were tagged still decode
+_TAG_ZSTD = 0x01
+_TAG_MSGPACK = 0x02
+_TAG_DICT = 0x04
+_MAX_TAG = _TAG_ZSTD | _TAG_MSGPACK | _TAG_DICT
+
+# Small embedding records compress far better against a dictionary trained on samples
+_EMBEDDING_CACHES = frozenset({'user_embeddings', 'product_embeddings'})
+ZSTD_DICT_PATH = os.getenv('CACHE_ZSTD_DICT_PATH', 'models/cache_embeddings.zstd_dict')
+
+@lru_cache(maxsize=1)
+def _zstd_dictionary() -> Optional['zstandard.ZstdCompressionDict']:
+    """Load the trained embedding dictionary once, if one has been written"""
+    if zstandard is None or not os.path.exists(ZSTD_DICT_PATH):
+        return None
+    with open(ZSTD_DICT_PATH, 'rb') as f:
+        return zstandard.ZstdCompressionDict(f.read())
+
+# Bumped when the dictionary is retrained so every thread rebuilds its codecs
+_codec_generation = 0
+
+def train_zstd_dictionary(samples: List[bytes], dict_size: int = 112640) -> None:
+    """Train the embedding dictionary on serialized sample payloads and save it"""
+    global _codec_generation
+    if zstandard is None:
+        raise ImportError("zstandard is required to train a compression dictionary")
+    dictionary = zstandard.train_dictionary(dict_size, samples)
+    with open(ZSTD_DICT_PATH, 'wb') as f:
+        f.write(dictionary.as_bytes())
+    _zstd_dictionary.cache_clear()
+    _codec_generation += 1
+
+# zstd contexts are not thread-safe, so each thread keeps its own codecs
+_codec_local = threading.local()
+
+def _zstd_decompressor(use_dictionary: bool) -> 'zstandard.ZstdDecompressor':
+    """Per-thread zstd decompressor, with or without the trained dictionary"""
+    decompressors = _thread_codecs()[1]
+    decompressor = decompressors.get(use_dictionary)
+    if decompressor is None:
+        dictionary = _zstd_dictionary() if use_dictionary else None
+        if use_dictionary and dictionary is None:
+            raise CacheError(f"Payload needs the zstd dictionary at {ZSTD_DICT_PATH}")
+        decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+        decompressors[use_dictionary] = decompressor
+    return decompressor
+
+def dumps_json(data: Any) -> bytes:
+    """Serialize a cache payload, via orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, default=str).encode('utf-8')
+
+def loads_json(payload: bytes) -> Any:
+    """Deserialize a cache payload written by dumps_json"""
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+def _msgpack_default(value: Any) -> Any:
+    """Convert values msgpack cannot pack, stringifying the rest like the JSON path"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+def _dumps_msgpack(data: Any) -> bytes:
+    """Serialize a cache payload as msgpack"""
+    return msgpack.packb(data, default=_msgpack_default)
+
+def _loads_msgpack(payload: bytes) -> Any:
+    """Deserialize a msgpack cache payload"""
+    return msgpack.unpackb(payload, strict_map_key=False)
+
+def get_codec(cache_type: str) -> Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]:
+    """Get the (encode, decode) pair for a cache type's payloads"""
+    spec = _CACHE_SPEC[cache_type]
+    
+    # Without msgpack or zstandard installed, payloads fall back to plain JSON
+    tag = 0
+    serialize = dumps_json
+    if spec.serializer == 'msgpack' and msgpack is not None:
+        tag, serialize = _TAG_MSGPACK, _dumps_msgpack
+    
+    if spec.compressor == 'zstd' and zstandard is not None:
+        tag |= _TAG_ZSTD
+        
+        # Payloads written with a dictionary can only be read back with the same one
+        dictionary = None
+        if _LEGACY_PREFIX_KEYS.get(cache_type, cache_type) in _EMBEDDING_CACHES:
+            dictionary = _zstd_dictionary()
+            if dictionary is not None:
+                tag |= _TAG_DICT
+        
+        # zstd contexts are not thread-safe, so callers keep one codec per thread
+        compress = zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL, dict_data=dictionary).compress
+        header = bytes([tag])
+        return lambda value: header + compress(serialize(value)), decode
+    
+    if tag:
+        header = bytes([tag])
+        return lambda value: header + serialize(value), decode
+    return serialize, decode
+
+def _thread_codecs() -> Tuple[Tuple[Callable[[Any], bytes], ...], dict]:
+    """Get this thread's encoders, indexed by CacheType, and decompressors, building them on first use"""
+    if getattr(_codec_local, 'generation', None) != _codec_generation:
+        _codec_local.encoders = tuple(get_codec(cache_type.name.lower())[0] for cache_type in CacheType)
+        _codec_local.decompressors = {}
+        _codec_local.generation = _codec_generation
+    return _codec_local.encoders, _codec_local.decompressors
+
+def encode(cache_type: CacheType, value: Any) -> bytes:
+    """Serialize and, where configured, compress a payload for Redis"""
+    return _thread_codecs()[0][cache_type](value)
+
+def decode(payload: bytes) -> Any:
+    """Decode a payload read from Redis; the leading tag names its serializer and compressor"""
+    tag = payload[0] if payload else 0
+    if tag == 0 or tag > _MAX_TAG:
+        return loads_json(payload)
+    
+    body = payload[1:]
+    if tag & _TAG_ZSTD:
+        body = _zstd_decompressor(bool(tag & _TAG_DICT)).decompress(body)
+    if tag & _TAG_MSGPACK:
+        return _loads_msgpack(body)
+    return loads_json(body)
+
+# Fraction of the TTL left at which refresh-ahead reads reload in the background
+REFRESH_AHEAD_FRACTION = 0.2
+
+# Background refreshes in flight; holding references keeps the tasks alive
+_refresh_tasks: set = set()
+
+async def _load_and_store(client, cache_type: CacheType, key: str,
+                          loader: Callable[[], Awaitable[Any]]) -> Any:
+    """Load a value from the source of truth and write it to Redis"""
+    value = await loader()
+    await client.set(key, encode(cache_type, value), ex=get_ttl(cache_type))
+    return value
+
+async def _cache_aside(client, cache_type: CacheType, key: str,
+                       loader: Callable[[], Awaitable[Any]]) -> Any:
+    """Read from Redis, loading and storing the value on a miss"""
+    payload = await client.get(key)
+    if payload is not None:
+        return decode(payload)
+    return await _load_and_store(client, cache_type, key, loader)
+
+async def _refresh_ahead(client, cache_type: CacheType, key: str,
+                         loader: Callable[[], Awaitable[Any]]) -> Any:
+    """Read from Redis and reload in the background before the entry expires"""
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.get(key)
+        pipe.ttl(key)
+        payload, remaining = await pipe.execute()
+    
+    if payload is None:
+        return await _load_and_store(client, cache_type, key, loader)
+    
+    if 0 <= remaining < get_ttl(cache_type) * REFRESH_AHEAD_FRACTION:
+        task = asyncio.create_task(_load_and_store(client, cache_type, key, loader))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+    return decode(payload)
+
+# Read handler per base strategy; write-through and write-behind caches are kept
+# current by their writers, so reads behave like cache-aside
+_STRATEGY_HANDLERS = MappingProxyType({
+    'cache_aside': _cache_aside,
+    'write_through': _cache_aside,
+    'write_behind': _cache_aside,
+    'refresh_ahead': _refresh_ahead,
+})
+
+# Handlers indexed by CacheType, so a read dispatches without comparing strategy names
+_READ_HANDLERS = tuple(_STRATEGY_HANDLERS[get_strategy(cache_type).base] for cache_type in CacheType)
+
+async def cached_read(client, cache_type: CacheType, key: str,
+                      loader: Callable[[], Awaitable[Any]]) -> Any:
+    """Read a key through the cache type's strategy, calling loader on a miss"""
+    return await _READ_HANDLERS[cache_type](client, cache_type, key, loader)
+
+@dataclass(frozen=True)
 class CacheConfig:
     """Configuration for cache settings"""
     
@@ -12,253 +750,96 @@ class CacheConfig:
     REDIS_DB_ML: int = 2
     
     # Cache TTL settings (in seconds)
-    CACHE_TTL: Dict[str, int] = None
+    CACHE_TTL: Mapping[str, int] = field(default_factory=lambda: _DEFAULT_CACHE_TTL)
     
     # Cache key prefixes
-    KEY_PREFIXES: Dict[str, str] = None
+    KEY_PREFIXES: Mapping[str, str] = field(default_factory=lambda: _DEFAULT_KEY_PREFIXES)
     
     # Cache strategies
-    CACHE_STRATEGIES: Dict[str, str] = None
-    
-    def __post_init__(self):
-        if self.CACHE_TTL is None:
-            self.CACHE_TTL = {
-                # User-related caches
-                'user_recommendations': 3600,      # 1 hour
-                'user_data': 3600,                 # 1 hour
-                'user_preferences': 7200,          # 2 hours
-                'user_embeddings': 86400,          # 24 hours
-                
-                # Product-related caches
-                'product_similarities': 86400,     # 24 hours
-                'product_data': 7200,              # 2 hours
-                'product_embeddings': 86400,       # 24 hours
-                'product_features': 86400,         # 24 hours
-                
-                # Trending and popular
-                'trending_products': 1800,         # 30 minutes
-                'popular_products': 7200,          # 2 hours
-                'trending_categories': 3600,       # 1 hour
-                
-                # Category and search
-                'category_data': 14400,            # 4 hours
-                'search_results': 1800,            # 30 minutes
-                'search_suggestions': 3600,        # 1 hour
-                
-                # Model and analytics
-                'model_features': 86400,           # 24 hours
-                'model_predictions': 3600,         # 1 hour
-                'analytics_data': 7200,            # 2 hours
-                
-                # System caches
-                'system_stats': 300,               # 5 minutes
-                'health_data': 60,                 # 1 minute
-            }
-        
-        if self.KEY_PREFIXES is None:
-            self.KEY_PREFIXES = {
-                # User caches
-                'user_rec': 'ml:user_rec:',
-                'user_data': 'ml:user_data:',
-                'user_prefs': 'ml:user_prefs:',
-                'user_embed': 'ml:user_embed:',
-                
-                # Product caches
-                'product_sim': 'ml:product_sim:',
-                'product_data': 'ml:product_data:',
-                'product_embed': 'ml:product_embed:',
-                'product_features': 'ml:product_features:',
-                
-                # Trending and popular
-                'trending': 'ml:trending:',
-                'popular': 'ml:popular:',
-                
-                # Category and search
-                'category_data': 'ml:category_data:',
-                'search': 'ml:search:',
-                'search_suggest': 'ml:search_suggest:',
-                
-                # Model and analytics
-                'model_features': 'ml:model_features:',
-                'model_pred': 'ml:model_pred:',
-                'analytics': 'ml:analytics:',
-                
-                # System
-                'system': 'ml:system:',
-                'health': 'ml:health:',
-            }
-        
-        if self.CACHE_STRATEGIES is None:
-            self.CACHE_STRATEGIES = {
-                # Cache-aside strategy (default)
-                'user_recommendations': 'cache_aside',
-                'product_similarities': 'cache_aside',
-                
-                # Write-through strategy
-                'user_data': 'write_through',
-                'product_data': 'write_through',
-                
-                # Write-behind strategy
-                'analytics_data': 'write_behind',
-                'trending_products': 'write_behind',
-                
-                # Refresh-ahead strategy
-                'popular_products': 'refresh_ahead',
-                'model_features': 'refresh_ahead',
-            }
+    CACHE_STRATEGIES: Mapping[str, CacheStrategySpec] = field(default_factory=lambda: _DEFAULT_CACHE_STRATEGIES)
 
 class CacheStrategy:
     """Cache strategy implementations"""
     
     @staticmethod
-    def get_cache_warming_schedule() -> Dict[str, int]:
+    def get_cache_warming_schedule() -> Mapping[str, int]:
         """Get cache warming schedule in seconds"""
-        return {
-            'popular_products': 3600,       # Warm every hour
-            'trending_products': 1800,      # Warm every 30 minutes
-            'category_data': 14400,         # Warm every 4 hours
-            'model_features': 86400,        # Warm every 24 hours
-        }
+        return WARMING_SCHEDULE
     
     @staticmethod
-    def get_cache_eviction_policies() -> Dict[str, str]:
+    def get_cache_eviction_policies() -> Mapping[str, str]:
         """Get cache eviction policies"""
-        return {
-            'user_recommendations': 'lru',     # Least Recently Used
-            'product_similarities': 'lru',     # Least Recently Used
-            'trending_products': 'ttl',        # Time To Live
-            'popular_products': 'lfu',         # Least Frequently Used
-            'search_results': 'fifo',          # First In First Out
-        }
+        return EVICTION_POLICIES
     
     @staticmethod
-    def get_cache_compression_settings() -> Dict[str, bool]:
+    def get_cache_compression_settings() -> Mapping[str, bool]:
         """Get cache compression settings"""
-        return {
-            'user_embeddings': True,        # Compress large embeddings
-            'product_embeddings': True,     # Compress large embeddings
-            'model_features': True,         # Compress model data
-            'analytics_data': True,         # Compress analytics
-            'search_results': False,        # Don't compress search results
-            'trending_products': False,     # Don't compress trending data
-        }
+        return COMPRESSION
     
     @staticmethod
-    def get_cache_replication_settings() -> Dict[str, int]:
+    def get_cache_replication_settings() -> Mapping[str, int]:
         """Get cache replication settings"""
-        return {
-            'critical_data': 2,             # Replicate critical data 2 times
-            'user_recommendations': 1,      # Replicate user recommendations 1 time
-            'product_similarities': 1,      # Replicate product similarities 1 time
-            'analytics_data': 0,            # Don't replicate analytics data
-        }
+        return REPLICATION
 
 class CacheMetrics:
     """Cache metrics configuration"""
     
     @staticmethod
-    def get_metrics_to_track() -> Dict[str, list]:
+    def get_metrics_to_track() -> Mapping[str, Tuple[str, ...]]:
         """Get metrics to track for each cache type"""
-        return {
-            'user_recommendations': [
-                'hit_rate',
-                'miss_rate',
-                'avg_response_time',
-                'cache_size',
-                'eviction_count'
-            ],
-            'product_similarities': [
-                'hit_rate',
-                'miss_rate',
-                'avg_response_time',
-                'cache_size',
-                'update_frequency'
-            ],
-            'trending_products': [
-                'hit_rate',
-                'refresh_rate',
-                'staleness_time',
-                'popularity_score'
-            ],
-            'search_results': [
-                'hit_rate',
-                'query_patterns',
-                'cache_effectiveness',
-                'storage_efficiency'
-            ]
-        }
+        return METRICS_TO_TRACK
     
     @staticmethod
-    def get_alerting_thresholds() -> Dict[str, Dict[str, float]]:
+    def get_alerting_thresholds() -> Mapping[str, AlertThreshold]:
         """Get alerting thresholds for cache metrics"""
-        return {
-            'hit_rate': {
-                'warning': 0.7,     # Alert if hit rate drops below 70%
-                'critical': 0.5     # Critical if hit rate drops below 50%
-            },
-            'response_time': {
-                'warning': 100,     # Alert if response time > 100ms
-                'critical': 500     # Critical if response time > 500ms
-            },
-            'cache_size': {
-                'warning': 0.8,     # Alert if cache size > 80% of limit
-                'critical': 0.95    # Critical if cache size > 95% of limit
-            },
-            'eviction_rate': {
-                'warning': 0.1,     # Alert if eviction rate > 10%
-                'critical': 0.25    # Critical if eviction rate > 25%
-            }
-        }
+        return ALERT_THRESHOLDS
 
 class CacheOptimization:
     """Cache optimization strategies"""
     
     @staticmethod
-    def get_batch_sizes() -> Dict[str, int]:
+    def get_batch_sizes() -> Mapping[str, int]:
         """Get optimal batch sizes for different operations"""
-        return {
-            'user_recommendations': 50,     # Batch 50 users at once
-            'product_similarities': 100,    # Batch 100 products at once
-            'cache_warming': 200,           # Warm 200 items at once
-            'cache_invalidation': 1000,     # Invalidate 1000 items at once
-        }
+        return BATCH_SIZES
     
     @staticmethod
-    def get_prefetch_strategies() -> Dict[str, Dict[str, Any]]:
+    def get_prefetch_strategies() -> Mapping[str, PrefetchStrategy]:
         """Get prefetch strategies for different cache types"""
-        return {
-            'user_recommendations': {
-                'enabled': True,
-                'trigger_threshold': 0.2,   # Prefetch when TTL < 20%
-                'prefetch_count': 5,        # Prefetch next 5 items
-                'background_refresh': True
-            },
-            'product_similarities': {
-                'enabled': True,
-                'trigger_threshold': 0.1,   # Prefetch when TTL < 10%
-                'prefetch_count': 10,       # Prefetch next 10 items
-                'background_refresh': True
-            },
-            'trending_products': {
-                'enabled': True,
-                'trigger_threshold': 0.5,   # Prefetch when TTL < 50%
-                'prefetch_count': 20,       # Prefetch next 20 items
-                'background_refresh': True
-            }
-        }
+        return PREFETCH_STRATEGIES
     
     @staticmethod
-    def get_circuit_breaker_settings() -> Dict[str, Dict[str, Any]]:
+    def get_circuit_breaker_settings() -> Mapping[str, CircuitBreakerSettings]:
         """Get circuit breaker settings for cache operations"""
-        return {
-            'redis_connection': {
-                'failure_threshold': 5,     # Trip after 5 failures
-                'recovery_timeout': 60,     # Try to recover after 60 seconds
-                'expected_exception': 'RedisError'
-            },
-            'cache_operations': {
-                'failure_threshold': 10,    # Trip after 10 failures
-                'recovery_timeout': 30,     # Try to recover after 30 seconds
-                'expected_exception': 'CacheError'
-            }
-        }
\ No newline at end of file
+        return CIRCUIT_BREAKERS
+
+class CacheWarmingScheduler:
+    """Min-heap of upcoming cache warming runs, so each tick only looks at what is due"""
+    
+    def __init__(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self._heap: List[Tuple[float, CacheType]] = [
+            (now + interval, get_cache_type(name))
+            for name, interval in WARMING_SCHEDULE.items()
+        ]
+        heapq.heapify(self._heap)
+    
+    def next_warmup(self) -> Optional[Tuple[CacheType, float]]:
+        """Get the next cache type to warm and its monotonic due time"""
+        if not self._heap:
+            return None
+        due, cache_type = self._heap[0]
+        return cache_type, due
+    
+    def pop_due(self, now: Optional[float] = None) -> List[CacheType]:
+        """Remove and return every cache type whose warming run is due"""
+        now = time.monotonic() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
+    
+    def reschedule(self, cache_type: CacheType, now: Optional[float] = None) -> None:
+        """Queue the next warming run of a cache type one interval from now"""
+        now = time.monotonic() if now is None else now
+        interval = WARMING_SCHEDULE[cache_type.name.lower()]
+        heapq.heappush(self._heap, (now + interval, cache_type))
\ No newline at end of file
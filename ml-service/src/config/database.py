@@ -3,18 +3,46 @@ Database configuration and connection management for ML service
 """
 
 import asyncio
+import weakref
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateMany
 from pymongo.errors import ServerSelectionTimeoutError
 import redis.asyncio as redis
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Awaitable
 import logging
 from datetime import datetime, timedelta
 
 from .settings import Settings
+from .cache_config import CacheType, decode, encode, l1_cache
 
 logger = logging.getLogger(__name__)
 
+# Behavior writes are buffered and flushed on whichever limit is hit first
+BEHAVIOR_FLUSH_INTERVAL_SECONDS = 0.25
+BEHAVIOR_FLUSH_SIZE = 500
+
+# Product fields copied onto interactions so preference queries skip the join
+DENORMALIZED_PRODUCT_FIELDS = ["category", "brand", "price"]
+
+# Interaction fields read by the recommenders; callers can ask for more
+INTERACTION_FIELDS = ["user_id", "product_id", "rating", "interaction_type", "timestamp"]
+
+
+async def fetch_by_ids(collection, ids: List[Any], chunk_size: int = 500, concurrency: int = 4,
+                       projection: Optional[Dict] = None) -> List[Dict]:
+    """Find documents by _id with chunked $in queries run a few at a time"""
+    # Bounded so a large lookup cannot take over the connection pool
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def fetch_chunk(chunk: List[Any]) -> List[Dict]:
+        async with semaphore:
+            return await collection.find({"_id": {"$in": chunk}}, projection).to_list(None)
+    
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+    results = await asyncio.gather(*[fetch_chunk(chunk) for chunk in chunks])
+    return [document for chunk_documents in results for document in chunk_documents]
+
+
 class DatabaseManager:
     """Manages database connections for the ML service"""
     
@@ -22,30 +50,70 @@ class DatabaseManager:
         self.settings = settings
         self.mongodb_client: Optional[AsyncIOMotorClient] = None
         self.mongodb_db = None
+        
+        # Collection handles, resolved once in connect()
+        self.interactions_collection = None
+        self.products_collection = None
+        self.behavior_collection = None
+        self.orders_collection = None
+        self.model_metadata_collection = None
+        self.model_status_collection = None
+        self.trending_collection = None
         self.redis_client: Optional[redis.Redis] = None
+        self.cache_redis_client: Optional[redis.Redis] = None
         self.sync_mongodb_client: Optional[MongoClient] = None
+        self._trending_refresh_task: Optional[asyncio.Task] = None
+        self._behavior_buffer: Dict[str, List[Dict]] = {}
+        self._behavior_lock: Optional[asyncio.Lock] = None
+        self._behavior_flush_task: Optional[asyncio.Task] = None
+        self._backfill_task: Optional[asyncio.Task] = None
+        self._singleflight_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
         
+    @property
+    def db(self):
+        """Active MongoDB database handle"""
+        return self.mongodb_db
+    
     async def connect(self):
         """Connect to databases"""
         try:
-            # MongoDB connection
+            # MongoDB connection, with the pool sized for concurrent requests
+            min_pool_size = max(5, self.settings.MONGODB_MIN_POOL_SIZE)
             self.mongodb_client = AsyncIOMotorClient(
                 self.settings.MONGODB_URI,
-                serverSelectionTimeoutMS=5000
+                serverSelectionTimeoutMS=5000,
+                maxPoolSize=self.settings.MAX_CONCURRENT_REQUESTS,
+                minPoolSize=min_pool_size,
+                maxIdleTimeMS=self.settings.MONGODB_MAX_IDLE_TIME_MS,
+                waitQueueTimeoutMS=self.settings.REQUEST_TIMEOUT_SECONDS * 1000,
+                retryWrites=True,
+                compressors=self.settings.MONGODB_COMPRESSORS,
+                zlibCompressionLevel=6
             )
             
-            # Get database name from URI
-            db_name = self.settings.MONGODB_URI.split('/')[-1]
-            self.mongodb_db = self.mongodb_client[db_name]
-            
-            # Test MongoDB connection
-            await self.mongodb_client.admin.command('ping')
+            # Use the database named in the URI; the driver already parsed it,
+            # including any query string after the name
+            self.mongodb_db = self.mongodb_client.get_default_database("ecommerce")
+            self.interactions_collection = self.mongodb_db.user_interactions
+            self.products_collection = self.mongodb_db.products
+            self.behavior_collection = self.mongodb_db.user_behavior
+            self.orders_collection = self.mongodb_db.orders
+            self.model_metadata_collection = self.mongodb_db.model_metadata
+            self.model_status_collection = self.mongodb_db.model_status
+            self.trending_collection = self.mongodb_db.trending_rollup
+            
+            # Test MongoDB connection, opening the minimum pool up front
+            await asyncio.gather(*[
+                self.mongodb_client.admin.command('ping') for _ in range(min_pool_size)
+            ])
             logger.info("Connected to MongoDB successfully")
             
             # Synchronous MongoDB client for some operations
             self.sync_mongodb_client = MongoClient(
                 self.settings.MONGODB_URI,
-                serverSelectionTimeoutMS=5000
+                serverSelectionTimeoutMS=5000,
+                compressors=self.settings.MONGODB_COMPRESSORS,
+                zlibCompressionLevel=6
             )
             
             # Redis connection
@@ -54,25 +122,76 @@ class DatabaseManager:
                 decode_responses=True
             )
             
+            # Cache payloads are stored as raw bytes, so they skip response decoding
+            self.cache_redis_client = redis.from_url(self.settings.REDIS_URL)
+            
             # Test Redis connection
             await self.redis_client.ping()
             logger.info("Connected to Redis successfully")
             
+            await self._ensure_indexes()
+            
+            # Keep the materialized trending rollup fresh in the background
+            self._trending_refresh_task = asyncio.create_task(
+                self._refresh_trending_periodically()
+            )
+            
+            # Created here so the lock binds to the running event loop
+            self._behavior_lock = asyncio.Lock()
+            self._behavior_flush_task = asyncio.create_task(
+                self._flush_behavior_periodically()
+            )
+            
+            # Interactions written before denormalization get their product
+            # fields in the background; preference queries skip them until then
+            self._backfill_task = asyncio.create_task(self.backfill_interaction_denorm())
+            
         except Exception as e:
             logger.error(f"Failed to connect to databases: {str(e)}")
             raise
     
     async def close(self):
         """Close database connections"""
+        if self._trending_refresh_task:
+            self._trending_refresh_task.cancel()
+        if self._backfill_task:
+            self._backfill_task.cancel()
+        if self._behavior_flush_task:
+            self._behavior_flush_task.cancel()
+            # Wait for the loop to stop; a shielded flush already in flight
+            # keeps the lock, so the final flush runs after it
+            try:
+                await self._behavior_flush_task
+            except asyncio.CancelledError:
+                pass
+            await self.flush()
         if self.mongodb_client:
             self.mongodb_client.close()
         if self.sync_mongodb_client:
             self.sync_mongodb_client.close()
         if self.redis_client:
             await self.redis_client.close()
+        if self.cache_redis_client:
+            await self.cache_redis_client.close()
         logger.info("Database connections closed")
     
-    async def get_user_interactions(self, user_id: str, limit: int = 1000) -> List[Dict]:
+    @staticmethod
+    def _interaction_projection(fields: Optional[List[str]] = None) -> Dict:
+        """Build a $project stage keeping only the requested interaction fields"""
+        projection = dict.fromkeys(fields or INTERACTION_FIELDS, 1)
+        projection.setdefault("_id", 0)
+        return {"$project": projection}
+    
+    @staticmethod
+    def _recency_sort(use_id_for_time: bool = True) -> Dict:
+        """Build a newest-first $sort stage, on _id unless exact event times are needed"""
+        # ObjectIds embed their creation second, so _id order tracks insertion
+        # time and rides the _id-suffixed indexes instead of a timestamp index
+        return {"$sort": {"_id" if use_id_for_time else "timestamp": -1}}
+    
+    async def get_user_interactions(self, user_id: str, limit: int = 1000,
+                                    fields: Optional[List[str]] = None,
+                                    use_id_for_time: bool = True) -> List[Dict]:
         """Get user interactions for collaborative filtering"""
         try:
             pipeline = [
@@ -81,15 +200,14 @@ class DatabaseManager:
                         "user_id": user_id
                     }
                 },
-                {
-                    "$sort": {"timestamp": -1}
-                },
+                self._recency_sort(use_id_for_time),
                 {
                     "$limit": limit
-                }
+                },
+                self._interaction_projection(fields)
             ]
             
-            cursor = self.mongodb_db.user_interactions.aggregate(pipeline)
+            cursor = self.interactions_collection.aggregate(pipeline, batchSize=5000)
             interactions = await cursor.to_list(length=limit)
             return interactions
             
@@ -97,19 +215,20 @@ class DatabaseManager:
             logger.error(f"Error getting user interactions: {str(e)}")
             return []
     
-    async def get_all_interactions(self, limit: int = 50000) -> List[Dict]:
+    async def get_all_interactions(self, limit: int = 50000,
+                                   fields: Optional[List[str]] = None,
+                                   use_id_for_time: bool = True) -> List[Dict]:
         """Get all user interactions for training"""
         try:
             pipeline = [
-                {
-                    "$sort": {"timestamp": -1}
-                },
+                self._recency_sort(use_id_for_time),
                 {
                     "$limit": limit
-                }
+                },
+                self._interaction_projection(fields)
             ]
             
-            cursor = self.mongodb_db.user_interactions.aggregate(pipeline)
+            cursor = self.interactions_collection.aggregate(pipeline, batchSize=5000)
             interactions = await cursor.to_list(length=limit)
             return interactions
             
@@ -120,7 +239,7 @@ class DatabaseManager:
     async def get_product_features(self, product_id: str) -> Optional[Dict]:
         """Get product features for content-based filtering"""
         try:
-            product = await self.mongodb_db.products.find_one(
+            product = await self.products_collection.find_one(
                 {"_id": product_id}
             )
             return product
@@ -129,10 +248,31 @@ class DatabaseManager:
             logger.error(f"Error getting product features: {str(e)}")
             return None
     
+    async def get_product_features_many(self, product_ids: List[str],
+                                        fields: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """Get features for several products in one query, keyed by product ID"""
+        try:
+            projection = dict.fromkeys(fields, 1) if fields else None
+            products = await fetch_by_ids(self.products_collection, product_ids, projection=projection)
+            return {str(p["_id"]): p for p in products}
+            
+        except Exception as e:
+            logger.error(f"Error getting product features: {str(e)}")
+            return {}
+    
+    async def get_products_many(self, product_ids: List[str]) -> List[Dict]:
+        """Get several full product documents by ID"""
+        try:
+            return await fetch_by_ids(self.products_collection, product_ids)
+            
+        except Exception as e:
+            logger.error(f"Error getting products: {str(e)}")
+            return []
+    
     async def get_all_products(self, limit: int = 10000) -> List[Dict]:
         """Get all products for content-based filtering"""
         try:
-            cursor = self.mongodb_db.products.find({}).limit(limit)
+            cursor = self.products_collection.find({}).limit(limit)
             products = await cursor.to_list(length=limit)
             return products
             
@@ -144,8 +284,6 @@ class DatabaseManager:
         """Get list of product IDs purchased by a user"""
         try:
             # Query orders collection for user's purchases
-            orders_collection = self.db["orders"]
-            
             pipeline = [
                 {"$match": {"user_id": user_id, "status": "completed"}},
                 {"$unwind": "$items"},
@@ -153,166 +291,303 @@ class DatabaseManager:
                 {"$project": {"product_id": "$_id", "_id": 0}}
             ]
             
-            results = await orders_collection.aggregate(pipeline).to_list(None)
+            results = await self.orders_collection.aggregate(pipeline).to_list(None)
             return [result["product_id"] for result in results]
             
         except Exception as e:
             logger.error(f"Error getting user purchased products: {str(e)}")
             return []
     
+    async def _buffer_behavior(self, collection: str, document: Dict):
+        """Queue a behavior document, flushing early once the buffer is full"""
+        buffer = self._behavior_buffer.setdefault(collection, [])
+        buffer.append(document)
+        if len(buffer) >= BEHAVIOR_FLUSH_SIZE:
+            await self.flush()
+    
+    async def flush(self):
+        """Write all buffered behavior documents with one unordered insert per collection"""
+        # Nothing can be written before connect() creates the lock
+        if self._behavior_lock is None:
+            return
+        
+        async with self._behavior_lock:
+            buffers, self._behavior_buffer = self._behavior_buffer, {}
+            for collection, documents in buffers.items():
+                if collection == "user_interactions":
+                    try:
+                        await self._denormalize_interactions(documents)
+                        
+                    except Exception as e:
+                        # Written without product fields; the startup backfill fills them in
+                        logger.error(f"Error denormalizing interactions: {str(e)}")
+                
+                try:
+                    await self.mongodb_db[collection].insert_many(documents, ordered=False)
+                    
+                except Exception as e:
+                    logger.error(f"Error flushing {collection} writes: {str(e)}")
+    
+    async def _flush_behavior_periodically(self):
+        """Flush buffered behavior writes on a short fixed interval"""
+        while True:
+            await asyncio.sleep(BEHAVIOR_FLUSH_INTERVAL_SECONDS)
+            if self._behavior_buffer:
+                # Shielded so cancelling the loop never drops a batch mid-insert
+                await asyncio.shield(self.flush())
+    
+    async def _denormalize_interactions(self, documents: List[Dict]):
+        """Copy product fields onto buffered interactions with one product query per flush"""
+        product_ids = list({document["product_id"] for document in documents if "product_id" in document})
+        if not product_ids:
+            return
+        
+        products = await fetch_by_ids(
+            self.products_collection, product_ids,
+            projection=dict.fromkeys(DENORMALIZED_PRODUCT_FIELDS, 1)
+        )
+        fields_by_id = {
+            product["_id"]: {field: product[field] for field in DENORMALIZED_PRODUCT_FIELDS if field in product}
+            for product in products
+        }
+        for document in documents:
+            document.update(fields_by_id.get(document.get("product_id"), {}))
+    
     async def track_user_behavior(self, interaction_data: Dict) -> bool:
         """Track user behavior in database"""
         try:
             interaction_data["timestamp"] = datetime.utcnow()
-            await self.mongodb_db.user_interactions.insert_one(interaction_data)
+            # Product fields are filled in at flush time, off the per-event path
+            await self._buffer_behavior("user_interactions", interaction_data)
             return True
             
         except Exception as e:
             logger.error(f"Error tracking user behavior: {str(e)}")
             return False
     
-    async def get_trending_products(self, category: Optional[str], start_time: datetime, limit: int) -> List[Dict]:
-        """Get trending products based on interactions"""
+    async def _ensure_indexes(self):
+        """Create the indexes the query pipelines rely on (idempotent)"""
+        await asyncio.gather(
+            self.interactions_collection.create_index([("user_id", 1), ("_id", -1)]),
+            self.interactions_collection.create_index([("product_id", 1), ("interaction_type", 1)]),
+            self.interactions_collection.create_index([("user_id", 1), ("category", 1)]),
+            self.behavior_collection.create_index([("timestamp", -1), ("behavior_type", 1), ("product_id", 1)]),
+            self.products_collection.create_index([("category", 1)]),
+            self.orders_collection.create_index([("user_id", 1), ("status", 1)]),
+            # $merge requires a unique index on its "on" fields
+            self.trending_collection.create_index(
+                [("category", 1), ("window", 1), ("product_id", 1)],
+                unique=True
+            ),
+            self.trending_collection.create_index([("window", 1), ("category", 1), ("trending_score", -1)]),
+            self.trending_collection.create_index([("window", 1), ("trending_score", -1)])
+        )
+    
+    async def refresh_trending_rollup(self, window_minutes: int):
+        """Recompute trending scores for one window into the trending_rollup collection"""
         try:
-            behavior_collection = self.db["user_behavior"]
-            
-            # Build match criteria
-            match_criteria = {
-                "timestamp": {"$gte": start_time},
-                "behavior_type": {"$in": ["view", "add_to_cart", "purchase"]}
-            }
-            
-            # Add category filter if specified
-            if category:
-                products_collection = self.db["products"]
-                category_products = await products_collection.find(
-                    {"category": category}
-                ).to_list(None)
-                
-                if category_products:
-                    product_ids = [str(p["_id"]) for p in category_products]
-                    match_criteria["product_id"] = {"$in": product_ids}
+            refreshed_at = datetime.utcnow()
+            start_time = refreshed_at - timedelta(minutes=window_minutes)
             
-            # Aggregation pipeline
             pipeline = [
-                {"$match": match_criteria},
+                {"$match": {
+                    "timestamp": {"$gte": start_time},
+                    "behavior_type": {"$in": ["view", "add_to_cart", "purchase"]}
+                }},
                 {"$group": {
                     "_id": "$product_id",
                     "interaction_count": {"$sum": 1},
                     "unique_users": {"$addToSet": "$user_id"}
                 }},
-                {"$addFields": {
+                {"$lookup": {
+                    "from": "products",
+                    "localField": "_id",
+                    "foreignField": "_id",
+                    "as": "product"
+                }},
+                # $merge rejects null "on" fields, so deleted products are dropped
+                # and uncategorized ones are keyed under an empty category
+                {"$match": {"product": {"$ne": []}}},
+                {"$project": {
+                    "_id": 0,
+                    "product_id": "$_id",
+                    "category": {"$ifNull": [{"$first": "$product.category"}, ""]},
+                    "window": {"$literal": window_minutes},
+                    "interaction_count": 1,
                     "unique_user_count": {"$size": "$unique_users"},
-                    "trending_score": {"$multiply": ["$interaction_count", {"$size": "$unique_users"}]}
+                    "trending_score": {"$multiply": ["$interaction_count", {"$size": "$unique_users"}]},
+                    "refreshed_at": {"$literal": refreshed_at}
                 }},
-                {"$sort": {"trending_score": -1}},
-                {"$limit": limit}
+                {"$merge": {
+                    "into": "trending_rollup",
+                    "on": ["category", "window", "product_id"],
+                    "whenMatched": "replace",
+                    "whenNotMatched": "insert"
+                }}
             ]
             
-            trending_results = await behavior_collection.aggregate(pipeline).to_list(None)
+            await self.behavior_collection.aggregate(pipeline).to_list(None)
             
-            # Get product details
-            if trending_results:
-                product_ids = [result["_id"] for result in trending_results]
-                products_collection = self.db["products"]
-                products = await products_collection.find(
-                    {"_id": {"$in": product_ids}}
-                ).to_list(None)
-                
-                # Combine trending data with product details
-                product_map = {str(p["_id"]): p for p in products}
-                
-                trending_products = []
-                for result in trending_results:
-                    product_id = result["_id"]
-                    if product_id in product_map:
-                        product = product_map[product_id]
-                        product["trending_score"] = result["trending_score"]
-                        product["interaction_count"] = result["interaction_count"]
-                        product["unique_users"] = result["unique_user_count"]
-                        trending_products.append(product)
-                
-                return trending_products
+            # Drop products that fell out of the window since the last refresh
+            await self.trending_collection.delete_many({
+                "window": window_minutes,
+                "refreshed_at": {"$lt": refreshed_at}
+            })
             
-            return []
+        except Exception as e:
+            logger.error(f"Error refreshing trending rollup: {str(e)}")
+    
+    async def _refresh_trending_periodically(self):
+        """Refresh every trending window on the configured interval"""
+        while True:
+            for window_minutes in self.settings.TRENDING_WINDOWS_MINUTES:
+                await self.refresh_trending_rollup(window_minutes)
+            
+            await asyncio.sleep(self.settings.TRENDING_REFRESH_INTERVAL_MINUTES * 60)
+    
+    def _trending_window(self, start_time: datetime) -> int:
+        """Snap a requested start time to the closest materialized window"""
+        requested = (datetime.utcnow() - start_time).total_seconds() / 60
+        return min(self.settings.TRENDING_WINDOWS_MINUTES,
+                   key=lambda window: abs(window - requested))
+    
+    async def get_trending_products(self, category: Optional[str], start_time: datetime, limit: int) -> List[Dict]:
+        """Get trending products from the materialized trending rollup"""
+        try:
+            window_minutes = self._trending_window(start_time)
+            return await self._singleflight(
+                f"trending:{window_minutes}:{category}:{limit}",
+                lambda: self._load_trending_products(window_minutes, category, limit),
+                self.settings.TRENDING_REFRESH_INTERVAL_MINUTES * 60,
+                CacheType.TRENDING_PRODUCTS
+            )
             
         except Exception as e:
             logger.error(f"Error getting trending products: {str(e)}")
             return []
     
+    async def _load_trending_products(self, window_minutes: int, category: Optional[str],
+                                      limit: int) -> List[Dict]:
+        """Read the top rollup rows for a window and attach product details"""
+        query = {"window": window_minutes}
+        if category:
+            query["category"] = category
+        
+        trending_results = await self.trending_collection.find(query).sort(
+            "trending_score", -1
+        ).limit(limit).to_list(None)
+        
+        # Get product details
+        if trending_results:
+            product_ids = [result["product_id"] for result in trending_results]
+            products = await fetch_by_ids(self.products_collection, product_ids)
+            
+            # Combine trending data with product details
+            product_map = {str(p["_id"]): p for p in products}
+            
+            trending_products = []
+            for result in trending_results:
+                product_id = str(result["product_id"])
+                if product_id in product_map:
+                    product = product_map[product_id]
+                    product["trending_score"] = result["trending_score"]
+                    product["interaction_count"] = result["interaction_count"]
+                    product["unique_users"] = result["unique_user_count"]
+                    trending_products.append(product)
+            
+            return trending_products
+        
+        return []
+    
     async def get_popular_products(self, category: Optional[str] = None, 
                                  limit: int = 10) -> List[Dict]:
         """Get popular products for cold start problem"""
         try:
-            pipeline = [
-                {
-                    "$lookup": {
-                        "from": "user_interactions",
-                        "localField": "_id",
-                        "foreignField": "product_id",
-                        "as": "interactions"
-                    }
-                }
-            ]
-            
-            # Add category filter if specified
-            if category:
-                pipeline.insert(0, {
-                    "$match": {
-                        "category": category
-                    }
-                })
-            
-            # Calculate popularity score
-            pipeline.extend([
-                {
-                    "$addFields": {
-                        "interaction_count": {"$size": "$interactions"},
-                        "purchase_count": {
-                            "$size": {
-                                "$filter": {
-                                    "input": "$interactions",
-                                    "cond": {"$eq": ["$this.interaction_type", "purchase"]}
-                                }
-                            }
-                        },
-                        "rating_sum": {"$sum": "$reviews.rating"},
-                        "rating_count": {"$size": "$reviews"}
-                    }
-                },
-                {
-                    "$addFields": {
-                        "avg_rating": {
-                            "$cond": [
-                                {"$gt": ["$rating_count", 0]},
-                                {"$divide": ["$rating_sum", "$rating_count"]},
-                                0
-                            ]
-                        },
-                        "popularity_score": {
-                            "$add": [
-                                {"$multiply": ["$interaction_count", 1]},
-                                {"$multiply": ["$purchase_count", 3]},
-                                {"$multiply": ["$avg_rating", 2]}
-                            ]
-                        }
-                    }
-                },
-                {
-                    "$sort": {"popularity_score": -1}
-                },
-                {
-                    "$limit": limit
-                }
-            ])
-            
-            cursor = self.mongodb_db.products.aggregate(pipeline)
-            popular = await cursor.to_list(length=limit)
-            return popular
+            return await self._get_popular_products_cached(category, limit)
             
         except Exception as e:
             logger.error(f"Error getting popular products: {str(e)}")
             return []
+    
+    # Served from process memory in front of Redis; failures propagate and are not kept
+    @l1_cache(CacheType.POPULAR_PRODUCTS, method=True)
+    async def _get_popular_products_cached(self, category: Optional[str], limit: int) -> List[Dict]:
+        """Get popular products through the Redis cache, loading them once on a miss"""
+        return await self._singleflight(
+            f"popular:{category}:{limit}",
+            lambda: self._load_popular_products(category, limit),
+            3600,
+            CacheType.POPULAR_PRODUCTS
+        )
+    
+    async def _load_popular_products(self, category: Optional[str], limit: int) -> List[Dict]:
+        """Rank products by interactions, purchases and rating"""
+        # Narrow the products before joining so the lookup only runs for candidates
+        pipeline = [{"$match": {"category": category}}] if category else []
+        
+        # Count interactions and purchases inside the lookup instead of
+        # joining every interaction document onto the product
+        pipeline.extend([
+            {
+                "$lookup": {
+                    "from": "user_interactions",
+                    "let": {"pid": "$_id"},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$eq": ["$product_id", "$$pid"]}}},
+                        {"$group": {
+                            "_id": None,
+                            "interaction_count": {"$sum": 1},
+                            "purchase_count": {
+                                "$sum": {"$cond": [{"$eq": ["$interaction_type", "purchase"]}, 1, 0]}
+                            }
+                        }}
+                    ],
+                    "as": "agg"
+                }
+            },
+            {
+                "$unwind": {"path": "$agg", "preserveNullAndEmptyArrays": True}
+            },
+            {
+                "$addFields": {
+                    "interaction_count": {"$ifNull": ["$agg.interaction_count", 0]},
+                    "purchase_count": {"$ifNull": ["$agg.purchase_count", 0]},
+                    "rating_sum": {"$sum": "$reviews.rating"},
+                    "rating_count": {"$size": "$reviews"}
+                }
+            },
+            {
+                "$addFields": {
+                    "avg_rating": {
+                        "$cond": [
+                            {"$gt": ["$rating_count", 0]},
+                            {"$divide": ["$rating_sum", "$rating_count"]},
+                            0
+                        ]
+                    },
+                    "popularity_score": {
+                        "$add": [
+                            {"$multiply": ["$interaction_count", 1]},
+                            {"$multiply": ["$purchase_count", 3]},
+                            {"$multiply": ["$avg_rating", 2]}
+                        ]
+                    }
+                }
+            },
+            {
+                "$sort": {"popularity_score": -1}
+            },
+            {
+                "$limit": limit
+            },
+            {
+                "$unset": "agg"
+            }
+        ])
+        
+        cursor = self.products_collection.aggregate(pipeline)
+        popular = await cursor.to_list(length=limit)
+        return popular
         
     # async def get_popular_products(self, category: Optional[str], limit: int) -> List[Dict]:
     #     """Get popular products based on overall statistics"""
@@ -339,26 +614,60 @@ class DatabaseManager:
     #         logger.error(f"Error getting popular products: {str(e)}")
     #         return []
 
+    async def mget_json(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several JSON cache entries in a single round-trip"""
+        async with self.cache_redis_client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.get(key)
+            results = await pipe.execute()
+        
+        return [decode(result) if result else None for result in results]
+    
+    async def mset_json(self, items: Dict[str, Any], ttl: int, cache_type: CacheType):
+        """Set several cache entries with a TTL in a single round-trip, encoded for their cache type"""
+        async with self.cache_redis_client.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.setex(key, ttl, encode(cache_type, value))
+            await pipe.execute()
+    
+    async def _singleflight(self, cache_key: str, producer: Callable[[], Awaitable[Any]], ttl: int,
+                            cache_type: CacheType) -> Any:
+        """Serve a cached result, letting one coroutine per key compute it on a miss"""
+        cached = await self.get_cached_data(cache_key)
+        if cached is not None:
+            return cached
+        
+        lock = self._singleflight_locks.get(cache_key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._singleflight_locks[cache_key] = lock
+        
+        async with lock:
+            # Followers find the leader's result once they get the lock
+            cached = await self.get_cached_data(cache_key)
+            if cached is not None:
+                return cached
+            
+            # Round-trip through the cache encoding so a miss returns the same
+            # shape as a hit, with ObjectIds and datetimes as strings
+            result = decode(encode(cache_type, await producer()))
+            await self.cache_data(cache_key, result, ttl, cache_type)
+            return result
+    
     async def get_cached_data(self, cache_key: str) -> Optional[List[Dict]]:
         """Get cached data by key"""
         try:
-            cached_data = await self.redis_client.get(cache_key)
-            
-            if cached_data:
-                import json
-                return json.loads(cached_data)
-            
-            return None
+            cached_data = await self.mget_json([cache_key])
+            return cached_data[0]
             
         except Exception as e:
             logger.error(f"Error getting cached data: {str(e)}")
             return None
         
-    async def cache_data(self, cache_key: str, data: List[Dict], ttl: int):
+    async def cache_data(self, cache_key: str, data: List[Dict], ttl: int, cache_type: CacheType):
         """Cache data with TTL"""
         try:
-            import json
-            await self.redis_client.setex(cache_key, ttl, json.dumps(data))
+            await self.mset_json({cache_key: data}, ttl, cache_type)
             
         except Exception as e:
             logger.error(f"Error caching data: {str(e)}")
@@ -366,8 +675,7 @@ class DatabaseManager:
     async def get_last_training_time(self) -> Optional[datetime]:
         """Get the last model training time"""
         try:
-            model_status_collection = self.db["model_status"]
-            status = await model_status_collection.find_one({"_id": "training_status"})
+            status = await self.model_status_collection.find_one({"_id": "training_status"})
             
             if status and "last_trained" in status:
                 return status["last_trained"]
@@ -381,8 +689,7 @@ class DatabaseManager:
     async def update_model_status(self, status: str):
         """Update model training status"""
         try:
-            model_status_collection = self.db["model_status"]
-            await model_status_collection.update_one(
+            await self.model_status_collection.update_one(
                 {"_id": "training_status"},
                 {
                     "$set": {
@@ -402,83 +709,129 @@ class DatabaseManager:
         try:
             pipeline = [
                 {
+                    # Product fields are denormalized onto interactions; those
+                    # without them had no matching product to join
                     "$match": {
-                        "user_id": user_id
+                        "user_id": user_id,
+                        "category": {"$exists": True}
                     }
                 },
-                {
-                    "$lookup": {
-                        "from": "products",
-                        "localField": "product_id",
-                        "foreignField": "_id",
-                        "as": "product"
-                    }
-                },
-                {
-                    "$unwind": "$product"
-                },
                 {
                     "$group": {
-                        "_id": "$product.category",
+                        "_id": "$category",
                         "interaction_count": {"$sum": 1},
                         "purchase_count": {
                             "$sum": {
                                 "$cond": [{"$eq": ["$interaction_type", "purchase"]}, 1, 0]
                             }
                         },
-                        "avg_price": {"$avg": "$product.price"},
-                        "brands": {"$addToSet": "$product.brand"}
+                        "avg_price": {"$avg": "$price"},
+                        "brands": {"$addToSet": "$brand"}
                     }
                 },
                 {
-                    "$sort": {"interaction_count": -1}
+                    # Return the categories and their total in a single document
+                    "$facet": {
+                        "categories": [
+                            {"$sort": {"interaction_count": -1}}
+                        ],
+                        "total": [
+                            {"$group": {"_id": None, "total": {"$sum": "$interaction_count"}}}
+                        ]
+                    }
                 }
             ]
             
-            cursor = self.mongodb_db.user_interactions.aggregate(pipeline)
-            preferences = await cursor.to_list(length=None)
+            cursor = self.interactions_collection.aggregate(pipeline)
+            result = await cursor.to_list(length=1)
+            total = result[0]["total"]
             return {
-                "categories": preferences,
-                "total_interactions": sum(p["interaction_count"] for p in preferences)
+                "categories": result[0]["categories"],
+                "total_interactions": total[0]["total"] if total else 0
             }
             
         except Exception as e:
             logger.error(f"Error getting user preferences: {str(e)}")
             return {}
     
+    async def backfill_interaction_denorm(self, batch_size: int = 1000) -> int:
+        """Copy product fields onto interactions written before denormalization"""
+        try:
+            updated = 0
+            operations = []
+            product_ids = await self.interactions_collection.distinct(
+                "product_id", {"category": {"$exists": False}}
+            )
+            cursor = self.products_collection.find(
+                {"_id": {"$in": product_ids}},
+                dict.fromkeys(DENORMALIZED_PRODUCT_FIELDS, 1)
+            )
+            
+            async for product in cursor:
+                fields = {field: product[field] for field in DENORMALIZED_PRODUCT_FIELDS if field in product}
+                operations.append(UpdateMany(
+                    {"product_id": product["_id"], "category": {"$exists": False}},
+                    {"$set": fields}
+                ))
+                if len(operations) >= batch_size:
+                    result = await self.interactions_collection.bulk_write(operations, ordered=False)
+                    updated += result.modified_count
+                    operations = []
+            
+            if operations:
+                result = await self.interactions_collection.bulk_write(operations, ordered=False)
+                updated += result.modified_count
+            
+            return updated
+            
+        except Exception as e:
+            logger.error(f"Error backfilling interaction product fields: {str(e)}")
+            return 0
+    
     # Redis caching methods
     async def cache_recommendations(self, user_id: str, recommendations: List[Dict], ttl: int = 3600):
         """Cache recommendations for a user"""
+        await self.cache_recommendations_many({user_id: recommendations}, ttl)
+    
+    async def cache_recommendations_many(self, recommendations: Dict[str, List[Dict]], ttl: int = 3600):
+        """Cache recommendations for several users in one round-trip"""
         try:
-            cache_key = f"recommendations:{user_id}"
-            import json
-            await self.redis_client.setex(cache_key, ttl, json.dumps(recommendations))
+            await self.mset_json(
+                {f"recommendations:{user_id}": recs for user_id, recs in recommendations.items()},
+                ttl,
+                CacheType.USER_RECOMMENDATIONS
+            )
             
         except Exception as e:
             logger.error(f"Error caching recommendations: {str(e)}")
     
     async def get_cached_recommendations(self, user_id: str) -> Optional[List[Dict]]:
         """Get cached recommendations for a user"""
+        cached = await self.get_cached_recommendations_many([user_id])
+        return cached.get(user_id)
+    
+    async def get_cached_recommendations_many(self, user_ids: List[str]) -> Dict[str, Optional[List[Dict]]]:
+        """Get cached recommendations for several users in one round-trip"""
         try:
-            cache_key = f"recommendations:{user_id}"
-            cached_data = await self.redis_client.get(cache_key)
-            
-            if cached_data:
-                import json
-                return json.loads(cached_data)
-            
-            return None
+            cached_data = await self.mget_json([f"recommendations:{user_id}" for user_id in user_ids])
+            return dict(zip(user_ids, cached_data))
             
         except Exception as e:
             logger.error(f"Error getting cached recommendations: {str(e)}")
-            return None
+            return {}
     
     async def cache_similar_products(self, product_id: str, similar_products: List[Dict], ttl: int = 7200):
         """Cache similar products"""
+        await self.cache_similar_products_many({product_id: similar_products}, ttl)
+    
+    async def cache_similar_products_many(self, similar_products: Dict[str, List[Dict]], ttl: int = 7200):
+        """Cache similar products for several products in one round-trip"""
         try:
-            cache_key = f"similar_products:{product_id}"
-            import json
-            await self.redis_client.setex(cache_key, ttl, json.dumps(similar_products))
+            await self.mset_json(
+                {f"similar_products:{product_id}": similar for product_id, similar in similar_products.items()},
+                ttl,
+                CacheType.PRODUCT_SIMILARITIES
+            )
             
         except Exception as e:
             logger.error(f"Error caching similar products: {str(e)}")
@@ -486,8 +839,7 @@ class DatabaseManager:
     async def store_user_behavior(self, behavior_data: Dict):
         """Store user behavior data"""
         try:
-            behavior_collection = self.db["user_behavior"]
-            await behavior_collection.insert_one(behavior_data)
+            await self._buffer_behavior("user_behavior", behavior_data)
             
         except Exception as e:
             logger.error(f"Error storing user behavior: {str(e)}")
@@ -504,34 +856,42 @@ class DatabaseManager:
     
     async def get_cached_similar_products(self, product_id: str) -> Optional[List[Dict]]:
         """Get cached similar products"""
+        cached = await self.get_cached_similar_products_many([product_id])
+        return cached.get(product_id)
+    
+    async def get_cached_similar_products_many(self, product_ids: List[str]) -> Dict[str, Optional[List[Dict]]]:
+        """Get cached similar products for several products in one round-trip"""
         try:
-            cache_key = f"similar_products:{product_id}"
-            cached_data = await self.redis_client.get(cache_key)
-            
-            if cached_data:
-                import json
-                return json.loads(cached_data)
-            
-            return None
+            cached_data = await self.mget_json([f"similar_products:{product_id}" for product_id in product_ids])
+            return dict(zip(product_ids, cached_data))
             
         except Exception as e:
             logger.error(f"Error getting cached similar products: {str(e)}")
-            return None
+            return {}
     
     async def increment_interaction_counter(self, counter_key: str) -> int:
         """Increment interaction counter for auto-retraining"""
+        counts = await self.increment_interaction_counters({counter_key: 1})
+        return counts.get(counter_key, 0)
+    
+    async def increment_interaction_counters(self, increments: Dict[str, int]) -> Dict[str, int]:
+        """Increment several interaction counters in one round-trip"""
         try:
-            count = await self.redis_client.incr(counter_key)
-            return count
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for counter_key, amount in increments.items():
+                    pipe.incrby(counter_key, amount)
+                counts = await pipe.execute()
+            
+            return dict(zip(increments, counts))
             
         except Exception as e:
             logger.error(f"Error incrementing counter: {str(e)}")
-            return 0
+            return {}
     
     async def get_model_metadata(self, model_name: str) -> Optional[Dict]:
         """Get model metadata from database"""
         try:
-            metadata = await self.mongodb_db.model_metadata.find_one(
+            metadata = await self.model_metadata_collection.find_one(
                 {"model_name": model_name}
             )
             return metadata
@@ -543,7 +903,7 @@ class DatabaseManager:
     async def save_model_metadata(self, model_name: str, metadata: Dict) -> bool:
         """Save model metadata to database"""
         try:
-            await self.mongodb_db.model_metadata.update_one(
+            await self.model_metadata_collection.update_one(
                 {"model_name": model_name},
                 {"$set": metadata},
                 upsert=True
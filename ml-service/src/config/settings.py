@@ -3,8 +3,10 @@ Configuration settings for the ML service
 """
 
 import os
-from typing import List
-from pydantic import BaseSettings, Field
+from functools import lru_cache
+from typing import List, Union
+from pydantic import Field, field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,146 +14,167 @@ load_dotenv()
 class Settings(BaseSettings):
     """Application settings"""
     
+    # Field names double as environment variable names
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=True,
+        extra="ignore"
+    )
+    
     # Database Configuration
     MONGODB_URI: str = Field(
-        default="mongodb://localhost:27017/ecommerce",
-        env="MONGODB_URI"
+        default="mongodb://localhost:27017/ecommerce"
+    )
+    
+    # MongoDB connection pool; pool size defaults follow MAX_CONCURRENT_REQUESTS
+    MONGODB_MIN_POOL_SIZE: int = Field(
+        default=10
+    )
+    
+    MONGODB_MAX_IDLE_TIME_MS: int = Field(
+        default=60000
+    )
+    
+    # Wire compression, in preference order; the server must enable the same
+    # compressors through --networkMessageCompressors
+    MONGODB_COMPRESSORS: str = Field(
+        default="zstd,snappy,zlib"
     )
     
     # Redis Configuration
     REDIS_URL: str = Field(
-        default="redis://localhost:6379",
-        env="REDIS_URL"
+        default="redis://localhost:6379"
     )
     
     # Backend API Configuration
     BACKEND_URL: str = Field(
-        default="http://localhost:3001",
-        env="BACKEND_URL"
+        default="http://localhost:3001"
     )
     
     # CORS Configuration
-    ALLOWED_ORIGINS: List[str] = Field(
+    ALLOWED_ORIGINS: Union[List[str], str] = Field(
         default=[
             "http://localhost:3000",
             "http://localhost:3001",
             "https://yourdomain.com"
-        ],
-        env="ALLOWED_ORIGINS"
+        ]
     )
     
     # ML Model Configuration
     MODEL_SAVE_PATH: str = Field(
-        default="./models/saved_models",
-        env="MODEL_SAVE_PATH"
+        default="./models/saved_models"
     )
     
     # Recommendation Parameters
     MIN_INTERACTIONS_FOR_TRAINING: int = Field(
-        default=100,
-        env="MIN_INTERACTIONS_FOR_TRAINING"
+        default=100
     )
     
     DEFAULT_RECOMMENDATIONS_COUNT: int = Field(
-        default=10,
-        env="DEFAULT_RECOMMENDATIONS_COUNT"
+        default=10
     )
     
     MAX_RECOMMENDATIONS_COUNT: int = Field(
-        default=50,
-        env="MAX_RECOMMENDATIONS_COUNT"
+        default=50
     )
     
     # Collaborative Filtering Parameters
     COLLABORATIVE_FILTERING_FACTORS: int = Field(
-        default=50,
-        env="COLLABORATIVE_FILTERING_FACTORS"
+        default=50
     )
     
     COLLABORATIVE_FILTERING_ITERATIONS: int = Field(
-        default=30,
-        env="COLLABORATIVE_FILTERING_ITERATIONS"
+        default=30
     )
     
     # Content-Based Filtering Parameters
     CONTENT_SIMILARITY_THRESHOLD: float = Field(
-        default=0.1,
-        env="CONTENT_SIMILARITY_THRESHOLD"
+        default=0.1
     )
     
     # Caching Configuration
     CACHE_RECOMMENDATIONS_TTL: int = Field(
-        default=3600,  # 1 hour
-        env="CACHE_RECOMMENDATIONS_TTL"
+        default=3600  # 1 hour
     )
     
     CACHE_SIMILAR_PRODUCTS_TTL: int = Field(
-        default=86400,  # 24 hours
-        env="CACHE_SIMILAR_PRODUCTS_TTL"
+        default=86400  # 24 hours
     )
     
     # Model Training Configuration
     AUTO_RETRAIN_THRESHOLD: int = Field(
-        default=1000,  # Retrain after 1000 new interactions
-        env="AUTO_RETRAIN_THRESHOLD"
+        default=1000  # Retrain after 1000 new interactions
     )
     
     MODEL_RETRAIN_INTERVAL_HOURS: int = Field(
-        default=24,
-        env="MODEL_RETRAIN_INTERVAL_HOURS"
+        default=24
+    )
+    
+    # Trending Rollup Configuration
+    TRENDING_REFRESH_INTERVAL_MINUTES: int = Field(
+        default=5
+    )
+    
+    TRENDING_WINDOWS_MINUTES: List[int] = Field(
+        default=[
+            1440,   # day
+            10080,  # week
+            43200   # month
+        ]
     )
     
     # Logging Configuration
     LOG_LEVEL: str = Field(
-        default="INFO",
-        env="LOG_LEVEL"
+        default="INFO"
     )
     
     # Performance Configuration
     MAX_CONCURRENT_REQUESTS: int = Field(
-        default=100,
-        env="MAX_CONCURRENT_REQUESTS"
+        default=100
     )
     
     REQUEST_TIMEOUT_SECONDS: int = Field(
-        default=30,
-        env="REQUEST_TIMEOUT_SECONDS"
+        default=30
     )
     
     # Data Processing Configuration
     BATCH_SIZE: int = Field(
-        default=1000,
-        env="BATCH_SIZE"
+        default=1000
     )
     
     # Feature Engineering
     ENABLE_FEATURE_ENGINEERING: bool = Field(
-        default=True,
-        env="ENABLE_FEATURE_ENGINEERING"
+        default=True
     )
     
     # Cold Start Problem Solutions
     ENABLE_POPULARITY_FALLBACK: bool = Field(
-        default=True,
-        env="ENABLE_POPULARITY_FALLBACK"
+        default=True
     )
     
     ENABLE_CONTENT_FALLBACK: bool = Field(
-        default=True,
-        env="ENABLE_CONTENT_FALLBACK"
+        default=True
     )
     
     # Monitoring and Analytics
     ENABLE_RECOMMENDATION_TRACKING: bool = Field(
-        default=True,
-        env="ENABLE_RECOMMENDATION_TRACKING"
+        default=True
     )
     
     ENABLE_PERFORMANCE_MONITORING: bool = Field(
-        default=True,
-        env="ENABLE_PERFORMANCE_MONITORING"
+        default=True
     )
     
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
\ No newline at end of file
+    @field_validator("ALLOWED_ORIGINS", mode="before")
+    @classmethod
+    def _split_origins(cls, value):
+        """Accept a comma-separated origin list as well as a JSON array"""
+        if isinstance(value, str):
+            return [origin.strip() for origin in value.split(",") if origin.strip()]
+        return value
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Shared settings instance, parsed once per process"""
+    return Settings()
\ No newline at end of file
@@ -1,32 +1,82 @@
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional
+import numpy as np
 import pandas as pd
-from pymongo import MongoClient
+from pymongo import CursorType, MongoClient
 from src.config.settings import Settings
 
 logger = logging.getLogger(__name__)
 
+# Rows per preallocated column chunk and per cursor batch
+LOAD_CHUNK_SIZE = 10000
+
 class DataLoader:
     def __init__(self, db_client: MongoClient):
+        self.db_client = db_client
         self.db = db_client.get_database()
 
+    def _bulk_cursor_type(self) -> int:
+        """Exhaust cursors where the server supports them; mongos rejects them"""
+        if self.db_client.is_mongos:
+            return CursorType.NON_TAILABLE
+        return CursorType.EXHAUST
+
     def load_user_item_interactions(self) -> pd.DataFrame:
         """Load user-item interactions from MongoDB"""
         try:
-            interactions = list(self.db.user_interactions.find(
+            # Exhaust cursors stream batches without a getMore round-trip each;
+            # through mongos this falls back to a normal cursor with large batches
+            cursor = self.db.user_interactions.find(
                 {},
-                {'user_id': 1, 'product_id': 1, 'rating': 1, '_id': 0}
-            ))
-            return pd.DataFrame(interactions)
+                {'user_id': 1, 'product_id': 1, 'rating': 1, '_id': 0},
+                cursor_type=self._bulk_cursor_type(),
+                batch_size=LOAD_CHUNK_SIZE
+            )
+            
+            # Fill fixed-size column chunks straight from the cursor instead of
+            # holding a list of row dicts, then join the chunks once at the end
+            user_chunks, product_chunks, rating_chunks = [], [], []
+            count = LOAD_CHUNK_SIZE
+            for doc in cursor:
+                if count == LOAD_CHUNK_SIZE:
+                    user_chunks.append(np.empty(LOAD_CHUNK_SIZE, dtype=object))
+                    product_chunks.append(np.empty(LOAD_CHUNK_SIZE, dtype=object))
+                    rating_chunks.append(np.empty(LOAD_CHUNK_SIZE, dtype=np.float32))
+                    count = 0
+                user_chunks[-1][count] = doc.get('user_id')
+                product_chunks[-1][count] = doc.get('product_id')
+                # A stored null rating is missing too; None cannot go into a float32 array
+                rating = doc.get('rating')
+                rating_chunks[-1][count] = np.nan if rating is None else rating
+                count += 1
+            
+            if not user_chunks:
+                return pd.DataFrame({
+                    'user_id': np.empty(0, dtype=object),
+                    'product_id': np.empty(0, dtype=object),
+                    'rating': np.empty(0, dtype=np.float32)
+                })
+            
+            # Trim the unused tail of the last chunk
+            user_chunks[-1] = user_chunks[-1][:count]
+            product_chunks[-1] = product_chunks[-1][:count]
+            rating_chunks[-1] = rating_chunks[-1][:count]
+            
+            return pd.DataFrame({
+                'user_id': np.concatenate(user_chunks),
+                'product_id': np.concatenate(product_chunks),
+                'rating': np.concatenate(rating_chunks)
+            }, copy=False)
         except Exception as e:
             logger.error(f"Error loading interactions: {str(e)}")
             raise
 
-    def load_product_features(self) -> List[Dict]:
-        """Load product features for content-based filtering"""
+    def load_product_features(self, product_ids: Optional[List[str]] = None) -> List[Dict]:
+        """Load product features for content-based filtering, optionally for given IDs"""
         try:
+            query = {'_id': {'$in': product_ids}} if product_ids is not None else {}
             products = list(self.db.products.find(
-                {},
+                query,
                 {
                     'product_id': 1,
                     'title': 1,
@@ -36,7 +86,7 @@ class DataLoader:
                     'rating': 1,
                     '_id': 0
                 }
-            ))
+            ).batch_size(1000))
             return products
         except Exception as e:
             logger.error(f"Error loading products: {str(e)}")
@@ -4,27 +4,49 @@ Data preprocessing utilities for ML recommendation engine
 
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, NamedTuple, Tuple, Optional
 from datetime import datetime, timedelta
 import logging
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.preprocessing import StandardScaler
 from sklearn.feature_extraction.text import TfidfVectorizer
 import re
+import joblib
+import scipy.sparse as sp
 
 logger = logging.getLogger(__name__)
 
+class UserItemMatrix(NamedTuple):
+    """Sparse user-item scores with the IDs behind each row and column"""
+    matrix: sp.csr_matrix
+    user_ids: np.ndarray
+    product_ids: np.ndarray
+    
+    def to_frame(self) -> pd.DataFrame:
+        """Sparse-backed user x product frame, accepted by the collaborative filtering trainers"""
+        frame = pd.DataFrame.sparse.from_spmatrix(self.matrix, index=self.user_ids, columns=self.product_ids)
+        # Newer pandas fill unstored entries with NaN; the pivot filled them with 0
+        return frame.astype(pd.SparseDtype(self.matrix.dtype, 0))
+
 class DataPreprocessor:
     """Handles data preprocessing for recommendation models"""
     
+    # Text cleaning patterns, compiled once for the scalar and batch paths
+    _RE_HTML = re.compile(r'<[^>]+>')
+    _RE_NONALNUM = re.compile(r'[^a-zA-Z0-9\s]')
+    _RE_WS = re.compile(r'\s+')
+    
     def __init__(self):
         self.scaler = StandardScaler()
         self.label_encoders = {}
+        # Input is description_processed, which _clean_text already lowercased
         self.tfidf_vectorizer = TfidfVectorizer(
             max_features=1000,
             stop_words='english',
-            lowercase=True,
-            ngram_range=(1, 2)
+            lowercase=False,
+            ngram_range=(1, 2),
+            dtype=np.float32
         )
+        self._tfidf_fitted = False
     
     def preprocess_user_data(self, user_data: List[Dict]) -> pd.DataFrame:
         """Preprocess user data for recommendation models"""
@@ -42,9 +64,7 @@ class DataPreprocessor:
             
             # Normalize numerical features
             numerical_cols = ['age', 'total_orders', 'total_spent']
-            for col in numerical_cols:
-                if col in df.columns:
-                    df[col] = self._normalize_numerical(df[col])
+            self._normalize_block(df, [col for col in numerical_cols if col in df.columns])
             
             # Create user segments
             df['user_segment'] = self._create_user_segments(df)
@@ -65,9 +85,7 @@ class DataPreprocessor:
             
             # Process text features
             if 'description' in df.columns:
-                df['description_processed'] = df['description'].apply(
-                    self._clean_text
-                )
+                df['description_processed'] = self._clean_text_series(df['description'])
             
             # Encode categorical variables
             categorical_cols = ['category', 'brand', 'tags']
@@ -80,9 +98,7 @@ class DataPreprocessor:
             
             # Normalize numerical features
             numerical_cols = ['price', 'rating', 'review_count']
-            for col in numerical_cols:
-                if col in df.columns:
-                    df[col] = self._normalize_numerical(df[col])
+            self._normalize_block(df, [col for col in numerical_cols if col in df.columns])
             
             # Create product features
             df['price_category'] = self._create_price_categories(df.get('price', []))
@@ -135,28 +151,28 @@ class DataPreprocessor:
             logger.error(f"Error preprocessing interaction data: {str(e)}")
             raise
     
-    def create_user_item_matrix(self, interaction_df: pd.DataFrame) -> pd.DataFrame:
-        """Create user-item interaction matrix"""
+    def create_user_item_matrix(self, interaction_df: pd.DataFrame) -> UserItemMatrix:
+        """Create sparse user-item interaction matrix"""
         try:
             # Create weighted interaction scores
-            interaction_df['weighted_score'] = (
+            weighted_score = (
                 interaction_df['interaction_weight'] * 
                 interaction_df['recency_weight']
-            )
+            ).to_numpy(dtype=np.float32)
+            
+            user_codes, user_ids = pd.factorize(interaction_df['user_id'])
+            product_codes, product_ids = pd.factorize(interaction_df['product_id'])
             
-            # Aggregate multiple interactions
-            user_item_matrix = interaction_df.groupby(['user_id', 'product_id'])[
-                'weighted_score'
-            ].sum().reset_index()
+            # Missing IDs factorize to -1 and have no row or column
+            valid = (user_codes >= 0) & (product_codes >= 0)
             
-            # Pivot to create matrix
-            matrix = user_item_matrix.pivot(
-                index='user_id', 
-                columns='product_id', 
-                values='weighted_score'
-            ).fillna(0)
+            # Repeated (user, product) pairs are summed by the CSR conversion
+            matrix = sp.coo_matrix(
+                (weighted_score[valid], (user_codes[valid], product_codes[valid])),
+                shape=(len(user_ids), len(product_ids))
+            ).tocsr()
             
-            return matrix
+            return UserItemMatrix(matrix, np.asarray(user_ids), np.asarray(product_ids))
             
         except Exception as e:
             logger.error(f"Error creating user-item matrix: {str(e)}")
@@ -184,17 +200,30 @@ class DataPreprocessor:
             
         return df
     
-    def _encode_categorical(self, series: pd.Series, col_name: str) -> pd.Series:
-        """Encode categorical variables"""
+    def _encode_categorical(self, series: pd.Series, col_name: str) -> np.ndarray:
+        """Encode categorical variables as codes of a per-column CategoricalDtype"""
+        # Only stringify columns that are not already strings
+        if not pd.api.types.is_string_dtype(series):
+            series = series.astype(str)
+        
         if col_name not in self.label_encoders:
-            self.label_encoders[col_name] = LabelEncoder()
-            return self.label_encoders[col_name].fit_transform(series.astype(str))
-        else:
-            return self.label_encoders[col_name].transform(series.astype(str))
+            # Sorted categories give the same codes LabelEncoder did
+            self.label_encoders[col_name] = pd.CategoricalDtype(np.sort(pd.unique(series.dropna())))
+        
+        # Values unseen at fit time encode as -1
+        return series.astype(self.label_encoders[col_name]).cat.codes.to_numpy()
     
-    def _normalize_numerical(self, series: pd.Series) -> pd.Series:
-        """Normalize numerical features"""
-        return (series - series.min()) / (series.max() - series.min())
+    def _normalize_block(self, df: pd.DataFrame, cols: List[str]) -> None:
+        """Min-max normalize several numerical columns in place with one pass over the block"""
+        if not cols or df.empty:
+            return
+        
+        values = df[cols].to_numpy(dtype=np.float32)
+        col_min = np.nanmin(values, axis=0)
+        col_max = np.nanmax(values, axis=0)
+        # Constant columns would divide by zero; they normalize to 0 instead
+        col_range = np.where(col_max > col_min, col_max - col_min, 1.0).astype(np.float32)
+        df[cols] = (values - col_min) / col_range
     
     def _clean_text(self, text: str) -> str:
         """Clean text data"""
@@ -202,16 +231,28 @@ class DataPreprocessor:
             return ""
         
         # Remove HTML tags
-        text = re.sub(r'<[^>]+>', '', text)
+        text = self._RE_HTML.sub('', text)
         
         # Remove special characters
-        text = re.sub(r'[^a-zA-Z0-9\s]', '', text)
+        text = self._RE_NONALNUM.sub('', text)
         
         # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = self._RE_WS.sub(' ', text).strip()
         
         return text.lower()
     
+    def _clean_text_series(self, texts: pd.Series) -> pd.Series:
+        """Clean a column of text with vectorized string operations"""
+        return (
+            texts.str.replace(self._RE_HTML, '', regex=True)
+            .str.replace(self._RE_NONALNUM, '', regex=True)
+            .str.replace(self._RE_WS, ' ', regex=True)
+            .str.strip()
+            .str.lower()
+            # Non-string values come through as NaN, which _clean_text maps to ""
+            .fillna('')
+        )
+    
     def _process_tags(self, tags) -> str:
         """Process product tags"""
         if isinstance(tags, list):
@@ -223,39 +264,37 @@ class DataPreprocessor:
     
     def _create_user_segments(self, df: pd.DataFrame) -> pd.Series:
         """Create user segments based on behavior"""
-        segments = []
+        zeros = np.zeros(len(df))
+        total_orders = df['total_orders'].to_numpy() if 'total_orders' in df.columns else zeros
+        total_spent = df['total_spent'].to_numpy() if 'total_spent' in df.columns else zeros
         
-        for _, row in df.iterrows():
-            total_orders = row.get('total_orders', 0)
-            total_spent = row.get('total_spent', 0)
-            
-            if total_orders >= 10 and total_spent >= 1000:
-                segments.append('premium')
-            elif total_orders >= 5 and total_spent >= 500:
-                segments.append('regular')
-            elif total_orders >= 1:
-                segments.append('occasional')
-            else:
-                segments.append('new')
+        # Conditions are checked in order, so the first match wins
+        conditions = [
+            (total_orders >= 10) & (total_spent >= 1000),
+            (total_orders >= 5) & (total_spent >= 500),
+            total_orders >= 1
+        ]
+        segments = np.select(conditions, ['premium', 'regular', 'occasional'], default='new')
         
-        return pd.Series(segments)
+        return pd.Series(
+            pd.Categorical(segments, categories=['premium', 'regular', 'occasional', 'new']),
+            index=df.index
+        )
     
     def _create_price_categories(self, prices: pd.Series) -> pd.Series:
         """Create price categories"""
         if prices.empty:
             return pd.Series([])
         
-        quantiles = prices.quantile([0.33, 0.66])
+        quantiles = prices.quantile([0.33, 0.66]).to_numpy()
         
-        def categorize_price(price):
-            if price <= quantiles[0.33]:
-                return 'low'
-            elif price <= quantiles[0.66]:
-                return 'medium'
-            else:
-                return 'high'
+        # right=True keeps prices equal to a cut point in the lower bucket
+        codes = np.digitize(prices.to_numpy(), quantiles, right=True)
         
-        return prices.apply(categorize_price)
+        return pd.Series(
+            pd.Categorical.from_codes(codes, categories=['low', 'medium', 'high']),
+            index=prices.index
+        )
     
     def _calculate_popularity_score(self, df: pd.DataFrame) -> pd.Series:
         """Calculate product popularity score"""
@@ -269,8 +308,14 @@ class DataPreprocessor:
     
     def _calculate_recency(self, timestamps: pd.Series) -> pd.Series:
         """Calculate recency in days"""
-        now = datetime.now()
-        return (now - timestamps).dt.days
+        now = np.datetime64(datetime.now(), 'ns')
+        # Casting to whole days floors, matching Timedelta.days
+        days = (now - timestamps.to_numpy(dtype='datetime64[ns]')).astype('timedelta64[D]')
+        
+        missing = np.isnat(days)
+        if missing.any():
+            return pd.Series(np.where(missing, np.nan, days.view(np.int64)), index=timestamps.index)
+        return pd.Series(days.view(np.int64).astype(np.int32), index=timestamps.index)
     
     def _calculate_recency_weight(self, recency_days: pd.Series) -> pd.Series:
         """Calculate recency weight (more recent = higher weight)"""
@@ -280,36 +325,93 @@ class DataPreprocessor:
     
     def _filter_recent_interactions(self, df: pd.DataFrame, days: int = 365) -> pd.DataFrame:
         """Filter interactions to recent ones only"""
-        cutoff_date = datetime.now() - timedelta(days=days)
-        return df[df['timestamp'] >= cutoff_date]
+        cutoff_date = np.datetime64(datetime.now() - timedelta(days=days), 'ns')
+        return df[df['timestamp'].to_numpy(dtype='datetime64[ns]') >= cutoff_date]
     
-    def get_content_features(self, product_df: pd.DataFrame) -> np.ndarray:
-        """Extract content features for content-based filtering"""
+    def get_content_features(self, product_df: pd.DataFrame) -> sp.csr_matrix:
+        """Fit the TF-IDF vocabulary and extract content features for content-based filtering"""
         try:
-            # Combine text features
-            text_features = product_df['description_processed'].fillna('')
-            
             # Create TF-IDF features
-            tfidf_features = self.tfidf_vectorizer.fit_transform(text_features)
-            
-            # Get numerical features
-            numerical_features = []
-            for col in ['price', 'rating', 'review_count', 'popularity_score']:
-                if col in product_df.columns:
-                    numerical_features.append(product_df[col].values.reshape(-1, 1))
-            
-            if numerical_features:
-                numerical_features = np.hstack(numerical_features)
-                # Combine TF-IDF and numerical features
-                content_features = np.hstack([
-                    tfidf_features.toarray(),
-                    numerical_features
-                ])
-            else:
-                content_features = tfidf_features.toarray()
-            
-            return content_features
+            tfidf_features = self.tfidf_vectorizer.fit_transform(self._content_text(product_df))
+            self._tfidf_fitted = True
+            
+            return self._combine_content_features(tfidf_features, product_df)
             
         except Exception as e:
             logger.error(f"Error extracting content features: {str(e)}")
+            raise
+    
+    def fit_content(self, product_df: pd.DataFrame) -> 'DataPreprocessor':
+        """Learn the TF-IDF vocabulary without transforming"""
+        try:
+            self.tfidf_vectorizer.fit(self._content_text(product_df))
+            self._tfidf_fitted = True
+            return self
+            
+        except Exception as e:
+            logger.error(f"Error fitting content features: {str(e)}")
+            raise
+    
+    def transform_content(self, product_df: pd.DataFrame) -> sp.csr_matrix:
+        """Extract content features with the already fitted TF-IDF vocabulary"""
+        try:
+            if not self._tfidf_fitted:
+                raise ValueError("TF-IDF vectorizer is not fitted; call fit_content or load first")
+            
+            tfidf_features = self.tfidf_vectorizer.transform(self._content_text(product_df))
+            return self._combine_content_features(tfidf_features, product_df)
+            
+        except Exception as e:
+            logger.error(f"Error extracting content features: {str(e)}")
+            raise
+    
+    def _content_text(self, product_df: pd.DataFrame) -> pd.Series:
+        """Combine text features"""
+        return product_df['description_processed'].fillna('')
+    
+    def _combine_content_features(self, tfidf_features: sp.spmatrix,
+                                  product_df: pd.DataFrame) -> sp.csr_matrix:
+        """Append numerical product columns to the TF-IDF block"""
+        # Get numerical features
+        numerical_features = []
+        for col in ['price', 'rating', 'review_count', 'popularity_score']:
+            if col in product_df.columns:
+                numerical_features.append(product_df[col].values.reshape(-1, 1))
+        
+        # Keep the TF-IDF block sparse rather than densifying it
+        if numerical_features:
+            numerical_features = np.hstack(numerical_features).astype(np.float32)
+            # Combine TF-IDF and numerical features
+            return sp.hstack([
+                tfidf_features,
+                sp.csr_matrix(numerical_features)
+            ], format='csr')
+        
+        return tfidf_features.tocsr()
+    
+    def save(self, path: str) -> None:
+        """Save the fitted encoders and TF-IDF vectorizer"""
+        try:
+            joblib.dump({
+                'tfidf_vectorizer': self.tfidf_vectorizer,
+                'tfidf_fitted': self._tfidf_fitted,
+                'label_encoders': self.label_encoders,
+                'scaler': self.scaler
+            }, path)
+            
+        except Exception as e:
+            logger.error(f"Error saving preprocessor: {str(e)}")
+            raise
+    
+    def load(self, path: str) -> None:
+        """Load fitted encoders and TF-IDF vectorizer saved by save()"""
+        try:
+            state = joblib.load(path)
+            self.tfidf_vectorizer = state['tfidf_vectorizer']
+            self._tfidf_fitted = state['tfidf_fitted']
+            self.label_encoders = state['label_encoders']
+            self.scaler = state['scaler']
+            
+        except Exception as e:
+            logger.error(f"Error loading preprocessor: {str(e)}")
             raise
\ No newline at end of file
@@ -3,7 +3,13 @@ import asyncio
 from typing import Dict, List, Optional, Any
 import logging
 from ..config.settings import Settings
-from ..utils.helpers import retry_with_backoff
+from ..utils.helpers import gather_dict, retry_with_backoff
+
+try:
+    import h2  # Enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +21,36 @@ class BackendAPIClient:
         self.base_url = settings.BACKEND_API_URL
         self.api_key = settings.BACKEND_API_KEY
         self.timeout = httpx.Timeout(30.0)
+        self._client: Optional[httpx.AsyncClient] = None
         
+    async def __aenter__(self) -> "BackendAPIClient":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+    
+    async def _get_client(self) -> httpx.AsyncClient:
+        """Shared client so requests reuse pooled keep-alive connections"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                    "X-Service": "ml-service"
+                }
+            )
+        return self._client
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
     async def _make_request(
         self,
         method: str,
@@ -26,35 +61,26 @@ class BackendAPIClient:
     ) -> Dict[str, Any]:
         """Make HTTP request to backend API"""
         
-        default_headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "X-Service": "ml-service"
-        }
+        client = await self._get_client()
         
-        if headers:
-            default_headers.update(headers)
+        try:
+            # Per-call headers are merged over the client's default headers
+            response = await client.request(
+                method=method,
+                url=endpoint,
+                json=data,
+                params=params,
+                headers=headers
+            )
+            response.raise_for_status()
+            return response.json()
             
-        url = f"{self.base_url}{endpoint}"
-        
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            try:
-                response = await client.request(
-                    method=method,
-                    url=url,
-                    json=data,
-                    params=params,
-                    headers=default_headers
-                )
-                response.raise_for_status()
-                return response.json()
-                
-            except httpx.HTTPError as e:
-                logger.error(f"HTTP error calling {endpoint}: {str(e)}")
-                raise
-            except Exception as e:
-                logger.error(f"Unexpected error calling {endpoint}: {str(e)}")
-                raise
+        except httpx.HTTPError as e:
+            logger.error(f"HTTP error calling {endpoint}: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error calling {endpoint}: {str(e)}")
+            raise
     
     @retry_with_backoff(max_retries=3)
     async def get_user_data(self, user_id: str) -> Dict[str, Any]:
@@ -83,6 +109,25 @@ class BackendAPIClient:
         )
         return response.get("interactions", [])
     
+    async def get_user_bundle(self, user_id: str) -> Dict[str, Any]:
+        """Get a user's profile, purchase history and interactions concurrently"""
+        return await gather_dict(
+            user=self.get_user_data(user_id),
+            purchase_history=self.get_user_purchase_history(user_id),
+            interactions=self.get_user_interactions(user_id)
+        )
+    
+    async def get_user_bundles(self, user_ids: List[str], concurrency: int = 32) -> Dict[str, Dict[str, Any]]:
+        """Get bundles for several users, with a bounded number in flight"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def fetch_bundle(user_id: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.get_user_bundle(user_id)
+        
+        bundles = await asyncio.gather(*[fetch_bundle(user_id) for user_id in user_ids])
+        return dict(zip(user_ids, bundles))
+    
     @retry_with_backoff(max_retries=3)
     async def get_products_batch(self, product_ids: List[str]) -> List[Dict]:
         """Get multiple products by IDs"""
@@ -16,7 +16,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import our custom modules
-from .config.settings import Settings
+from .config.settings import get_settings
 from .config.database import DatabaseManager
 from .models.recommendation_engine import RecommendationEngine
 from .models.schemas import (
@@ -33,7 +33,7 @@ from .utils.logger import setup_logger
 logger = setup_logger(__name__)
 
 # Initialize settings
-settings = Settings()
+settings = get_settings()
 
 # Initialize database manager
 db_manager = DatabaseManager(settings)
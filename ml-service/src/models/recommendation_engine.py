@@ -18,6 +18,7 @@ import asyncio
 
 from ..config.settings import Settings
 from ..config.database import DatabaseManager
+from ..utils.helpers import gather_dict
 
 logger = logging.getLogger(__name__)
 
@@ -67,9 +68,13 @@ class RecommendationEngine:
         logger.info("Starting model training...")
         
         try:
-            # Get training data
-            interactions = await self.db_manager.get_all_interactions()
-            products = await self.db_manager.get_all_products()
+            # Get training data; the two queries are independent
+            training_data = await gather_dict(
+                interactions=self.db_manager.get_all_interactions(),
+                products=self.db_manager.get_all_products()
+            )
+            interactions = training_data["interactions"]
+            products = training_data["products"]
             
             if len(interactions) < self.settings.MIN_INTERACTIONS_FOR_TRAINING:
                 logger.warning(f"Not enough interactions for training. "
@@ -2,13 +2,13 @@ import asyncio
 import logging
 from src.services.recommendation_service import RecommendationService
 from src.config.database import DatabaseManager
-from src.config.settings import Settings
+from src.config.settings import get_settings
 
 logger = logging.getLogger(__name__)
 
 async def train_models_periodically(interval_hours: int = 24):
     """Periodically retrain recommendation models"""
-    settings = Settings()
+    settings = get_settings()
     db_manager = DatabaseManager(settings)
     service = RecommendationService(db_manager=db_manager)
     
@@ -1,11 +1,11 @@
 import redis.asyncio as redis
-import json
-import pickle
+from redis.exceptions import RedisError
 import logging
-from typing import Dict, List, Optional, Any, Union
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Union
 from datetime import datetime, timedelta
 import hashlib
 from ..config.settings import Settings
+from ..config.cache_config import CacheType, batch_size, build_key, cached_read, decode, encode, get_ttl
 
 logger = logging.getLogger(__name__)
 
@@ -15,33 +15,6 @@ class CacheService:
     def __init__(self, settings: Settings):
         self.settings = settings
         self.redis_client = None
-        
-        # Cache TTL settings (in seconds)
-        self.CACHE_TTL = {
-            'user_recommendations': 3600,  # 1 hour
-            'product_similarities': 86400,  # 24 hours
-            'trending_products': 1800,      # 30 minutes
-            'popular_products': 7200,       # 2 hours
-            'user_data': 3600,              # 1 hour
-            'product_data': 7200,           # 2 hours
-            'category_data': 14400,         # 4 hours
-            'model_features': 86400,        # 24 hours
-            'search_results': 1800,         # 30 minutes
-        }
-        
-        # Cache key prefixes
-        self.KEY_PREFIXES = {
-            'user_rec': 'ml:user_rec:',
-            'product_sim': 'ml:product_sim:',
-            'trending': 'ml:trending:',
-            'popular': 'ml:popular:',
-            'user_data': 'ml:user_data:',
-            'product_data': 'ml:product_data:',
-            'category_data': 'ml:category_data:',
-            'model_features': 'ml:model_features:',
-            'search': 'ml:search:',
-            'analytics': 'ml:analytics:'
-        }
     
     async def connect(self):
         """Connect to Redis"""
@@ -80,45 +53,21 @@ class CacheService:
         """Generate hash for complex keys"""
         return hashlib.md5(key.encode()).hexdigest()
     
-    async def _serialize_data(self, data: Any) -> bytes:
-        """Serialize data for Redis storage"""
-        try:
-            # Try JSON first for simple data types
-            if isinstance(data, (dict, list, str, int, float, bool)) or data is None:
-                return json.dumps(data).encode('utf-8')
-            else:
-                # Use pickle for complex objects
-                return pickle.dumps(data)
-        except Exception as e:
-            logger.error(f"Failed to serialize data: {str(e)}")
-            raise
-    
-    async def _deserialize_data(self, data: bytes) -> Any:
-        """Deserialize data from Redis"""
-        try:
-            # Try JSON first
-            try:
-                return json.loads(data.decode('utf-8'))
-            except (json.JSONDecodeError, UnicodeDecodeError):
-                # Fall back to pickle
-                return pickle.loads(data)
-        except Exception as e:
-            logger.error(f"Failed to deserialize data: {str(e)}")
-            raise
-    
     async def set_cache(
         self, 
         key: str, 
         value: Any, 
         ttl: Optional[int] = None,
-        prefix: Optional[str] = None
+        prefix: Optional[str] = None,
+        *,
+        cache_type: CacheType
     ) -> bool:
-        """Set cache value"""
+        """Set cache value, encoded with the codec configured for its cache type"""
         try:
             if prefix:
                 key = self._generate_cache_key(prefix, key)
             
-            serialized_data = await self._serialize_data(value)
+            serialized_data = encode(cache_type, value)
             
             if ttl:
                 await self.redis_client.setex(key, ttl, serialized_data)
@@ -141,12 +90,26 @@ class CacheService:
             if data is None:
                 return None
             
-            return await self._deserialize_data(data)
+            return decode(data)
             
         except Exception as e:
             logger.error(f"Failed to get cache for key {key}: {str(e)}")
             return None
     
+    async def get_or_load(
+        self,
+        cache_type: CacheType,
+        identifier: str,
+        loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Read through the cache with the cache type's strategy, calling loader on a miss"""
+        key = build_key(cache_type.name.lower(), identifier)
+        try:
+            return await cached_read(self.redis_client, cache_type, key, loader)
+        except RedisError as e:
+            logger.error(f"Cache read failed for key {key}, loading directly: {str(e)}")
+            return await loader()
+    
     async def delete_cache(self, key: str, prefix: Optional[str] = None) -> bool:
         """Delete cache value"""
         try:
@@ -180,12 +143,11 @@ class CacheService:
         algorithm: str = "hybrid"
     ) -> bool:
         """Cache user recommendations"""
-        key = f"{user_id}:{algorithm}"
         return await self.set_cache(
-            key, 
+            build_key('user_recommendations', user_id, algorithm), 
             recommendations, 
-            ttl=self.CACHE_TTL['user_recommendations'],
-            prefix=self.KEY_PREFIXES['user_rec']
+            ttl=get_ttl(CacheType.USER_RECOMMENDATIONS),
+            cache_type=CacheType.USER_RECOMMENDATIONS
         )
     
     async def get_user_recommendations(
@@ -194,12 +156,11 @@ class CacheService:
         algorithm: str = "hybrid"
     ) -> Optional[List[Dict]]:
         """Get cached user recommendations"""
-        key = f"{user_id}:{algorithm}"
-        return await self.get_cache(key, prefix=self.KEY_PREFIXES['user_rec'])
+        return await self.get_cache(build_key('user_recommendations', user_id, algorithm))
     
     async def invalidate_user_recommendations(self, user_id: str) -> bool:
         """Invalidate all user recommendations"""
-        pattern = f"{self.KEY_PREFIXES['user_rec']}{user_id}:*"
+        pattern = build_key('user_recommendations', user_id, '*')
         deleted_count = await self.delete_pattern(pattern)
         return deleted_count > 0
     
@@ -211,19 +172,19 @@ class CacheService:
     ) -> bool:
         """Cache product similarities"""
         return await self.set_cache(
-            product_id, 
+            build_key('product_similarities', product_id), 
             similarities, 
-            ttl=self.CACHE_TTL['product_similarities'],
-            prefix=self.KEY_PREFIXES['product_sim']
+            ttl=get_ttl(CacheType.PRODUCT_SIMILARITIES),
+            cache_type=CacheType.PRODUCT_SIMILARITIES
         )
     
     async def get_product_similarities(self, product_id: str) -> Optional[List[Dict]]:
         """Get cached product similarities"""
-        return await self.get_cache(product_id, prefix=self.KEY_PREFIXES['product_sim'])
+        return await self.get_cache(build_key('product_similarities', product_id))
     
     async def invalidate_product_recommendations(self, product_id: str) -> bool:
         """Invalidate product similarity cache"""
-        return await self.delete_cache(product_id, prefix=self.KEY_PREFIXES['product_sim'])
+        return await self.delete_cache(build_key('product_similarities', product_id))
     
     # Trending Products Cache
     async def cache_trending_products(
@@ -233,12 +194,11 @@ class CacheService:
         products: List[Dict]
     ) -> bool:
         """Cache trending products"""
-        key = f"{category or 'all'}:{time_period}"
         return await self.set_cache(
-            key, 
+            build_key('trending_products', category or 'all', time_period), 
             products, 
-            ttl=self.CACHE_TTL['trending_products'],
-            prefix=self.KEY_PREFIXES['trending']
+            ttl=get_ttl(CacheType.TRENDING_PRODUCTS),
+            cache_type=CacheType.TRENDING_PRODUCTS
         )
     
     async def get_trending_products(
@@ -247,8 +207,7 @@ class CacheService:
         time_period: str
     ) -> Optional[List[Dict]]:
         """Get cached trending products"""
-        key = f"{category or 'all'}:{time_period}"
-        return await self.get_cache(key, prefix=self.KEY_PREFIXES['trending'])
+        return await self.get_cache(build_key('trending_products', category or 'all', time_period))
     
     async def update_trending_data(self, product_id: str, interaction_type: str) -> bool:
         """Update trending data for a product"""
@@ -269,18 +228,18 @@ class CacheService:
             
             # Add to trending sets with different time periods
             trending_keys = [
-                f"{self.KEY_PREFIXES['analytics']}trending:hour",
-                f"{self.KEY_PREFIXES['analytics']}trending:day",
-                f"{self.KEY_PREFIXES['analytics']}trending:week"
+                build_key('analytics_data', 'trending', 'hour'),
+                build_key('analytics_data', 'trending', 'day'),
+                build_key('analytics_data', 'trending', 'week')
             ]
             
             for key in trending_keys:
                 await self.redis_client.zincrby(key, weight, product_id)
             
             # Set expiration for trending keys
-            await self.redis_client.expire(f"{self.KEY_PREFIXES['analytics']}trending:hour", 3600)
-            await self.redis_client.expire(f"{self.KEY_PREFIXES['analytics']}trending:day", 86400)
-            await self.redis_client.expire(f"{self.KEY_PREFIXES['analytics']}trending:week", 604800)
+            await self.redis_client.expire(trending_keys[0], 3600)
+            await self.redis_client.expire(trending_keys[1], 86400)
+            await self.redis_client.expire(trending_keys[2], 604800)
             
             return True
             
@@ -297,40 +256,40 @@ class CacheService:
         """Cache popular products"""
         key = category or 'all'
         return await self.set_cache(
-            key, 
+            build_key('popular_products', key), 
             products, 
-            ttl=self.CACHE_TTL['popular_products'],
-            prefix=self.KEY_PREFIXES['popular']
+            ttl=get_ttl(CacheType.POPULAR_PRODUCTS),
+            cache_type=CacheType.POPULAR_PRODUCTS
         )
     
     async def get_popular_products(self, category: Optional[str]) -> Optional[List[Dict]]:
         """Get cached popular products"""
         key = category or 'all'
-        return await self.get_cache(key, prefix=self.KEY_PREFIXES['popular'])
+        return await self.get_cache(build_key('popular_products', key))
     
     # User Data Cache
     async def cache_user_data(self, user_id: str, user_data: Dict) -> bool:
         """Cache user data"""
         return await self.set_cache(
-            user_id, 
+            build_key('user_data', user_id), 
             user_data, 
-            ttl=self.CACHE_TTL['user_data'],
-            prefix=self.KEY_PREFIXES['user_data']
+            ttl=get_ttl(CacheType.USER_DATA),
+            cache_type=CacheType.USER_DATA
         )
     
     async def get_user_data(self, user_id: str) -> Optional[Dict]:
         """Get cached user data"""
-        return await self.get_cache(user_id, prefix=self.KEY_PREFIXES['user_data'])
+        return await self.get_cache(build_key('user_data', user_id))
     
     async def invalidate_user_cache(self, user_id: str) -> bool:
         """Invalidate user data cache"""
-        return await self.delete_cache(user_id, prefix=self.KEY_PREFIXES['user_data'])
+        return await self.delete_cache(build_key('user_data', user_id))
     
     async def remove_user_data(self, user_id: str) -> bool:
         """Remove all user-related data from cache"""
         patterns = [
-            f"{self.KEY_PREFIXES['user_rec']}{user_id}:*",
-            f"{self.KEY_PREFIXES['user_data']}{user_id}",
+            build_key('user_recommendations', user_id, '*'),
+            build_key('user_data', user_id),
         ]
         
         total_deleted = 0
@@ -344,25 +303,25 @@ class CacheService:
     async def cache_product_data(self, product_id: str, product_data: Dict) -> bool:
         """Cache product data"""
         return await self.set_cache(
-            product_id, 
+            build_key('product_data', product_id), 
             product_data, 
-            ttl=self.CACHE_TTL['product_data'],
-            prefix=self.KEY_PREFIXES['product_data']
+            ttl=get_ttl(CacheType.PRODUCT_DATA),
+            cache_type=CacheType.PRODUCT_DATA
         )
     
     async def get_product_data(self, product_id: str) -> Optional[Dict]:
         """Get cached product data"""
-        return await self.get_cache(product_id, prefix=self.KEY_PREFIXES['product_data'])
+        return await self.get_cache(build_key('product_data', product_id))
     
     async def invalidate_product_cache(self, product_id: str) -> bool:
         """Invalidate product data cache"""
-        return await self.delete_cache(product_id, prefix=self.KEY_PREFIXES['product_data'])
+        return await self.delete_cache(build_key('product_data', product_id))
     
     async def remove_product_data(self, product_id: str) -> bool:
         """Remove all product-related data from cache"""
         patterns = [
-            f"{self.KEY_PREFIXES['product_sim']}{product_id}",
-            f"{self.KEY_PREFIXES['product_data']}{product_id}",
+            build_key('product_similarities', product_id),
+            build_key('product_data', product_id),
         ]
         
         total_deleted = 0
@@ -376,11 +335,11 @@ class CacheService:
         """Update product availability in cache"""
         try:
             # Update availability in a separate hash
-            availability_key = f"{self.KEY_PREFIXES['product_data']}availability"
+            availability_key = build_key('product_data', "availability")
             await self.redis_client.hset(availability_key, product_id, stock_level)
             
             # Set expiration
-            await self.redis_client.expire(availability_key, self.CACHE_TTL['product_data'])
+            await self.redis_client.expire(availability_key, get_ttl(CacheType.PRODUCT_DATA))
             
             return True
             
@@ -391,7 +350,7 @@ class CacheService:
     async def get_product_availability(self, product_id: str) -> Optional[int]:
         """Get product availability from cache"""
         try:
-            availability_key = f"{self.KEY_PREFIXES['product_data']}availability"
+            availability_key = build_key('product_data', "availability")
             stock_level = await self.redis_client.hget(availability_key, product_id)
             return int(stock_level) if stock_level is not None else None
             
@@ -403,62 +362,66 @@ class CacheService:
     async def cache_category_data(self, category_id: str, category_data: Dict) -> bool:
         """Cache category data"""
         return await self.set_cache(
-            category_id, 
+            build_key('category_data', category_id), 
             category_data, 
-            ttl=self.CACHE_TTL['category_data'],
-            prefix=self.KEY_PREFIXES['category_data']
+            ttl=get_ttl(CacheType.CATEGORY_DATA),
+            cache_type=CacheType.CATEGORY_DATA
         )
     
     async def get_category_data(self, category_id: str) -> Optional[Dict]:
         """Get cached category data"""
-        return await self.get_cache(category_id, prefix=self.KEY_PREFIXES['category_data'])
+        return await self.get_cache(build_key('category_data', category_id))
     
     async def invalidate_category_cache(self, category_id: str) -> bool:
         """Invalidate category cache"""
-        return await self.delete_cache(category_id, prefix=self.KEY_PREFIXES['category_data'])
+        return await self.delete_cache(build_key('category_data', category_id))
     
     # Model Features Cache
     async def cache_model_features(self, feature_key: str, features: Any) -> bool:
         """Cache model features (embeddings, etc.)"""
         return await self.set_cache(
-            feature_key, 
+            build_key('model_features', feature_key), 
             features, 
-            ttl=self.CACHE_TTL['model_features'],
-            prefix=self.KEY_PREFIXES['model_features']
+            ttl=get_ttl(CacheType.MODEL_FEATURES),
+            cache_type=CacheType.MODEL_FEATURES
         )
     
     async def get_model_features(self, feature_key: str) -> Optional[Any]:
         """Get cached model features"""
-        return await self.get_cache(feature_key, prefix=self.KEY_PREFIXES['model_features'])
+        return await self.get_cache(build_key('model_features', feature_key))
     
     # Search Results Cache
     async def cache_search_results(self, query: str, results: List[Dict]) -> bool:
         """Cache search results"""
         query_hash = self._hash_key(query.lower())
         return await self.set_cache(
-            query_hash, 
+            build_key('search_results', query_hash), 
             results, 
-            ttl=self.CACHE_TTL['search_results'],
-            prefix=self.KEY_PREFIXES['search']
+            ttl=get_ttl(CacheType.SEARCH_RESULTS),
+            cache_type=CacheType.SEARCH_RESULTS
         )
     
     async def get_search_results(self, query: str) -> Optional[List[Dict]]:
         """Get cached search results"""
         query_hash = self._hash_key(query.lower())
-        return await self.get_cache(query_hash, prefix=self.KEY_PREFIXES['search'])
+        return await self.get_cache(build_key('search_results', query_hash))
     
     # Batch Operations
     async def batch_cache_recommendations(self, recommendations_data: Dict[str, List[Dict]]) -> bool:
         """Batch cache multiple user recommendations"""
         try:
-            pipe = self.redis_client.pipeline()
-            
-            for user_id, recommendations in recommendations_data.items():
-                key = self._generate_cache_key(self.KEY_PREFIXES['user_rec'], f"{user_id}:hybrid")
-                serialized_data = await self._serialize_data(recommendations)
-                pipe.setex(key, self.CACHE_TTL['user_recommendations'], serialized_data)
+            # Flush the pipeline every batch so one huge call never builds an unbounded buffer
+            max_batch = batch_size(CacheType.USER_RECOMMENDATIONS)
+            items = list(recommendations_data.items())
+            for start in range(0, len(items), max_batch):
+                # Users hash to different slots, so the batch cannot be one MULTI
+                pipe = self.redis_client.pipeline(transaction=False)
+                for user_id, recommendations in items[start:start + max_batch]:
+                    key = build_key('user_recommendations', user_id, 'hybrid')
+                    serialized_data = encode(CacheType.USER_RECOMMENDATIONS, recommendations)
+                    pipe.setex(key, get_ttl(CacheType.USER_RECOMMENDATIONS), serialized_data)
+                await pipe.execute()
             
-            await pipe.execute()
             return True
             
         except Exception as e:
@@ -471,8 +434,8 @@ class CacheService:
             patterns = []
             for user_id in user_ids:
                 patterns.extend([
-                    f"{self.KEY_PREFIXES['user_rec']}{user_id}:*",
-                    f"{self.KEY_PREFIXES['user_data']}{user_id}"
+                    build_key('user_recommendations', user_id, '*'),
+                    build_key('user_data', user_id)
                 ])
             
             total_deleted = 0
@@ -490,7 +453,7 @@ class CacheService:
     async def increment_cache_hit(self, cache_type: str) -> bool:
         """Increment cache hit counter"""
         try:
-            key = f"{self.KEY_PREFIXES['analytics']}cache_hits:{cache_type}"
+            key = build_key('analytics_data', 'cache_hits', cache_type)
             await self.redis_client.incr(key)
             await self.redis_client.expire(key, 86400)  # 24 hours
             return True
@@ -502,7 +465,7 @@ class CacheService:
     async def increment_cache_miss(self, cache_type: str) -> bool:
         """Increment cache miss counter"""
         try:
-            key = f"{self.KEY_PREFIXES['analytics']}cache_misses:{cache_type}"
+            key = build_key('analytics_data', 'cache_misses', cache_type)
             await self.redis_client.incr(key)
             await self.redis_client.expire(key, 86400)  # 24 hours
             return True
@@ -517,13 +480,13 @@ class CacheService:
             stats = {}
             
             # Get hit/miss ratios
-            hit_keys = await self.redis_client.keys(f"{self.KEY_PREFIXES['analytics']}cache_hits:*")
-            miss_keys = await self.redis_client.keys(f"{self.KEY_PREFIXES['analytics']}cache_misses:*")
+            hit_keys = await self.redis_client.keys(build_key('analytics_data', 'cache_hits', '*'))
+            miss_keys = await self.redis_client.keys(build_key('analytics_data', 'cache_misses', '*'))
             
             for key in hit_keys:
                 cache_type = key.split(':')[-1]
                 hits = await self.redis_client.get(key)
-                misses = await self.redis_client.get(f"{self.KEY_PREFIXES['analytics']}cache_misses:{cache_type}")
+                misses = await self.redis_client.get(build_key('analytics_data', 'cache_misses', cache_type))
                 
                 hits = int(hits) if hits else 0
                 misses = int(misses) if misses else 0
@@ -562,7 +525,7 @@ class CacheService:
             test_value = {"timestamp": datetime.now().isoformat()}
             
             # Test set
-            await self.set_cache(test_key, test_value, ttl=60)
+            await self.set_cache(test_key, test_value, ttl=60, cache_type=CacheType.HEALTH_DATA)
             
             # Test get
             retrieved = await self.get_cache(test_key)
@@ -11,7 +11,8 @@ from collections import defaultdict
 from ..models.recommendation_engine import RecommendationEngine
 from ..models.schemas import ProductRecommendation, BehaviorType
 from ..config.database import DatabaseManager
-from ..config.settings import Settings
+from ..config.cache_config import CacheType
+from ..config.settings import get_settings
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,7 @@ class RecommendationService:
                  db_manager: DatabaseManager):
         self.recommendation_engine = recommendation_engine
         self.db_manager = db_manager
-        self.settings = Settings()
+        self.settings = get_settings()
         
     async def get_user_recommendations(self, user_id: str, 
                                      num_recommendations: int = 10,
@@ -211,7 +212,8 @@ class RecommendationService:
             )
             
             # Cache the results for 1 hour
-            await self.db_manager.cache_data(cache_key, popular_products, ttl=3600)
+            await self.db_manager.cache_data(cache_key, popular_products, ttl=3600,
+                                            cache_type=CacheType.POPULAR_PRODUCTS)
             
             return popular_products
             
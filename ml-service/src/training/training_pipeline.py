@@ -9,7 +9,7 @@ from typing import Dict, List, Optional, Tuple
 import pandas as pd
 import numpy as np
 from ..config.database import DatabaseManager
-from ..config.settings import Settings
+from ..config.settings import Settings, get_settings
 from ..data.preprocessing import DataPreprocessor
 from ..algorithms.collaborative_filtering import CollaborativeFilteringEngine
 from ..algorithms.content_based_filtering import ContentBasedFilteringEngine
@@ -220,7 +220,7 @@ class MLTrainingPipeline:
 async def main():
     # Example usage of the MLTrainingPipeline
     db_manager = DatabaseManager()
-    settings = Settings()
+    settings = get_settings()
     
     training_pipeline = MLTrainingPipeline(db_manager, settings)
     
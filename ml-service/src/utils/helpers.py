@@ -1,6 +1,7 @@
+import asyncio
 import json
 import logging
-from typing import Any, Dict
+from typing import Any, Awaitable, Dict
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -31,4 +32,9 @@ def normalize_scores(scores: Dict[str, float]) -> Dict[str, float]:
     return {
         k: (v - min_score) / (max_score - min_score)
         for k, v in scores.items()
-    }
\ No newline at end of file
+    }
+
+async def gather_dict(**coros: Awaitable[Any]) -> Dict[str, Any]:
+    """Await independent coroutines concurrently and return results by keyword"""
+    results = await asyncio.gather(*coros.values())
+    return dict(zip(coros.keys(), results))
\ No newline at end of file
@@ -0,0 +1,223 @@
+import asyncio
+import copy
+import pickle
+import time
+from datetime import datetime
+import pytest
+from src.config import cache_config
+from src.config.cache_config import (
+    ALERT_THRESHOLDS, BATCH_SIZE_ARRAY, BATCH_SIZES, CIRCUIT_BREAKERS, PREFETCH_STRATEGIES,
+    WARMING_SCHEDULE, CacheType, CacheWarmingScheduler, batch_size, build_key, cached_read, decode, encode, l1_cache, ttl_lru_cache
+)
+
+@pytest.mark.parametrize("cache_type", [
+    CacheType.USER_DATA,            # json
+    CacheType.TRENDING_PRODUCTS,    # msgpack
+    CacheType.ANALYTICS_DATA,       # zstd + msgpack
+])
+def test_codec_round_trip(cache_type):
+    value = [{"product_id": "p1", "score": 0.5, "tags": ["a", "b"]}]
+    assert decode(encode(cache_type, value)) == value
+
+def test_embedding_codec_uses_trained_dictionary(tmp_path, monkeypatch):
+    pytest.importorskip("zstandard")
+    monkeypatch.setattr(cache_config, "ZSTD_DICT_PATH", str(tmp_path / "embeddings.zstd_dict"))
+    samples = [
+        cache_config._dumps_msgpack({"user_id": f"user_{i}", "embedding": [i % 7 / 7, 0.25, 0.5] * 8})
+        for i in range(500)
+    ]
+    cache_config.train_zstd_dictionary(samples, dict_size=4096)
+    try:
+        value = {"user_id": "user_x", "embedding": [0.25, 0.5] * 12}
+        payload = encode(CacheType.USER_EMBEDDINGS, value)
+        assert payload[0] & cache_config._TAG_DICT
+        assert decode(payload) == value
+    finally:
+        cache_config._zstd_dictionary.cache_clear()
+        cache_config._codec_generation += 1
+
+def test_codec_reads_plain_json():
+    assert decode(b'{"product_id": "p1"}') == {"product_id": "p1"}
+
+def test_codec_stringifies_unknown_types():
+    timestamp = datetime(2024, 1, 2, 3, 4, 5)
+    assert decode(encode(CacheType.USER_DATA, {"timestamp": timestamp}))["timestamp"].startswith("2024-01-02")
+
+def test_ttl_lru_cache_expires_and_evicts(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    calls = []
+
+    @ttl_lru_cache(maxsize=2, ttl=10)
+    def load(key):
+        calls.append(key)
+        return key.upper()
+
+    assert load("a") == "A" and load("a") == "A"
+    assert calls == ["a"]
+
+    load("b")
+    load("c")
+    load("a")
+    assert calls == ["a", "b", "c", "a"]
+
+    now[0] = 11.0
+    load("a")
+    assert calls == ["a", "b", "c", "a", "a"]
+
+def test_l1_cache_wraps_coroutines():
+    calls = []
+
+    @l1_cache(CacheType.POPULAR_PRODUCTS)
+    async def load(category):
+        calls.append(category)
+        return [category]
+
+    async def read_twice():
+        return await load("books"), await load("books")
+
+    assert asyncio.run(read_twice()) == (["books"], ["books"])
+    assert calls == ["books"]
+
+def test_ttl_lru_cache_returns_copies():
+    @ttl_lru_cache(maxsize=2, ttl=10)
+    def load(key):
+        return [{"product_id": key}]
+
+    load("a")[0]["product_id"] = "mutated"
+    assert load("a") == [{"product_id": "a"}]
+
+def test_ttl_lru_cache_coalesces_concurrent_misses():
+    calls = []
+
+    @ttl_lru_cache(maxsize=2, ttl=10)
+    async def load(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return [key]
+
+    async def read_concurrently():
+        return await asyncio.gather(*(load("a") for _ in range(5)))
+
+    assert asyncio.run(read_concurrently()) == [["a"]] * 5
+    assert calls == ["a"]
+
+def test_ttl_lru_cache_methods_do_not_key_on_self():
+    class Loader:
+        calls = 0
+
+        @ttl_lru_cache(maxsize=2, ttl=10, method=True)
+        def load(self, key):
+            Loader.calls += 1
+            return key
+
+    assert Loader().load("a") == Loader().load("a") == "a"
+    assert Loader.calls == 1
+
+def test_build_key_hash_tags_the_entity():
+    assert build_key('user_recommendations', 'u1', 'hybrid') == 'ml:user_rec:{u1}:hybrid'
+    assert build_key('user_rec', 'u1') == build_key('user_recommendations', 'u1') == 'ml:user_rec:{u1}'
+
+@pytest.mark.parametrize("record", [
+    ALERT_THRESHOLDS['hit_rate'],
+    PREFETCH_STRATEGIES['trending_products'],
+    CIRCUIT_BREAKERS['cache_operations'],
+])
+def test_settings_records_pickle_and_copy(record):
+    assert pickle.loads(pickle.dumps(record)) == record
+    assert copy.deepcopy(record) == record
+    assert copy.copy(record) == record
+
+class FakeRedis:
+    """Just enough of redis.asyncio for the cached_read handlers"""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+        self.ttls[key] = ex
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.results = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def get(self, key):
+        self.results.append(self.client.values.get(key))
+
+    def ttl(self, key):
+        self.results.append(self.client.ttls.get(key, -2))
+
+    async def execute(self):
+        return self.results
+
+def test_cached_read_cache_aside_loads_once():
+    client = FakeRedis()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return [{"product_id": "p1"}]
+
+    async def read_twice():
+        first = await cached_read(client, CacheType.USER_RECOMMENDATIONS, "k", loader)
+        second = await cached_read(client, CacheType.USER_RECOMMENDATIONS, "k", loader)
+        return first, second
+
+    assert asyncio.run(read_twice()) == ([{"product_id": "p1"}],) * 2
+    assert len(calls) == 1
+
+def test_cached_read_refresh_ahead_reloads_near_expiry():
+    client = FakeRedis()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return len(calls)
+
+    async def read():
+        await cached_read(client, CacheType.POPULAR_PRODUCTS, "k", loader)
+        # Well inside the TTL: served from Redis without a refresh
+        assert await cached_read(client, CacheType.POPULAR_PRODUCTS, "k", loader) == 1
+        client.ttls["k"] = 1
+        # Near expiry: still served the cached value, refreshed in the background
+        assert await cached_read(client, CacheType.POPULAR_PRODUCTS, "k", loader) == 1
+        await asyncio.gather(*cache_config._refresh_tasks)
+        return decode(client.values["k"])
+
+    assert asyncio.run(read()) == 2
+    assert len(calls) == 2
+
+def test_warming_scheduler_pops_due_runs_in_order():
+    scheduler = CacheWarmingScheduler(now=0.0)
+    intervals = sorted(WARMING_SCHEDULE.values())
+    first_type, first_due = scheduler.next_warmup()
+    assert first_due == intervals[0]
+
+    assert scheduler.pop_due(now=first_due - 1) == []
+    due = scheduler.pop_due(now=first_due)
+    assert first_type in due
+
+    scheduler.reschedule(first_type, now=first_due)
+    assert len(scheduler.pop_due(now=float("inf"))) == len(WARMING_SCHEDULE)
+    assert scheduler.next_warmup() is None
+
+def test_batch_size_array_matches_batch_sizes():
+    assert batch_size(CacheType.USER_RECOMMENDATIONS) == BATCH_SIZES['user_recommendations']
+    assert batch_size(CacheType.USER_DATA) == BATCH_SIZES['cache_warming']
+    assert BATCH_SIZE_ARRAY.shape == (len(CacheType),)
+    assert not BATCH_SIZE_ARRAY.flags.writeable
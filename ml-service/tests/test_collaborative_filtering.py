@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.algorithms.collaborative_filtering import CollaborativeFilteringEngine
+
+@pytest.fixture
+def user_item_matrix():
+    # Fixed ratings with every item rated at least once and gaps left to predict
+    rng = np.random.RandomState(7)
+    ratings = rng.randint(1, 6, size=(12, 9)).astype(float)
+    ratings[rng.rand(12, 9) < 0.45] = 0.0
+    ratings[0, :] = np.where(ratings[0, :] == 0, 3.0, ratings[0, :])
+    ratings[1, ::2] = 0.0
+    return pd.DataFrame(
+        ratings,
+        index=[f'u{i}' for i in range(12)],
+        columns=[f'p{j}' for j in range(9)]
+    )
+
+def _surprise_estimates(engine, model, user_id, positions):
+    return np.array([model.predict(user_id, engine.item_ids[pos]).est for pos in positions])
+
+def _assert_matches_surprise(engine, model, knn_index=None):
+    for user_id in engine.user_ids:
+        positions = engine._unrated_items(engine._user_pos[user_id])
+        if knn_index is not None:
+            scores = engine._score_knn(knn_index, user_id, positions)
+        else:
+            scores = engine._score_matrix_factorization(user_id, positions)
+        np.testing.assert_allclose(scores, _surprise_estimates(engine, model, user_id, positions), rtol=1e-6)
+
+def test_user_based_scores_match_surprise(tmp_path, user_item_matrix):
+    engine = CollaborativeFilteringEngine(model_path=str(tmp_path))
+    engine.train_user_based_cf(user_item_matrix, k=3)
+
+    _assert_matches_surprise(engine, engine.user_based_model, engine._user_knn)
+
+@pytest.mark.parametrize("k", [2, 4, 9])
+def test_item_based_scores_match_surprise(tmp_path, user_item_matrix, k):
+    engine = CollaborativeFilteringEngine(model_path=str(tmp_path))
+    engine.train_item_based_cf(user_item_matrix, k=k)
+
+    _assert_matches_surprise(engine, engine.item_based_model, engine._item_knn)
+
+@pytest.mark.parametrize("algorithm", ['SVD', 'NMF'])
+def test_matrix_factorization_scores_match_surprise(tmp_path, user_item_matrix, algorithm):
+    engine = CollaborativeFilteringEngine(model_path=str(tmp_path))
+    engine.train_matrix_factorization(user_item_matrix, algorithm=algorithm)
+
+    _assert_matches_surprise(engine, engine.matrix_factorization_model)
+
+def test_new_matrix_invalidates_aligned_caches(tmp_path, user_item_matrix):
+    engine = CollaborativeFilteringEngine(model_path=str(tmp_path))
+    engine.train_item_based_cf(user_item_matrix, k=user_item_matrix.shape[1])
+    engine.train_matrix_factorization(user_item_matrix, algorithm='SVD')
+
+    # Same ratings with the columns reordered: every cached position is stale
+    engine.train_user_based_cf(user_item_matrix[user_item_matrix.columns[::-1]], k=3)
+    assert engine._item_knn is None and engine._mf_qi is None
+    assert engine.get_similar_items('p0', 3)
+
+    engine._get_item_based_recommendations('u0', 3)
+    _assert_matches_surprise(engine, engine.item_based_model, engine._item_knn)
+    assert engine._ensure_mf_factors()
+    _assert_matches_surprise(engine, engine.matrix_factorization_model)
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+from src.algorithms.content_based_filtering import ContentBasedFilteringEngine
+
+@pytest.fixture
+def small_catalog():
+    categories = ['electronics', 'books', 'clothing', 'sports']
+    return pd.DataFrame({
+        'product_id': [f'product_{i}' for i in range(20)],
+        'title': [f'{categories[i % 4]} item number {i}' for i in range(20)],
+        'description': [f'A great {categories[i % 4]} product for everyday use' for i in range(20)],
+        'tags': [[categories[i % 4], 'sale'] if i % 2 else 'new arrival' for i in range(20)],
+        'brand': [f'brand_{i % 3}' for i in range(20)],
+        'category': [categories[i % 4] for i in range(20)],
+        'price': [10.0 + 5 * i for i in range(20)],
+        'rating': [1 + (i % 5) for i in range(20)],
+        'review_count': [i * 7 for i in range(20)],
+        'in_stock': [i % 3 != 0 for i in range(20)]
+    })
+
+def test_train_small_catalog_skips_pca(tmp_path, small_catalog):
+    engine = ContentBasedFilteringEngine(model_path=str(tmp_path))
+    engine.train(small_catalog)
+
+    assert engine.pca is None
+    assert engine.product_features.shape[0] == len(small_catalog)
+
+    similar = engine.get_similar_products('product_0', n_recommendations=5)
+    assert len(similar) == 5
+    assert all(rec['product_id'] != 'product_0' for rec in similar)
+
+def test_fit_transform_pca_clamps_components_to_rows(tmp_path):
+    engine = ContentBasedFilteringEngine(model_path=str(tmp_path))
+    features = sparse.random(40, 120, density=0.2, format='csr', dtype=np.float32, random_state=0)
+
+    reduced = engine._fit_transform_pca(features, n_components=500)
+
+    assert reduced.shape == (40, 40)
+    assert engine.pca.n_components_ == 40
+
+def test_train_without_popularity_columns(tmp_path, small_catalog):
+    engine = ContentBasedFilteringEngine(model_path=str(tmp_path))
+    engine.train(small_catalog.drop(columns=['rating', 'review_count']))
+
+    assert engine.category_tops == {}
+
+def test_category_tops_fill_missing_popularity(tmp_path, small_catalog):
+    small_catalog.loc[0, 'rating'] = np.nan
+    small_catalog.loc[4, 'review_count'] = np.nan
+    engine = ContentBasedFilteringEngine(model_path=str(tmp_path))
+    engine.train(small_catalog)
+
+    product_ids, scores = engine.category_tops['electronics']
+    assert set(product_ids) == {f'product_{i}' for i in range(0, 20, 4)}
+    assert not np.isnan(scores).any()
+    assert scores == sorted(scores, reverse=True)
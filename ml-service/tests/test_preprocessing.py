@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from src.algorithms.collaborative_filtering import _to_csr
+from src.data.preprocessing import DataPreprocessor
+
+def _interactions():
+    return pd.DataFrame({
+        'user_id': ['u2', 'u1', 'u2', 'u3', 'u1', 'u2'],
+        'product_id': ['p3', 'p1', 'p3', 'p2', 'p2', 'p1'],
+        'interaction_weight': [1.0, 2.0, 3.0, 5.0, 1.5, 0.5],
+        'recency_weight': [1.0, 0.5, 0.8, 1.0, 1.0, 0.9]
+    })
+
+def _pivot(interaction_df):
+    """User-item matrix as create_user_item_matrix built it before it went sparse"""
+    weighted = interaction_df.assign(
+        weighted_score=interaction_df['interaction_weight'] * interaction_df['recency_weight']
+    )
+    return weighted.groupby(['user_id', 'product_id'])['weighted_score'].sum().reset_index().pivot(
+        index='user_id', columns='product_id', values='weighted_score'
+    ).fillna(0)
+
+def test_user_item_matrix_matches_pivot():
+    interactions = _interactions()
+    expected = _pivot(interactions)
+
+    result = DataPreprocessor().create_user_item_matrix(interactions)
+    frame = result.to_frame().sparse.to_dense().loc[expected.index, expected.columns]
+
+    assert result.matrix.shape == expected.shape
+    np.testing.assert_allclose(frame.to_numpy(), expected.to_numpy(), rtol=1e-6)
+
+def test_user_item_frame_feeds_collaborative_filtering():
+    interactions = _interactions()
+    expected = _pivot(interactions)
+
+    frame = DataPreprocessor().create_user_item_matrix(interactions).to_frame()
+    ratings = _to_csr(frame.loc[expected.index, expected.columns])
+
+    np.testing.assert_allclose(ratings.toarray(), expected.to_numpy(), rtol=1e-6)